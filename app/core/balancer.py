@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import random
+from typing import Callable, List, Optional, Sequence
+
+BALANCER_LEAST_OUTSTANDING = "least_outstanding"
+BALANCER_EWMA = "ewma"
+BALANCERS = (BALANCER_LEAST_OUTSTANDING, BALANCER_EWMA)
+
+
+class UpstreamTarget:
+    """One upstream base URL with its live load and health figures."""
+
+    __slots__ = (
+        "base",
+        "outstanding",
+        "ewma",
+        "healthy",
+        "failed_probes",
+        "passed_probes",
+    )
+
+    def __init__(self, base: str) -> None:
+        self.base = base
+        self.outstanding = 0
+        # Smoothed latency in seconds; 0 until the first response.
+        self.ewma = 0.0
+        self.healthy = True
+        self.failed_probes = 0
+        self.passed_probes = 0
+
+
+class Balancer:
+    """Picks a target per request among the healthy ones.
+
+    ``least_outstanding`` takes the target with the fewest requests in
+    flight. ``ewma`` weighs that count by the smoothed latency, so slow
+    targets get less traffic before they fail health checks. Ties are
+    broken at random. When no target is healthy every target is eligible,
+    since failing over to a possibly-down target beats failing outright.
+    """
+
+    def __init__(
+        self,
+        bases: Sequence[str],
+        strategy: str = BALANCER_LEAST_OUTSTANDING,
+        decay: float = 0.3,
+        unhealthy_after: int = 2,
+        healthy_after: int = 2,
+    ) -> None:
+        if not bases:
+            raise ValueError("At least one upstream base URL is required")
+        self.targets: List[UpstreamTarget] = [UpstreamTarget(b) for b in bases]
+        self.strategy = (
+            strategy if strategy in BALANCERS else BALANCER_LEAST_OUTSTANDING
+        )
+        self._decay = min(1.0, max(0.0, decay))
+        self._unhealthy_after = max(1, unhealthy_after)
+        self._healthy_after = max(1, healthy_after)
+
+    def pick(
+        self, usable: Optional[Callable[[UpstreamTarget], bool]] = None
+    ) -> UpstreamTarget:
+        targets = self.targets
+        if len(targets) == 1:
+            return targets[0]
+        candidates = [t for t in targets if t.healthy] or targets
+        if usable is not None:
+            candidates = [t for t in candidates if usable(t)] or candidates
+        score = self._score
+        best = min(score(t) for t in candidates)
+        return random.choice([t for t in candidates if score(t) == best])
+
+    def _score(self, target: UpstreamTarget) -> float:
+        if self.strategy == BALANCER_EWMA:
+            return (target.outstanding + 1) * target.ewma
+        return float(target.outstanding)
+
+    def begin(self, target: UpstreamTarget) -> None:
+        target.outstanding += 1
+
+    def end(self, target: UpstreamTarget, elapsed: Optional[float]) -> None:
+        """Finish a request; ``elapsed`` is ``None`` when it failed."""
+        target.outstanding -= 1
+        if elapsed is None:
+            return
+        if target.ewma == 0.0:
+            target.ewma = elapsed
+        else:
+            target.ewma += self._decay * (elapsed - target.ewma)
+
+    def record_probe(self, target: UpstreamTarget, ok: bool) -> bool:
+        """Apply a health-check result; returns whether health changed."""
+        if ok:
+            target.failed_probes = 0
+            target.passed_probes += 1
+            if not target.healthy and target.passed_probes >= self._healthy_after:
+                target.healthy = True
+                return True
+        else:
+            target.passed_probes = 0
+            target.failed_probes += 1
+            if target.healthy and target.failed_probes >= self._unhealthy_after:
+                target.healthy = False
+                return True
+        return False
@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import time
+from collections import deque
+from typing import Callable, Deque, Tuple
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker.
+
+    After ``failure_threshold`` failures in a row the breaker opens and
+    ``allow`` rejects calls for ``reset_timeout`` seconds. It then lets a
+    single probe through (half-open): a success closes it, a failure opens it
+    again for another ``reset_timeout``.
+    """
+
+    __slots__ = (
+        "failure_threshold",
+        "reset_timeout",
+        "failures",
+        "opened_at",
+        "_probing",
+        "_clock",
+    )
+
+    def __init__(
+        self,
+        failure_threshold: int,
+        reset_timeout: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_timeout = max(0.0, float(reset_timeout))
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._probing = False
+        self._clock = clock
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return STATE_CLOSED
+        if self._clock() - self.opened_at < self.reset_timeout:
+            return STATE_OPEN
+        return STATE_HALF_OPEN
+
+    def retry_in(self) -> float:
+        """Seconds until the breaker lets a probe through (0 when it would)."""
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_timeout - self._clock())
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == STATE_CLOSED:
+            return True
+        if state == STATE_OPEN or self._probing:
+            return False
+        self._probing = True
+        return True
+
+    def release(self) -> None:
+        """Forget an allowed call that ended without a verdict (cancelled)."""
+        self._probing = False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            self.opened_at = self._clock()
+        self._probing = False
+
+
+class RateCircuitBreaker:
+    """Circuit breaker driven by the error and slow-call rates of the last
+    ``window`` calls.
+
+    It opens once at least ``min_calls`` outcomes are recorded and either
+    rate reaches its threshold. After ``reset_timeout`` seconds it lets
+    ``probes`` calls through: if they all succeed it closes with a clean
+    window, and a single failure opens it again.
+
+    Read ``generation`` right after ``allow()`` and pass it back to
+    ``record``/``release``: a call admitted before the breaker last opened
+    or closed then cannot pass for a probe.
+    """
+
+    def __init__(
+        self,
+        window: int,
+        min_calls: int,
+        error_rate: float,
+        slow_seconds: float,
+        slow_rate: float,
+        reset_timeout: float,
+        probes: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.window = max(1, int(window))
+        self.min_calls = max(1, min(int(min_calls), self.window))
+        self.error_rate = float(error_rate)
+        self.slow_seconds = float(slow_seconds)
+        self.slow_rate = float(slow_rate)
+        self.reset_timeout = max(0.0, float(reset_timeout))
+        self.probes = max(1, int(probes))
+        self._clock = clock
+        self._outcomes: Deque[Tuple[bool, bool]] = deque()
+        self._failures = 0
+        self._slow = 0
+        self.opened_at: float | None = None
+        self._probes_started = 0
+        self._probes_passed = 0
+        self._generation = 0
+
+    @property
+    def generation(self) -> int:
+        """Changes every time the breaker opens or closes."""
+        return self._generation
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return STATE_CLOSED
+        if self._clock() - self.opened_at < self.reset_timeout:
+            return STATE_OPEN
+        return STATE_HALF_OPEN
+
+    def retry_in(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_timeout - self._clock())
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == STATE_CLOSED:
+            return True
+        if state == STATE_OPEN or self._probes_started >= self.probes:
+            return False
+        self._probes_started += 1
+        return True
+
+    def release(self, generation: int | None = None) -> None:
+        """Forget an allowed call that ended without a verdict (cancelled)."""
+        if self._stale(generation):
+            return
+        if self.opened_at is not None and self._probes_started:
+            self._probes_started -= 1
+
+    def record(self, ok: bool, elapsed: float, generation: int | None = None) -> None:
+        if self._stale(generation):
+            # Admitted under a previous state; it says nothing about this one.
+            return
+        slow = elapsed >= self.slow_seconds
+        if self.opened_at is not None:
+            # Nothing is admitted while open: a half-open outcome is a probe's.
+            if self.state == STATE_HALF_OPEN:
+                self._record_probe(ok and not slow)
+            return
+        outcomes = self._outcomes
+        outcomes.append((ok, slow))
+        self._failures += not ok
+        self._slow += slow
+        if len(outcomes) > self.window:
+            old_ok, old_slow = outcomes.popleft()
+            self._failures -= not old_ok
+            self._slow -= old_slow
+        calls = len(outcomes)
+        if calls >= self.min_calls and (
+            self._failures >= self.error_rate * calls
+            or self._slow >= self.slow_rate * calls
+        ):
+            self._open()
+
+    def rates(self) -> Tuple[float, float]:
+        """Error and slow-call rates over the current window."""
+        calls = len(self._outcomes)
+        if not calls:
+            return 0.0, 0.0
+        return self._failures / calls, self._slow / calls
+
+    def _record_probe(self, ok: bool) -> None:
+        if not ok:
+            self._open()
+            return
+        self._probes_passed += 1
+        if self._probes_passed >= self.probes:
+            self.opened_at = None
+            self._probes_started = self._probes_passed = 0
+            self._generation += 1
+
+    def _stale(self, generation: int | None) -> bool:
+        return generation is not None and generation != self._generation
+
+    def _open(self) -> None:
+        self._generation += 1
+        self.opened_at = self._clock()
+        self._probes_started = self._probes_passed = 0
+        self._outcomes.clear()
+        self._failures = self._slow = 0
@@ -1,10 +1,36 @@
 from __future__ import annotations
 
 import json
-from typing import Any, Dict, List
+import os
+import tempfile
+from functools import cached_property
+from typing import Any, Dict, FrozenSet, List, Tuple
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+from app.core.micro_cache import CachePolicy, parse_cache_rules
+from app.core.rate_limit_rules import (
+    KEY_SCHEME_HASHTAG,
+    KEY_SCHEME_PLAIN,
+    KEY_SCHEMES,
+    RuleValue,
+    normalize_rule_options,
+    normalize_rule_value,
+)
+
+
+def _parse_rule_values(data: Dict[str, Any]) -> Dict[str, RuleValue]:
+    parsed: Dict[str, RuleValue] = {}
+    for key, raw in data.items():
+        value = normalize_rule_value(raw)
+        if value is not None:
+            parsed[str(key)] = value
+    return parsed
+
+
+def _parse_header_names(raw: str) -> Tuple[str, ...]:
+    return tuple(name.strip().lower() for name in raw.split(",") if name.strip())
+
 
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(
@@ -18,12 +44,116 @@ class Settings(BaseSettings):
     HOST: str = "0.0.0.0"
     PORT: int = 8080
     DEBUG: bool = False
+    # Worker processes started by ``python -m app.serve`` (0 = one per CPU).
+    # With more than one, metrics are aggregated through
+    # PROMETHEUS_MULTIPROC_DIR, which defaults to METRICS_MULTIPROC_DIR.
+    WORKERS: int = 1
+    # Startup warmup (Redis connection, Lua scripts, rules, upstream
+    # keepalive connections) is bounded by STARTUP_WARMUP_TIMEOUT seconds;
+    # the server accepts traffic only once it is done.
+    STARTUP_WARMUP: bool = True
+    STARTUP_WARMUP_TIMEOUT: float = 10.0
+    # Keepalive connections opened per upstream target during warmup.
+    PROXY_WARMUP_CONNECTIONS: int = 4
+    # On shutdown, in-flight requests and background work get this long to
+    # finish before connections are closed.
+    SHUTDOWN_DRAIN_SECONDS: float = 20.0
+    # /readyz serves a snapshot refreshed every READINESS_INTERVAL seconds
+    # (Redis PING, upstream health, pool use, event-loop lag); it reports
+    # not ready past these thresholds.
+    READINESS_INTERVAL: float = 1.0
+    READINESS_REDIS_TIMEOUT_MS: float = 250.0
+    READINESS_MAX_LOOP_LAG_MS: float = 500.0
+    READINESS_MAX_POOL_SATURATION: float = 0.9
+    METRICS_MULTIPROC_DIR: str = os.path.join(
+        tempfile.gettempdir(), "meli-proxy-metrics"
+    )
 
     MELI_API_URL: str = "https://api.mercadolibre.com"
 
-    @property
+    # Stream request/response bodies; bodies up to PROXY_BUFFER_MAX_BYTES
+    # (by Content-Length) are still buffered.
+    PROXY_STREAMING: bool = True
+    PROXY_BUFFER_MAX_BYTES: int = 64 * 1024
+
+    # Upstream connection pool. PROXY_POOL_TIMEOUT bounds the wait for a free
+    # connection; when it expires the request fails fast with 503.
+    PROXY_MAX_CONNECTIONS: int = 2000
+    PROXY_MAX_KEEPALIVE_CONNECTIONS: int = 2000
+    PROXY_KEEPALIVE_EXPIRY: float = 30.0
+    PROXY_CONNECT_TIMEOUT: float = 2.0
+    PROXY_READ_TIMEOUT: float = 10.0
+    PROXY_WRITE_TIMEOUT: float = 10.0
+    PROXY_POOL_TIMEOUT: float = 0.5
+    # Multiplex requests over few HTTP/2 connections (needs the "h2" package;
+    # falls back to HTTP/1.1 without it).
+    PROXY_HTTP2: bool = False
+    # Share one upstream call among concurrent identical GET/HEAD requests
+    # (same path, query and PROXY_COALESCE_VARY headers). Nothing is stored
+    # once the call completes.
+    PROXY_COALESCE: bool = False
+    PROXY_COALESCE_VARY: str = "accept,accept-encoding,accept-language,authorization"
+    # Opt-in response cache for GETs, per path prefix:
+    # {"/categories/": 60} or {"/sites/": {"ttl": 300, "stale": 60}} (seconds).
+    # Empty (default) disables caching.
+    PROXY_CACHE_RULES_JSON: str | None = None
+    PROXY_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    PROXY_CACHE_VARY: str = "accept,accept-encoding,accept-language,authorization"
+    # Circuit breaker per upstream host, and per prefix for the paths under
+    # PROXY_BREAKER_PREFIXES. It opens when, over the last
+    # PROXY_BREAKER_WINDOW calls (at least PROXY_BREAKER_MIN_CALLS), the share
+    # of errors (transport errors and 5xx) or of calls slower than
+    # PROXY_BREAKER_SLOW_MS reaches its rate; while open requests get a 503.
+    PROXY_BREAKER_ENABLED: bool = True
+    PROXY_BREAKER_PREFIXES: str = ""
+    PROXY_BREAKER_WINDOW: int = 50
+    PROXY_BREAKER_MIN_CALLS: int = 20
+    PROXY_BREAKER_ERROR_RATE: float = 0.5
+    PROXY_BREAKER_SLOW_MS: int = 5000
+    PROXY_BREAKER_SLOW_RATE: float = 0.8
+    PROXY_BREAKER_OPEN_SECONDS: float = 10.0
+    PROXY_BREAKER_HALF_OPEN_PROBES: int = 3
+
+    # Comma-separated upstream base URLs balanced per request; defaults to
+    # MELI_API_URL alone. PROXY_BALANCER is "least_outstanding" or "ewma".
+    PROXY_UPSTREAM_URLS: str | None = None
+    PROXY_BALANCER: str = "least_outstanding"
+    # Active health checks (only with more than one upstream): GET of this
+    # path on every target; it leaves the pool after
+    # PROXY_HEALTH_UNHEALTHY_AFTER failures in a row and comes back after
+    # PROXY_HEALTH_HEALTHY_AFTER successes.
+    PROXY_HEALTH_CHECK_PATH: str = "/sites"
+    PROXY_HEALTH_CHECK_INTERVAL: float = 5.0
+    PROXY_HEALTH_CHECK_TIMEOUT: float = 2.0
+    PROXY_HEALTH_UNHEALTHY_AFTER: int = 2
+    PROXY_HEALTH_HEALTHY_AFTER: int = 2
+
+    # Hedging for GET/HEAD (opt-in): when the first attempt is slower than
+    # the PROXY_HEDGE_PERCENTILE of recent upstream latencies (clamped to
+    # the min/max delay) a second attempt goes out, preferably to another
+    # target, and the first response wins.
+    PROXY_HEDGE: bool = False
+    PROXY_HEDGE_PERCENTILE: float = 95.0
+    PROXY_HEDGE_MIN_DELAY_MS: float = 5.0
+    PROXY_HEDGE_MAX_DELAY_MS: float = 1000.0
+    # GET/HEAD attempts retried after a connect error (0 disables).
+    PROXY_RETRY_ATTEMPTS: int = 1
+    # Hedges and retries together stay under this share of requests, plus
+    # PROXY_RETRY_BUDGET_MIN_PER_SECOND so quiet instances can retry too.
+    PROXY_RETRY_BUDGET_RATIO: float = 0.1
+    PROXY_RETRY_BUDGET_MIN_PER_SECOND: float = 5.0
+
+    @cached_property
     def PROXY_UPSTREAM_BASE(self) -> str:
-        return self.MELI_API_URL
+        return self.MELI_API_URL.rstrip("/")
+
+    @cached_property
+    def PROXY_UPSTREAM_BASES(self) -> Tuple[str, ...]:
+        urls = [
+            u.strip().rstrip("/") for u in (self.PROXY_UPSTREAM_URLS or "").split(",")
+        ]
+        bases = tuple(dict.fromkeys(u for u in urls if u))
+        return bases or (self.PROXY_UPSTREAM_BASE,)
 
     CORS_ORIGINS: List[str] = ["*"]
 
@@ -36,9 +166,57 @@ class Settings(BaseSettings):
 
     REDIS_INIT_RETRIES: int = 30
     REDIS_INIT_BACKOFF: float = 0.5
+    # Coalesce single limiter commands from concurrent requests into one
+    # pipeline, flushed on the next loop tick or after the window (µs).
+    REDIS_AUTO_PIPELINE: bool = True
+    REDIS_AUTO_PIPELINE_WINDOW_US: int = 0
+    REDIS_AUTO_PIPELINE_MAX_BATCH: int = 512
 
     RATE_LIMIT_DEFAULT: int = 0
     RATE_LIMIT_CACHE_SECONDS: float = 5.0
+    # Apply admin changes pushed on rl:config:events; polling becomes a safety net.
+    RATE_LIMIT_SUBSCRIBE_EVENTS: bool = True
+    RATE_LIMIT_SAFETY_POLL_SECONDS: float = 60.0
+    # Max blocked keys remembered in-process until their window resets (0 = off).
+    RATE_LIMIT_DENY_CACHE_SIZE: int = 10000
+    # Evaluate all matched rules atomically in one EVALSHA round trip.
+    RATE_LIMIT_USE_SCRIPT: bool = True
+    # Default counting algorithm for exact rules: "fixed", "sliding" or "gcra".
+    RATE_LIMIT_ALGORITHM: str = "fixed"
+    # Counter key layout: "plain", "hashtag" (cluster slot co-location) or
+    # "auto", which picks "hashtag" when REDIS_CLUSTER_NODES is set.
+    RATE_LIMIT_KEY_SCHEME: str = "auto"
+    # "approximate" rules count locally and flush with INCRBY every
+    # RATE_LIMIT_APPROX_FLUSH_MS or once the pending hits reach
+    # limit * RATE_LIMIT_APPROX_ERROR / RATE_LIMIT_INSTANCES.
+    RATE_LIMIT_APPROX_FLUSH_MS: int = 100
+    RATE_LIMIT_APPROX_ERROR: float = 0.01
+    # Processes sharing the limits (replicas x workers).
+    RATE_LIMIT_INSTANCES: int = 1
+    # "lease" rules reserve this share of the remaining window budget per
+    # lease and prefetch the next one when the unspent part of the last grant
+    # drops below RATE_LIMIT_LEASE_LOW_WATER.
+    RATE_LIMIT_LEASE_FRACTION: float = 0.05
+    RATE_LIMIT_LEASE_LOW_WATER: float = 0.2
+    # Rules with "shards" write to one sub-key per request ("random" or
+    # "worker") and check against the sum of all shards, refreshed every
+    # RATE_LIMIT_SHARD_REFRESH_MS or after limit * RATE_LIMIT_APPROX_ERROR /
+    # RATE_LIMIT_INSTANCES local hits.
+    RATE_LIMIT_SHARD_PICK: str = "random"
+    RATE_LIMIT_SHARD_REFRESH_MS: int = 100
+    # Deadline for each limiter decision that needs Redis. On timeout, error
+    # or an open breaker RATE_LIMIT_FAILURE_POLICY applies: "open" admits,
+    # "closed" rejects with 429 and "local" enforces limit /
+    # RATE_LIMIT_INSTANCES per process in memory.
+    RATE_LIMIT_REDIS_TIMEOUT_MS: int = 50
+    RATE_LIMIT_FAILURE_POLICY: str = "local"
+    # Bound for connecting to Redis and reloading the rules, which are kept
+    # out of the per-decision deadline above.
+    RATE_LIMIT_SETUP_TIMEOUT_MS: int = 1000
+    # Consecutive Redis failures that open the breaker, and how long it stays
+    # open before a single probe is let through.
+    RATE_LIMIT_BREAKER_FAILURES: int = 5
+    RATE_LIMIT_BREAKER_RESET_SECONDS: float = 5.0
 
     RATE_LIMIT_RULES_IP_JSON: str | None = None
     RATE_LIMIT_RULES_PATH_JSON: str | None = None
@@ -46,27 +224,34 @@ class Settings(BaseSettings):
 
     ADMIN_API_TOKENS: str | None = None
 
-    @property
-    def RATE_LIMIT_RULES_IP(self) -> Dict[str, int]:
+    @cached_property
+    def RATE_LIMIT_KEY_LAYOUT(self) -> str:
+        scheme = self.RATE_LIMIT_KEY_SCHEME.strip().lower()
+        if scheme in KEY_SCHEMES:
+            return scheme
+        return KEY_SCHEME_HASHTAG if self.REDIS_CLUSTER_NODES else KEY_SCHEME_PLAIN
+
+    @cached_property
+    def RATE_LIMIT_RULES_IP(self) -> Dict[str, RuleValue]:
         if self.RATE_LIMIT_RULES_IP_JSON:
             try:
                 data = json.loads(self.RATE_LIMIT_RULES_IP_JSON)
-                return {str(k): int(v) for k, v in dict(data).items()}
+                return _parse_rule_values(dict(data))
             except Exception:
                 pass
         return {"152.152.152.152": 1000}
 
-    @property
-    def RATE_LIMIT_RULES_PATH(self) -> Dict[str, int]:
+    @cached_property
+    def RATE_LIMIT_RULES_PATH(self) -> Dict[str, RuleValue]:
         if self.RATE_LIMIT_RULES_PATH_JSON:
             try:
                 data = json.loads(self.RATE_LIMIT_RULES_PATH_JSON)
-                return {str(k): int(v) for k, v in dict(data).items()}
+                return _parse_rule_values(dict(data))
             except Exception:
                 pass
         return {"/categories/": 10000}
 
-    @property
+    @cached_property
     def RATE_LIMIT_RULES_IP_PATH(self) -> List[Dict[str, Any]]:
         if self.RATE_LIMIT_RULES_IP_PATH_JSON:
             try:
@@ -79,9 +264,15 @@ class Settings(BaseSettings):
                         ip = str(item.get("ip", "")).strip()
                         prefix = str(item.get("path_prefix", ""))
                         limit = int(item.get("limit", 0))
+                        options = normalize_rule_options(item)
                         if ip and prefix and limit > 0:
                             out.append(
-                                {"ip": ip, "path_prefix": prefix, "limit": limit}
+                                {
+                                    "ip": ip,
+                                    "path_prefix": prefix,
+                                    "limit": limit,
+                                    **options,
+                                }
                             )
                     if out:
                         return out
@@ -89,7 +280,7 @@ class Settings(BaseSettings):
                 pass
         return [{"ip": "152.152.152.152", "path_prefix": "/items/", "limit": 10}]
 
-    @property
+    @cached_property
     def ADMIN_API_KEYS(self) -> List[str]:
         if not self.ADMIN_API_TOKENS:
             return []
@@ -99,3 +290,81 @@ class Settings(BaseSettings):
             if token and token.strip()
         ]
         return tokens
+
+    @cached_property
+    def ADMIN_API_KEY_SET(self) -> FrozenSet[str]:
+        return frozenset(self.ADMIN_API_KEYS)
+
+    @cached_property
+    def PROXY_COALESCE_VARY_HEADERS(self) -> Tuple[str, ...]:
+        return _parse_header_names(self.PROXY_COALESCE_VARY)
+
+    @cached_property
+    def PROXY_CACHE_VARY_HEADERS(self) -> Tuple[str, ...]:
+        return _parse_header_names(self.PROXY_CACHE_VARY)
+
+    @cached_property
+    def PROXY_BREAKER_PREFIX_LIST(self) -> Tuple[str, ...]:
+        prefixes = {p.strip() for p in self.PROXY_BREAKER_PREFIXES.split(",")}
+        # Longest first so the most specific prefix owns a path.
+        return tuple(sorted(filter(None, prefixes), key=len, reverse=True))
+
+    @cached_property
+    def PROXY_CACHE_POLICY(self) -> CachePolicy:
+        if self.PROXY_CACHE_RULES_JSON:
+            try:
+                data = json.loads(self.PROXY_CACHE_RULES_JSON)
+                return CachePolicy(parse_cache_rules(dict(data)))
+            except Exception:
+                pass
+        return CachePolicy({})
+
+    def precompute(self) -> Settings:
+        """Evaluate every derived value once so request paths only read them."""
+        for name in (
+            "PROXY_UPSTREAM_BASE",
+            "PROXY_UPSTREAM_BASES",
+            "RATE_LIMIT_KEY_LAYOUT",
+            "RATE_LIMIT_RULES_IP",
+            "RATE_LIMIT_RULES_PATH",
+            "RATE_LIMIT_RULES_IP_PATH",
+            "ADMIN_API_KEYS",
+            "ADMIN_API_KEY_SET",
+            "PROXY_COALESCE_VARY_HEADERS",
+            "PROXY_CACHE_VARY_HEADERS",
+            "PROXY_CACHE_POLICY",
+            "PROXY_BREAKER_PREFIX_LIST",
+        ):
+            getattr(self, name)
+        return self
+
+
+class _SettingsSingleton:
+    _instance: Settings | None = None
+
+    @classmethod
+    def get_instance(cls) -> Settings:
+        if cls._instance is None:
+            cls._instance = Settings().precompute()
+        return cls._instance
+
+    @classmethod
+    def set_instance(cls, settings: Settings | None) -> None:
+        cls._instance = settings
+
+
+def get_settings() -> Settings:
+    """Process-wide settings, built once and reused by every request."""
+    return _SettingsSingleton.get_instance()
+
+
+def reload_settings() -> Settings:
+    """Re-read the environment and env files and swap the shared settings."""
+    settings = Settings().precompute()
+    _SettingsSingleton.set_instance(settings)
+    return settings
+
+
+def _set_settings(settings: Settings | None) -> None:
+    """Visible for tests to override or reset the shared settings."""
+    _SettingsSingleton.set_instance(settings)
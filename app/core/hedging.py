@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import math
+import time
+from collections import deque
+from typing import Callable, Deque, List, Optional
+
+
+class LatencyTracker:
+    """Recent latency samples and their percentiles.
+
+    Keeps the last ``window`` samples; percentiles come from a sorted copy
+    that is rebuilt at most every ``refresh`` new samples, so reading them
+    on every request stays cheap.
+    """
+
+    def __init__(self, window: int = 1000, min_samples: int = 20) -> None:
+        self.window = max(1, int(window))
+        self.min_samples = max(1, min(int(min_samples), self.window))
+        self._refresh = max(1, self.window // 10)
+        self._samples: Deque[float] = deque(maxlen=self.window)
+        self._sorted: List[float] = []
+        self._pending = 0
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append(seconds)
+        self._pending += 1
+
+    def percentile(self, p: float) -> Optional[float]:
+        """The ``p``-th percentile (0-100), or ``None`` with too few samples."""
+        if len(self._samples) < self.min_samples:
+            return None
+        if self._pending >= self._refresh or not self._sorted:
+            self._sorted = sorted(self._samples)
+            self._pending = 0
+        ordered = self._sorted
+        rank = math.ceil(min(100.0, max(0.0, p)) / 100 * len(ordered)) - 1
+        return ordered[max(0, rank)]
+
+
+class RetryBudget:
+    """Caps hedges and retries to a share of the regular traffic.
+
+    Every request deposits ``ratio`` tokens and the budget also refills at
+    ``min_per_second`` so quiet instances can still retry; each extra
+    attempt withdraws one token. The balance never exceeds
+    ``max(1, min_per_second)``, so an outage cannot be met with a burst of
+    retries saved up while everything was fine.
+    """
+
+    def __init__(
+        self,
+        ratio: float,
+        min_per_second: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.ratio = max(0.0, float(ratio))
+        self.min_per_second = max(0.0, float(min_per_second))
+        self.capacity = max(1.0, self.min_per_second)
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+
+    @property
+    def tokens(self) -> float:
+        self._refill()
+        return self._tokens
+
+    def deposit(self) -> None:
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens + self.ratio)
+
+    def try_withdraw(self) -> bool:
+        self._refill()
+        if self._tokens < 1.0:
+            return False
+        self._tokens -= 1.0
+        return True
+
+    def _refill(self) -> None:
+        now = self._clock()
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._updated = now
+            self._tokens = min(
+                self.capacity, self._tokens + elapsed * self.min_per_second
+            )
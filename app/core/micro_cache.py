@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Generic, Hashable, Mapping, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# Response directives that forbid a shared cache from storing the response.
+_UNCACHEABLE = frozenset({"no-store", "no-cache", "private"})
+
+
+@dataclass(frozen=True, slots=True)
+class CacheRule:
+    # Longest a response may be served fresh; upstream max-age can lower it.
+    ttl: float
+    # How long an expired entry may still be served while it is refreshed.
+    stale: float = 0.0
+
+
+def parse_cache_rules(data: Mapping[str, Any]) -> Dict[str, CacheRule]:
+    """Parse ``{prefix: ttl}`` or ``{prefix: {"ttl": s, "stale": s}}``.
+
+    Rules without a positive TTL are dropped; malformed values raise
+    ``ValueError``/``TypeError``.
+    """
+    rules: Dict[str, CacheRule] = {}
+    for prefix, value in data.items():
+        if isinstance(value, dict):
+            ttl = float(value.get("ttl", 0))
+            stale = float(value.get("stale", 0))
+        else:
+            ttl, stale = float(value), 0.0
+        if stale < 0:
+            raise ValueError("stale must not be negative")
+        if prefix and ttl > 0:
+            rules[str(prefix)] = CacheRule(ttl, stale)
+    return rules
+
+
+class CachePolicy:
+    """Path prefix -> ``CacheRule`` lookup; the longest prefix wins."""
+
+    __slots__ = ("_rules",)
+
+    def __init__(self, rules: Mapping[str, CacheRule]) -> None:
+        self._rules: Tuple[Tuple[str, CacheRule], ...] = tuple(
+            sorted(rules.items(), key=lambda item: len(item[0]), reverse=True)
+        )
+
+    def __bool__(self) -> bool:
+        return bool(self._rules)
+
+    def match(self, path: str) -> Optional[CacheRule]:
+        for prefix, rule in self._rules:
+            if path.startswith(prefix):
+                return rule
+        return None
+
+
+def cache_lifetime(
+    rule: CacheRule, cache_control: Optional[str]
+) -> Optional[Tuple[float, float]]:
+    """Fresh and stale-while-revalidate seconds for a response, or ``None``
+    when its ``Cache-Control`` forbids caching.
+
+    The rule's values are upper bounds: ``s-maxage``/``max-age`` and
+    ``stale-while-revalidate`` from upstream can only shorten them.
+    """
+    ttl, stale = rule.ttl, rule.stale
+    max_age: Optional[float] = None
+    for directive in (cache_control or "").lower().split(","):
+        name, _, value = directive.strip().partition("=")
+        if name in _UNCACHEABLE:
+            return None
+        try:
+            seconds = float(value.strip().strip('"'))
+        except ValueError:
+            continue
+        if name == "s-maxage" or (name == "max-age" and max_age is None):
+            max_age = seconds
+        elif name == "stale-while-revalidate":
+            stale = min(stale, seconds)
+    if max_age is not None:
+        ttl = min(ttl, max_age)
+    if ttl <= 0:
+        return None
+    return ttl, stale
+
+
+class _Entry(Generic[T]):
+    __slots__ = ("value", "size", "fresh_until", "stale_until", "refreshing")
+
+    def __init__(
+        self, value: T, size: int, fresh_until: float, stale_until: float
+    ) -> None:
+        self.value = value
+        self.size = size
+        self.fresh_until = fresh_until
+        self.stale_until = stale_until
+        self.refreshing = False
+
+
+class MicroCache(Generic[T]):
+    """LRU cache bounded by the total size of its values in bytes.
+
+    ``get`` returns the value with a ``fresh`` flag: stale values are still
+    returned until their stale window ends, and ``claim_refresh`` makes sure
+    only one caller refreshes each of them.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self._max_bytes = max(0, int(max_bytes))
+        self._entries: OrderedDict[Hashable, _Entry[T]] = OrderedDict()
+        self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def max_bytes(self) -> int:
+        return self._max_bytes
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def get(self, key: Hashable, now: float) -> Tuple[Optional[T], bool]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None, False
+        if now >= entry.stale_until:
+            self._remove(key)
+            return None, False
+        self._entries.move_to_end(key)
+        return entry.value, now < entry.fresh_until
+
+    def claim_refresh(self, key: Hashable) -> bool:
+        entry = self._entries.get(key)
+        if entry is None or entry.refreshing:
+            return False
+        entry.refreshing = True
+        return True
+
+    def put(
+        self,
+        key: Hashable,
+        value: T,
+        size: int,
+        now: float,
+        ttl: float,
+        stale: float = 0.0,
+    ) -> bool:
+        self._remove(key)
+        if size > self._max_bytes:
+            return False
+        self._entries[key] = _Entry(value, size, now + ttl, now + ttl + stale)
+        self._bytes += size
+        while self._bytes > self._max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+        return True
+
+    def release(self, key: Hashable) -> None:
+        """Give up a refresh claim without replacing the value."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.refreshing = False
+
+    def discard(self, key: Hashable) -> None:
+        self._remove(key)
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
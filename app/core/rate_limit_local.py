@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Sequence, Tuple
+
+from app.core.rate_limit_rules import RateLimitRule
+
+
+class DenyCache:
+    """Bounded in-process memory of keys known to be over their limit.
+
+    Entries expire at the deadline given on ``add`` (the window reset); the
+    least recently used entry is evicted once ``max_entries`` is reached.
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        self._max_entries = max(0, int(max_entries))
+        self._entries: OrderedDict[Hashable, float] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def enabled(self) -> bool:
+        return self._max_entries > 0
+
+    def add(self, key: Hashable, ttl_seconds: float) -> None:
+        if not self.enabled or ttl_seconds <= 0:
+            return
+        self._entries[key] = time.monotonic() + ttl_seconds
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def remaining(self, key: Hashable) -> float | None:
+        """Seconds left for a cached denial, or ``None`` when not denied."""
+        deadline = self._entries.get(key)
+        if deadline is None:
+            return None
+        left = deadline - time.monotonic()
+        if left <= 0:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return left
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+class ApproximateCounter:
+    """Per-process view of an approximate rule's counter for one window.
+
+    ``global_count`` is the total Redis returned on the last flush and
+    ``pending`` the hits counted locally since then.
+    """
+
+    __slots__ = ("window_id", "global_count", "pending", "last_flush", "flushing")
+
+    def __init__(self, window_id: int) -> None:
+        self.window_id = window_id
+        self.global_count = 0
+        self.pending = 0
+        self.last_flush = float("-inf")
+        self.flushing = False
+
+    def estimate(self) -> int:
+        return self.global_count + self.pending
+
+    def due(self, now: float, interval: float, max_pending: int) -> bool:
+        if self.flushing or self.pending <= 0:
+            return False
+        return self.pending >= max_pending or now - self.last_flush >= interval
+
+
+class QuotaLease:
+    """Tokens reserved from a rule's window budget and spent in memory.
+
+    ``reserved`` is the global counter returned with the last grant and
+    ``refill`` the in-flight request for the next lease, if any.
+    """
+
+    __slots__ = ("window_id", "tokens", "last_grant", "reserved", "exhausted", "refill")
+
+    def __init__(self, window_id: int) -> None:
+        self.window_id = window_id
+        self.tokens = 0
+        self.last_grant = 0
+        self.reserved = 0
+        self.exhausted = False
+        self.refill: asyncio.Task[None] | None = None
+
+    def take(self) -> bool:
+        if self.tokens <= 0:
+            return False
+        self.tokens -= 1
+        return True
+
+    def running_low(self, low_water: float) -> bool:
+        return (
+            not self.exhausted
+            and self.refill is None
+            and self.tokens < self.last_grant * low_water
+        )
+
+
+class FallbackLimiter:
+    """In-memory fixed-window limiter used while Redis is unavailable.
+
+    Each process enforces its share of a rule's limit: the limit divided by
+    the number of instances, rounded down but never below one request.
+    """
+
+    def __init__(self, instances: int) -> None:
+        self._instances = max(1, int(instances))
+        self._window_id: int | None = None
+        self._counts: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def share(self, limit: int) -> int:
+        return max(1, limit // self._instances)
+
+    def hit(
+        self, rules: Sequence[RateLimitRule], window_id: int
+    ) -> Tuple[Optional[RateLimitRule], int]:
+        """Count one request against every rule unless one is exhausted.
+
+        Returns the first exhausted rule (``None`` when admitted) and the
+        remaining share of the most specific rule.
+        """
+        if window_id != self._window_id:
+            self._window_id = window_id
+            self._counts.clear()
+        counts = self._counts
+        for rule in rules:
+            if counts.get(rule.key_prefix, 0) >= self.share(rule.limit):
+                return rule, 0
+        for rule in rules:
+            counts[rule.key_prefix] = counts.get(rule.key_prefix, 0) + 1
+        first = rules[0]
+        return None, self.share(first.limit) - counts[first.key_prefix]
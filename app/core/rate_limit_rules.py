@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Mapping, Tuple, Union
+
+MODE_EXACT = "exact"
+MODE_APPROXIMATE = "approximate"
+MODE_LEASE = "lease"
+RULE_MODES = (MODE_EXACT, MODE_APPROXIMATE, MODE_LEASE)
+
+# ``plain`` keys look like ``rl:{scope}:{ident}``. ``hashtag`` keys carry a
+# Redis Cluster hash tag: the client IP for ip and ip+path rules, so one
+# client's counters share a slot, and the prefix for the global path rules.
+KEY_SCHEME_PLAIN = "plain"
+KEY_SCHEME_HASHTAG = "hashtag"
+KEY_SCHEMES = (KEY_SCHEME_PLAIN, KEY_SCHEME_HASHTAG)
+
+# Counting algorithms for exact, unsharded rules. ``sliding`` weights the
+# previous window's counter by the share of it still inside the last minute;
+# ``gcra`` keeps one theoretical-arrival-time key per rule and identity.
+ALGORITHM_FIXED = "fixed"
+ALGORITHM_SLIDING = "sliding"
+ALGORITHM_GCRA = "gcra"
+ALGORITHMS = (ALGORITHM_FIXED, ALGORITHM_SLIDING, ALGORITHM_GCRA)
+
+# Upper bound for the ``shards`` rule option.
+MAX_SHARDS = 1024
+
+# A rule value is either a plain limit or ``{"limit": n, <options>}``.
+RuleValue = Union[int, Dict[str, Any]]
+
+
+def normalize_rule_options(value: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate per-rule options and keep only the non-default ones."""
+    options: Dict[str, Any] = {}
+    mode = str(value.get("mode") or MODE_EXACT)
+    if mode not in RULE_MODES:
+        raise ValueError(f"Unknown rate-limit mode: {mode}")
+    if mode != MODE_EXACT:
+        options["mode"] = mode
+    shards = int(value.get("shards") or 1)
+    if not 1 <= shards <= MAX_SHARDS:
+        raise ValueError(f"shards must be between 1 and {MAX_SHARDS}")
+    if shards > 1:
+        options["shards"] = shards
+    algorithm = value.get("algorithm")
+    if algorithm is not None:
+        # Kept even when "fixed": it overrides RATE_LIMIT_ALGORITHM.
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Unknown rate-limit algorithm: {algorithm}")
+        options["algorithm"] = algorithm
+    if value.get("burst") is not None:
+        # Kept even when 0: unset means a whole window's worth of burst.
+        burst = int(value["burst"])
+        if burst < 0:
+            raise ValueError("burst must not be negative")
+        options["burst"] = burst
+    return options
+
+
+def normalize_rule_value(value: Any) -> RuleValue | None:
+    """Normalize a limit or rule spec; ``None`` when the limit is not positive.
+
+    Raises ``ValueError``/``TypeError`` for values that cannot be parsed.
+    """
+    if isinstance(value, dict):
+        limit = int(value.get("limit", 0))
+        if limit <= 0:
+            return None
+        options = normalize_rule_options(value)
+        return {"limit": limit, **options} if options else limit
+    limit = int(value)
+    return limit if limit > 0 else None
+
+
+@dataclass(frozen=True, slots=True)
+class RateLimitRule:
+    scope: str
+    ident: str
+    limit: int
+    key_prefix: str
+    mode: str = MODE_EXACT
+    # Hash tag shared by counters that must live on one cluster slot.
+    tag: str = ""
+    # Exact-mode counters split across this many sub-keys (hot paths).
+    shards: int = 1
+    algorithm: str = ALGORITHM_FIXED
+    # GCRA only: requests admitted at once on top of the steady rate.
+    burst: int = 0
+
+    @classmethod
+    def build(
+        cls,
+        scope: str,
+        ident: str,
+        limit: int,
+        mode: str = MODE_EXACT,
+        tag: str = "",
+        shards: int = 1,
+        algorithm: str = ALGORITHM_FIXED,
+        burst: int | None = None,
+    ) -> RateLimitRule:
+        # Without an explicit burst a GCRA rule admits ``limit`` requests at
+        # once, like a fresh fixed window, instead of one per interval.
+        if burst is None:
+            burst = limit - 1
+        prefix = f"rl:{{{tag}}}:{scope}:{ident}" if tag else f"rl:{scope}:{ident}"
+        return cls(scope, ident, limit, prefix, mode, tag, shards, algorithm, burst)
+
+    @classmethod
+    def from_value(
+        cls,
+        scope: str,
+        ident: str,
+        value: RuleValue,
+        tag: str = "",
+        algorithm: str = ALGORITHM_FIXED,
+    ) -> RateLimitRule:
+        if not isinstance(value, dict):
+            return cls.build(scope, ident, int(value), tag=tag, algorithm=algorithm)
+        mode = value.get("mode", MODE_EXACT)
+        # Approximate and leased rules already avoid per-request writes and
+        # count in fixed windows.
+        shards = int(value.get("shards", 1)) if mode == MODE_EXACT else 1
+        if mode != MODE_EXACT or shards > 1:
+            algorithm = ALGORITHM_FIXED
+        else:
+            algorithm = value.get("algorithm", algorithm)
+        limit = int(value["limit"])
+        burst = value.get("burst")
+        if burst is not None:
+            burst = int(burst)
+        return cls.build(scope, ident, limit, mode, tag, shards, algorithm, burst)
+
+    def shard_prefix(self, shard: int) -> str:
+        """Key prefix of one sub-counter; each shard gets its own hash tag."""
+        if self.tag:
+            return f"rl:{{{self.tag}#{shard}}}:{self.scope}:{self.ident}"
+        return f"{self.key_prefix}#{shard}"
+
+
+class PrefixIndex:
+    """Prefix -> value table bucketed by prefix length.
+
+    A lookup slices the path once per distinct prefix length and does a dict
+    hit per slice, so the cost is bounded by the path length rather than by
+    the number of prefixes.
+    """
+
+    __slots__ = ("_by_prefix", "_lengths")
+
+    def __init__(self, items: Dict[str, RateLimitRule]) -> None:
+        self._by_prefix: Dict[str, RateLimitRule] = dict(items)
+        self._lengths: Tuple[int, ...] = tuple(
+            sorted({len(prefix) for prefix in items}, reverse=True)
+        )
+
+    def __len__(self) -> int:
+        return len(self._by_prefix)
+
+    def match(self, path: str, out: List[RateLimitRule]) -> None:
+        size = len(path)
+        by_prefix = self._by_prefix
+        for length in self._lengths:
+            if length > size:
+                continue
+            rule = by_prefix.get(path[:length])
+            if rule is not None:
+                out.append(rule)
+
+
+class RuleIndex:
+    """Immutable compiled view of the ip, path and ip+path rule sets."""
+
+    __slots__ = ("_ip", "_path", "_ip_path")
+
+    def __init__(
+        self,
+        ip: Dict[str, RateLimitRule],
+        path: PrefixIndex,
+        ip_path: Dict[str, PrefixIndex],
+    ) -> None:
+        self._ip = ip
+        self._path = path
+        self._ip_path = ip_path
+
+    def match(self, client_ip: str, path: str) -> List[RateLimitRule]:
+        """Return matched rules, most specific first."""
+        matched: List[RateLimitRule] = []
+        per_ip = self._ip_path.get(client_ip)
+        if per_ip is not None:
+            per_ip.match(path, matched)
+        self._path.match(path, matched)
+        ip_rule = self._ip.get(client_ip)
+        if ip_rule is not None:
+            matched.append(ip_rule)
+        return matched
+
+
+def compile_rules(
+    ip_rules: Mapping[str, RuleValue],
+    path_rules: Mapping[str, RuleValue],
+    ip_path_rules: List[Dict[str, Any]],
+    key_scheme: str = KEY_SCHEME_PLAIN,
+    algorithm: str = ALGORITHM_FIXED,
+) -> RuleIndex:
+    """Build a ``RuleIndex`` from already normalized rule sets.
+
+    ``algorithm`` applies to rules that do not choose one themselves.
+    """
+    tagged = key_scheme == KEY_SCHEME_HASHTAG
+    ip = {
+        ip: RateLimitRule.from_value("ip", ip, value, ip if tagged else "", algorithm)
+        for ip, value in ip_rules.items()
+    }
+    path = PrefixIndex(
+        {
+            prefix: RateLimitRule.from_value(
+                "path", prefix, value, f"path:{prefix}" if tagged else "", algorithm
+            )
+            for prefix, value in path_rules.items()
+            if prefix
+        }
+    )
+
+    grouped: Dict[str, Dict[str, RateLimitRule]] = {}
+    for item in ip_path_rules:
+        client_ip = str(item.get("ip", ""))
+        prefix = str(item.get("path_prefix", ""))
+        limit = int(item.get("limit", 0))
+        if not client_ip or not prefix or limit <= 0:
+            continue
+        grouped.setdefault(client_ip, {})[prefix] = RateLimitRule.from_value(
+            "ippath",
+            f"{client_ip}:{prefix}",
+            item,
+            client_ip if tagged else "",
+            algorithm,
+        )
+
+    return RuleIndex(
+        ip,
+        path,
+        {client_ip: PrefixIndex(rules) for client_ip, rules in grouped.items()},
+    )
@@ -1,22 +1,89 @@
+import asyncio
+import contextlib
+import logging
+import signal
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
 from dotenv import load_dotenv
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from prometheus_fastapi_instrumentator import Instrumentator
 
-from app.core.config import Settings
-from app.presentation.api.middlewares.rate_limit import rate_limit_middleware
+from app.core.config import get_settings, reload_settings
+from app.presentation.api.middlewares.rate_limit import (
+    RateLimitMiddleware,
+    get_rate_limiter,
+)
 from app.presentation.api.routes import register_routes
+from app.presentation.lifecycle import drain, set_ready, warm_up
+from app.presentation.metrics import start_worker_metrics, stop_worker_metrics
+from app.presentation.proxy import _get_client
 from app.presentation.proxy import router as proxy_router
+from app.presentation.readiness import (
+    refresh_readiness,
+    start_readiness_monitor,
+    stop_readiness_monitor,
+)
+from app.presentation.upstream_pool import start_health_checks, stop_health_checks
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+
+def _reload_on_sighup() -> None:
+    reload_settings()
+    get_rate_limiter()
+    logger.info("Settings reloaded on SIGHUP")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    loop = asyncio.get_running_loop()
+    sighup = getattr(signal, "SIGHUP", None)
+    if sighup is not None:
+        # Not available on Windows event loops.
+        with contextlib.suppress(NotImplementedError, RuntimeError, ValueError):
+            loop.add_signal_handler(sighup, _reload_on_sighup)
+
+    start_worker_metrics()
+    settings = get_settings()
+    if settings.STARTUP_WARMUP:
+        # uvicorn only starts accepting connections once startup returns.
+        await warm_up(settings)
+    limiter = get_rate_limiter()
+    # Push-based rule invalidation from the admin API.
+    limiter.start_subscriber()
+    # Takes failing upstream targets out of the balancer and back in.
+    start_health_checks(_get_client())
+    # /readyz has a snapshot to serve from the first probe on.
+    await refresh_readiness()
+    start_readiness_monitor()
+    set_ready(True)
+    try:
+        yield
+    finally:
+        set_ready(False)
+        await stop_readiness_monitor()
+        await stop_health_checks()
+        await limiter.stop_subscriber()
+        # Unspent quota leases go back to the shared budget.
+        await limiter.release_leases()
+        await drain(get_settings())
+        await stop_worker_metrics()
+        if sighup is not None:
+            with contextlib.suppress(NotImplementedError, RuntimeError, ValueError):
+                loop.remove_signal_handler(sighup)
+
 
 def create_app() -> FastAPI:
-    settings = Settings()
+    settings = get_settings()
 
     app = FastAPI(
         title=settings.API_TITLE,
         version=settings.API_VERSION,
+        lifespan=lifespan,
         openapi_url="/openapi.json",
         docs_url="/docs",
         redoc_url="/redoc",
@@ -30,8 +97,8 @@ def create_app() -> FastAPI:
         allow_headers=["*"],
     )
 
-    # Rate limit middleware (Redis backed)
-    app.middleware("http")(rate_limit_middleware)
+    # Rate limit middleware (Redis backed, raw ASGI)
+    app.add_middleware(RateLimitMiddleware)
 
     # Health and other small routes
     register_routes(app, prefix="")
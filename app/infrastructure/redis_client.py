@@ -1,13 +1,15 @@
 from __future__ import annotations
 
 import asyncio
+import contextlib
+import os
 import random
-from typing import Awaitable, Sequence
+from typing import Any, Awaitable, Dict, List, Sequence, Set, Tuple, Union
 
 import redis.asyncio as redis
 from redis.asyncio.cluster import ClusterNode
 
-from app.core.config import Settings
+from app.core.config import get_settings
 
 
 def _parse_cluster_nodes(nodes: str) -> Sequence[tuple[str, int]]:
@@ -56,11 +58,11 @@ async def _wait_ready(
 
 class _RedisClientSingleton:
     _client: redis.Redis | redis.RedisCluster | None = None
-    _lock: asyncio.Lock | None = None
+    _creating: asyncio.Task[redis.Redis | redis.RedisCluster] | None = None
 
     @classmethod
     async def _create_client(cls) -> redis.Redis | redis.RedisCluster:
-        settings = Settings()
+        settings = get_settings()
         if settings.REDIS_CLUSTER_NODES:
             startup_nodes = _parse_cluster_nodes(settings.REDIS_CLUSTER_NODES)
             client: redis.Redis | redis.RedisCluster = redis.RedisCluster(
@@ -78,9 +80,14 @@ class _RedisClientSingleton:
                 decode_responses=False,
             )
 
-        await _wait_ready(
-            client, settings.REDIS_INIT_RETRIES, settings.REDIS_INIT_BACKOFF
-        )
+        try:
+            await _wait_ready(
+                client, settings.REDIS_INIT_RETRIES, settings.REDIS_INIT_BACKOFF
+            )
+        except BaseException:
+            # Never ready or cancelled (shutdown): release its connections.
+            await client.aclose()
+            raise
         return client
 
     @classmethod
@@ -88,15 +95,166 @@ class _RedisClientSingleton:
         if cls._client is not None:
             return cls._client
 
-        if cls._lock is None:
-            cls._lock = asyncio.Lock()
+        if cls._creating is None:
+            cls._creating = asyncio.ensure_future(cls._create_client())
+            cls._creating.add_done_callback(cls._created)
+        # Shielded: a caller giving up (deadline, disconnect) must not abort
+        # the connection every later caller is waiting for.
+        return await asyncio.shield(cls._creating)
 
-        async with cls._lock:
-            if cls._client is not None:
-                return cls._client
-            cls._client = await cls._create_client()
-            return cls._client
+    @classmethod
+    def _created(cls, task: asyncio.Task[redis.Redis | redis.RedisCluster]) -> None:
+        if cls._creating is not task:
+            return
+        cls._creating = None
+        # Retrieving the error also keeps asyncio from logging it as unhandled
+        # when every waiter had already given up.
+        if not task.cancelled() and task.exception() is None:
+            cls._client = task.result()
+
+    @classmethod
+    def connected(cls) -> bool:
+        return cls._client is not None
+
+    @classmethod
+    async def close(cls) -> None:
+        task, cls._creating = cls._creating, None
+        if task is not None:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError, Exception):
+                await task
+        client, cls._client = cls._client, None
+        if client is not None:
+            await client.aclose()
+
+    @classmethod
+    def _forget(cls) -> None:
+        # Sockets and the pending connect belong to the parent's event loop.
+        cls._client = None
+        cls._creating = None
 
 
 async def get_redis() -> redis.Redis | redis.RedisCluster:
     return await _RedisClientSingleton.get_client()
+
+
+def redis_connected() -> bool:
+    """Whether the shared client is already connected (``get_redis`` will
+    not wait)."""
+    return _RedisClientSingleton.connected()
+
+
+_Queued = Tuple[Tuple[Any, ...], Dict[str, Any], "asyncio.Future[Any]"]
+
+
+class AutoPipeline:
+    """Batches single commands issued by concurrent coroutines.
+
+    Commands queued during one event-loop iteration (or within ``window``
+    seconds) are sent as one non-transactional pipeline, and each result or
+    error is handed back to the coroutine that issued it. Commands that must
+    reach every node, such as ``SCRIPT LOAD``, go straight to the client.
+    """
+
+    def __init__(
+        self,
+        client: redis.Redis | redis.RedisCluster,
+        window: float = 0.0,
+        max_batch: int = 512,
+    ) -> None:
+        self.client = client
+        self._window = max(0.0, window)
+        self._max_batch = max(1, max_batch)
+        self._queue: List[_Queued] = []
+        self._scheduled = False
+        self._inflight: Set[asyncio.Task[None]] = set()
+
+    async def execute_command(self, *args: Any, **options: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[Any] = loop.create_future()
+        self._queue.append((args, options, future))
+        if len(self._queue) >= self._max_batch:
+            self._flush()
+        elif not self._scheduled:
+            self._scheduled = True
+            if self._window:
+                loop.call_later(self._window, self._flush)
+            else:
+                loop.call_soon(self._flush)
+        return await future
+
+    async def get(self, name: str) -> Any:
+        return await self.execute_command("GET", name)
+
+    async def evalsha(self, sha: str, numkeys: int, *keys_and_args: Any) -> Any:
+        return await self.execute_command("EVALSHA", sha, numkeys, *keys_and_args)
+
+    async def script_load(self, script: str) -> Any:
+        return await self.client.script_load(script)
+
+    def _flush(self) -> None:
+        self._scheduled = False
+        batch, self._queue = self._queue, []
+        if batch:
+            task = asyncio.ensure_future(self._send(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _send(self, batch: List[_Queued]) -> None:
+        pipe = self.client.pipeline(transaction=False)
+        for args, options, _ in batch:
+            pipe.execute_command(*args, **options)
+        try:
+            results = await pipe.execute(raise_on_error=False)
+        except Exception as exc:
+            results = [exc] * len(batch)
+        for (_, _, future), result in zip(batch, results):
+            if future.done():
+                # The waiting request was cancelled meanwhile.
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+RedisCommands = Union[redis.Redis, redis.RedisCluster, AutoPipeline]
+
+
+class _AutoPipelineSingleton:
+    _pipeline: AutoPipeline | None = None
+
+    @classmethod
+    async def get_pipeline(cls) -> RedisCommands:
+        settings = get_settings()
+        client = await get_redis()
+        if not settings.REDIS_AUTO_PIPELINE:
+            return client
+        if cls._pipeline is None or cls._pipeline.client is not client:
+            cls._pipeline = AutoPipeline(
+                client,
+                settings.REDIS_AUTO_PIPELINE_WINDOW_US / 1_000_000,
+                settings.REDIS_AUTO_PIPELINE_MAX_BATCH,
+            )
+        return cls._pipeline
+
+
+async def get_auto_pipeline() -> RedisCommands:
+    """Client for the limiter's single-command hot path (scripts, GETs)."""
+    return await _AutoPipelineSingleton.get_pipeline()
+
+
+async def close_redis() -> None:
+    """Close the shared client's connections; a later call reconnects."""
+    _AutoPipelineSingleton._pipeline = None
+    await _RedisClientSingleton.close()
+
+
+def _after_fork_in_child() -> None:
+    """A forked worker (e.g. gunicorn with preload) opens its own pool."""
+    _RedisClientSingleton._forget()
+    _AutoPipelineSingleton._pipeline = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+from typing import Any, Sequence
+
+from redis.exceptions import NoScriptError
+
+from app.infrastructure.redis_client import RedisCommands
+
+# Fixed-window check-and-increment over every rule matched by a request.
+#
+# KEYS[i]   counter key for rule i, ordered by precedence (most specific first)
+# ARGV[1]   TTL in seconds applied only when a counter is created
+# ARGV[i+1] limit for KEYS[i]
+#
+# Returns {allowed, rule_index (1-based), remaining, reset_seconds}. Nothing is
+# incremented once any rule denies, so blocked clients do not inflate counters.
+FIXED_WINDOW_LUA = """
+local ttl = tonumber(ARGV[1])
+for i = 1, #KEYS do
+  local current = tonumber(redis.call('GET', KEYS[i]) or '0')
+  if current >= tonumber(ARGV[i + 1]) then
+    return {0, i, 0, redis.call('TTL', KEYS[i])}
+  end
+end
+local remaining = 0
+local reset = ttl
+for i = 1, #KEYS do
+  local count = redis.call('INCR', KEYS[i])
+  if count == 1 then
+    redis.call('EXPIRE', KEYS[i], ttl)
+  end
+  if i == 1 then
+    remaining = tonumber(ARGV[2]) - count
+    if count > 1 then
+      reset = redis.call('TTL', KEYS[i])
+    end
+  end
+end
+return {1, 1, remaining, reset}
+"""
+
+
+# Sliding-window-counter check-and-increment; fixed-window rules may be mixed in.
+#
+# KEYS[2i-1] current window counter for rule i (most specific first)
+# KEYS[2i]   previous window counter for rule i
+# ARGV[3i-2] limit for rule i
+# ARGV[3i-1] weight of the previous window (0 for fixed-window rules)
+# ARGV[3i]   TTL in seconds applied only when the current counter is created
+#
+# A rule denies once floor(previous * weight) + current reaches its limit.
+# Returns {allowed, rule_index (1-based), current, previous} for the denying
+# rule, or for rule 1 (after incrementing) when every rule allows.
+SLIDING_WINDOW_LUA = """
+local previous = {}
+for i = 1, #KEYS / 2 do
+  local current = tonumber(redis.call('GET', KEYS[2 * i - 1]) or '0')
+  local weight = tonumber(ARGV[3 * i - 1])
+  previous[i] = 0
+  if weight > 0 then
+    previous[i] = tonumber(redis.call('GET', KEYS[2 * i]) or '0')
+  end
+  if math.floor(previous[i] * weight) + current >= tonumber(ARGV[3 * i - 2]) then
+    return {0, i, current, previous[i]}
+  end
+end
+local first = 0
+for i = 1, #KEYS / 2 do
+  local count = redis.call('INCR', KEYS[2 * i - 1])
+  if count == 1 then
+    redis.call('EXPIRE', KEYS[2 * i - 1], ARGV[3 * i])
+  end
+  if i == 1 then
+    first = count
+  end
+end
+return {1, 1, first, previous[1]}
+"""
+
+# GCRA (generic cell rate algorithm) over every rule matched by a request.
+#
+# KEYS[i]    theoretical arrival time (TAT, µs) for rule i, most specific first
+# ARGV[2i-1] emission interval in µs for rule i (window / limit)
+# ARGV[2i]   burst tolerance in µs for rule i (interval * burst)
+#
+# Uses the Redis clock so every replica agrees on "now". Microseconds keep
+# limits of thousands per second exact while the epoch stays below 2^53, so
+# Lua's doubles hold every value exactly. Each key expires once its TAT has
+# passed, which is the same as an idle identity: one key per identity and no
+# per-window churn. Returns {allowed, rule_index (1-based), remaining,
+# retry_after_us, reset_after_us}; nothing is updated on denial.
+GCRA_LUA = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000000 + tonumber(time[2])
+local tats = {}
+for i = 1, #KEYS do
+  local interval = tonumber(ARGV[2 * i - 1])
+  local capacity = interval + tonumber(ARGV[2 * i])
+  local tat = math.max(tonumber(redis.call('GET', KEYS[i]) or '0'), now)
+  if tat + interval - now > capacity then
+    return {0, i, 0, tat + interval - capacity - now, tat - now}
+  end
+  tats[i] = tat + interval
+end
+for i = 1, #KEYS do
+  redis.call('SET', KEYS[i], tats[i], 'PX', math.ceil((tats[i] - now) / 1000))
+end
+local interval = tonumber(ARGV[1])
+local headroom = interval + tonumber(ARGV[2]) - (tats[1] - now)
+return {1, 1, math.floor(headroom / interval), 0, tats[1] - now}
+"""
+
+# Batched flush of locally counted hits for an approximate rule.
+#
+# KEYS[1]   counter key for the current window
+# ARGV[1]   hits counted locally since the previous flush
+# ARGV[2]   TTL in seconds applied only when the counter is created
+#
+# Returns the global total, which the caller enforces until its next flush.
+APPROX_FLUSH_LUA = """
+local total = redis.call('INCRBY', KEYS[1], ARGV[1])
+if total == tonumber(ARGV[1]) then
+  redis.call('EXPIRE', KEYS[1], ARGV[2])
+end
+return total
+"""
+
+
+# Reserve a block of a rule's window budget for one process.
+#
+# KEYS[1]   counter key for the current window
+# ARGV[1]   limit for the window
+# ARGV[2]   share of the still available budget to reserve
+# ARGV[3]   TTL in seconds applied only when the counter is created
+#
+# Returns {granted, reserved}: granted is 0 once the budget is exhausted and
+# never exceeds what is left, so leases cannot over-admit.
+QUOTA_LEASE_LUA = """
+local available = tonumber(ARGV[1]) - tonumber(redis.call('GET', KEYS[1]) or '0')
+if available <= 0 then
+  return {0, tonumber(ARGV[1]) - available}
+end
+local grant = math.min(available, math.ceil(available * tonumber(ARGV[2])))
+local reserved = redis.call('INCRBY', KEYS[1], grant)
+if reserved == grant then
+  redis.call('EXPIRE', KEYS[1], ARGV[3])
+end
+return {grant, reserved}
+"""
+
+# Hand unspent lease tokens back; a counter whose window expired is left alone.
+#
+# KEYS[1]   counter key the lease was taken from
+# ARGV[1]   unspent tokens
+QUOTA_RELEASE_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+  return redis.call('DECRBY', KEYS[1], ARGV[1])
+end
+return 0
+"""
+
+
+class RedisScript:
+    """Lua script registered once with SCRIPT LOAD and invoked through EVALSHA."""
+
+    def __init__(self, source: str) -> None:
+        self.source = source
+        self.sha: str | None = None
+
+    async def load(self, client: RedisCommands) -> str:
+        sha = await client.script_load(self.source)
+        self.sha = sha.decode() if isinstance(sha, bytes) else str(sha)
+        return self.sha
+
+    async def __call__(
+        self,
+        client: RedisCommands,
+        keys: Sequence[str],
+        args: Sequence[Any],
+    ) -> Any:
+        sha = self.sha or await self.load(client)
+        try:
+            return await client.evalsha(sha, len(keys), *keys, *args)
+        except NoScriptError:
+            # The script cache is empty after a restart or failover: reload once.
+            sha = await self.load(client)
+            return await client.evalsha(sha, len(keys), *keys, *args)
+
+
+FIXED_WINDOW_SCRIPT = RedisScript(FIXED_WINDOW_LUA)
+SLIDING_WINDOW_SCRIPT = RedisScript(SLIDING_WINDOW_LUA)
+GCRA_SCRIPT = RedisScript(GCRA_LUA)
+APPROX_FLUSH_SCRIPT = RedisScript(APPROX_FLUSH_LUA)
+QUOTA_LEASE_SCRIPT = RedisScript(QUOTA_LEASE_LUA)
+QUOTA_RELEASE_SCRIPT = RedisScript(QUOTA_RELEASE_LUA)
+
+ALL_SCRIPTS = (
+    FIXED_WINDOW_SCRIPT,
+    SLIDING_WINDOW_SCRIPT,
+    GCRA_SCRIPT,
+    APPROX_FLUSH_SCRIPT,
+    QUOTA_LEASE_SCRIPT,
+    QUOTA_RELEASE_SCRIPT,
+)
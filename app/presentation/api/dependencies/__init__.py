@@ -1,2 +1,3 @@
 # Re-export convenience dependency helpers.
 from .admin_auth import require_admin_token  # noqa: F401
+from .settings import provide_settings  # noqa: F401
@@ -5,12 +5,16 @@ from fastapi.security import APIKeyHeader
 
 from app.core.config import Settings
 
+from .settings import provide_settings
+
 _api_key_header = APIKeyHeader(name="X-Admin-Token", auto_error=False)
 
 
-async def require_admin_token(api_key: str | None = Depends(_api_key_header)) -> str:
-    settings = Settings()
-    allowed = settings.ADMIN_API_KEYS
+async def require_admin_token(
+    api_key: str | None = Depends(_api_key_header),
+    settings: Settings = Depends(provide_settings),
+) -> str:
+    allowed = settings.ADMIN_API_KEY_SET
 
     if not allowed:
         raise HTTPException(
@@ -0,0 +1,8 @@
+from __future__ import annotations
+
+from app.core.config import Settings, get_settings
+
+
+async def provide_settings() -> Settings:
+    # Async on purpose: FastAPI would run a sync dependency in the threadpool.
+    return get_settings()
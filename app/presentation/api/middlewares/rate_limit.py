@@ -1,16 +1,58 @@
 from __future__ import annotations
 
+import asyncio
+import contextlib
 import json
 import logging
+import math
+import os
+import random
 import time
-from typing import Any, Callable, Dict, List, Optional, Tuple
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
 
-from fastapi import Request, Response
-from prometheus_client import Counter
-from starlette.responses import JSONResponse
+from prometheus_client import Counter, Histogram
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
-from app.core.config import Settings
-from app.infrastructure.redis_client import get_redis
+from app.core.circuit_breaker import STATE_OPEN, CircuitBreaker
+from app.core.config import Settings, get_settings
+from app.core.rate_limit_local import (
+    ApproximateCounter,
+    DenyCache,
+    FallbackLimiter,
+    QuotaLease,
+)
+from app.core.rate_limit_rules import (
+    ALGORITHM_FIXED,
+    ALGORITHM_GCRA,
+    ALGORITHM_SLIDING,
+    ALGORITHMS,
+    KEY_SCHEME_HASHTAG,
+    MODE_APPROXIMATE,
+    MODE_EXACT,
+    MODE_LEASE,
+    RateLimitRule,
+    RuleIndex,
+    RuleValue,
+    compile_rules,
+    normalize_rule_options,
+    normalize_rule_value,
+)
+from app.infrastructure.redis_client import (
+    get_auto_pipeline,
+    get_redis,
+    redis_connected,
+)
+from app.infrastructure.redis_scripts import (
+    ALL_SCRIPTS,
+    APPROX_FLUSH_SCRIPT,
+    FIXED_WINDOW_SCRIPT,
+    GCRA_SCRIPT,
+    QUOTA_LEASE_SCRIPT,
+    QUOTA_RELEASE_SCRIPT,
+    SLIDING_WINDOW_SCRIPT,
+)
+from app.presentation.metrics import LATENCY_BUCKETS
 
 logger = logging.getLogger(__name__)
 
@@ -24,50 +66,181 @@ RATE_LIMIT_BLOCKED = Counter(
     "Blocked requests by rate limiting",
     labelnames=["scope"],
 )
+RATE_LIMIT_DENY_CACHE_HITS = Counter(
+    "meli_proxy_rate_limit_deny_cache_hits_total",
+    "Blocked requests answered from the in-process deny cache",
+)
+RATE_LIMIT_APPROX_FLUSHES = Counter(
+    "meli_proxy_rate_limit_approx_flushes_total",
+    "Batched INCRBY flushes of approximate rate-limit counters",
+)
+RATE_LIMIT_SHARD_REFRESHES = Counter(
+    "meli_proxy_rate_limit_shard_refreshes_total",
+    "Reads of the summed sharded rate-limit counters",
+)
+RATE_LIMIT_LEASES = Counter(
+    "meli_proxy_rate_limit_leases_total",
+    "Quota lease requests sent to Redis",
+)
+RATE_LIMIT_DEGRADED = Counter(
+    "meli_proxy_rate_limit_degraded_total",
+    "Rate-limit decisions taken without Redis, by failure policy",
+    labelnames=["policy"],
+)
+RATE_LIMIT_BREAKER_OPENS = Counter(
+    "meli_proxy_rate_limit_breaker_opens_total",
+    "Times the Redis circuit breaker of the rate limiter opened",
+)
 RATE_LIMIT_CONFIG_UPDATES = Counter(
     "meli_proxy_rate_limit_config_updates_total",
     "Number of times rate-limit configuration was updated",
 )
+RATE_LIMIT_PHASE_SECONDS = Histogram(
+    "meli_proxy_rate_limit_phase_seconds",
+    "Rate-limit timings: background rule reload (phase=rules), counter round "
+    "trip to Redis (phase=redis) and the whole check_and_increment (phase=total)",
+    labelnames=["phase"],
+    buckets=LATENCY_BUCKETS,
+)
+# Bound once; labels() costs a dict lookup and a lock on every call.
+_PHASE_RULES = RATE_LIMIT_PHASE_SECONDS.labels(phase="rules")
+_PHASE_REDIS = RATE_LIMIT_PHASE_SECONDS.labels(phase="redis")
+_PHASE_TOTAL = RATE_LIMIT_PHASE_SECONDS.labels(phase="total")
+
+# allowed, deciding rule, remaining, reset_in
+RateLimitDecision = Tuple[bool, Optional[RateLimitRule], int, int]
+
+# What to do when Redis cannot answer within the deadline.
+FAILURE_OPEN = "open"
+FAILURE_CLOSED = "closed"
+FAILURE_LOCAL = "local"
+FAILURE_POLICIES = (FAILURE_OPEN, FAILURE_CLOSED, FAILURE_LOCAL)
 
 
 class RedisRateLimiter:
     def __init__(self, settings: Settings) -> None:
-        self.settings = settings
-        self.rules_ip: Dict[str, int] = settings.RATE_LIMIT_RULES_IP
-        self.rules_path: Dict[str, int] = settings.RATE_LIMIT_RULES_PATH
-        self.rules_ip_path: List[Dict[str, object]] = settings.RATE_LIMIT_RULES_IP_PATH
-        self._cache_ttl = max(1.0, float(settings.RATE_LIMIT_CACHE_SECONDS))
+        self.rules_ip: Dict[str, RuleValue] = {}
+        self.rules_path: Dict[str, RuleValue] = {}
+        self.rules_ip_path: List[Dict[str, Any]] = []
+        self._index: RuleIndex = compile_rules({}, {}, [])
         self._last_refresh: float = 0.0
         self._updated_at: float | None = None
+        self._subscriber_task: asyncio.Task[None] | None = None
+        self._subscribed = False
+        self._deny_cache = DenyCache(0)
+        # The rule is kept to flush what is still pending at shutdown.
+        self._approx: Dict[str, Tuple[RateLimitRule, ApproximateCounter]] = {}
+        self._leases: Dict[str, QuotaLease] = {}
+        self._background: set[asyncio.Task[None]] = set()
+        self._rules_refresh: asyncio.Task[None] | None = None
+        self.apply_settings(settings)
+
+    def apply_settings(self, settings: Settings) -> None:
+        """(Re)derive limiter configuration from a settings snapshot."""
+        self.settings = settings
+        self._cache_ttl = max(1.0, float(settings.RATE_LIMIT_CACHE_SECONDS))
+        # While subscribed to config events, polling is only a safety net.
+        self._subscribe_events = bool(settings.RATE_LIMIT_SUBSCRIBE_EVENTS)
+        self._safety_poll = max(
+            self._cache_ttl, float(settings.RATE_LIMIT_SAFETY_POLL_SECONDS)
+        )
+        self._cluster = bool(settings.REDIS_CLUSTER_NODES)
+        self._key_scheme = settings.RATE_LIMIT_KEY_LAYOUT
+        algorithm = settings.RATE_LIMIT_ALGORITHM.strip().lower()
+        self._algorithm = algorithm if algorithm in ALGORITHMS else ALGORITHM_FIXED
+        # Multi-key scripts need their keys on one slot: under cluster this
+        # takes hash-tagged keys, otherwise the per-rule pipeline is used.
+        self._use_script = bool(settings.RATE_LIMIT_USE_SCRIPT) and (
+            not self._cluster or self._key_scheme == KEY_SCHEME_HASHTAG
+        )
+        self._deny_cache = DenyCache(settings.RATE_LIMIT_DENY_CACHE_SIZE)
+        self._approx_interval = max(0.0, settings.RATE_LIMIT_APPROX_FLUSH_MS / 1000)
+        # Each instance may run ahead of Redis by at most this share of the
+        # limit, so the cluster-wide overshoot stays within the error bound.
+        self._approx_share = max(0.0, float(settings.RATE_LIMIT_APPROX_ERROR)) / max(
+            1, int(settings.RATE_LIMIT_INSTANCES)
+        )
+        self._shard_interval = max(0.0, settings.RATE_LIMIT_SHARD_REFRESH_MS / 1000)
+        self._shard_by_worker = settings.RATE_LIMIT_SHARD_PICK.strip() == "worker"
+        self._lease_fraction = min(1.0, max(0.001, settings.RATE_LIMIT_LEASE_FRACTION))
+        self._lease_low_water = min(1.0, max(0.0, settings.RATE_LIMIT_LEASE_LOW_WATER))
+        self._redis_timeout = max(0.001, settings.RATE_LIMIT_REDIS_TIMEOUT_MS / 1000)
+        self._setup_timeout = max(0.001, settings.RATE_LIMIT_SETUP_TIMEOUT_MS / 1000)
+        policy = settings.RATE_LIMIT_FAILURE_POLICY.strip().lower()
+        self._failure_policy = policy if policy in FAILURE_POLICIES else FAILURE_LOCAL
+        self._breaker = CircuitBreaker(
+            settings.RATE_LIMIT_BREAKER_FAILURES,
+            settings.RATE_LIMIT_BREAKER_RESET_SECONDS,
+        )
+        self._fallback = FallbackLimiter(settings.RATE_LIMIT_INSTANCES)
+        if self._updated_at is None:
+            # No rules stored in Redis yet: the settings defaults are in force.
+            self._replace_rules(
+                settings.RATE_LIMIT_RULES_IP,
+                settings.RATE_LIMIT_RULES_PATH,
+                settings.RATE_LIMIT_RULES_IP_PATH,
+            )
+        else:
+            # Recompile so a changed key scheme takes effect.
+            self._replace_rules(self.rules_ip, self.rules_path, self.rules_ip_path)
+        self._last_refresh = 0.0
 
     _RULES_KEY_IP = "rl:config:rules_ip"
     _RULES_KEY_PATH = "rl:config:rules_path"
     _RULES_KEY_IP_PATH = "rl:config:rules_ip_path"
     _RULES_UPDATED_AT = "rl:config:updated_at"
     _EVENT_CHANNEL = "rl:config:events"
+    _WINDOW_SECONDS = 60
+
+    def _replace_rules(
+        self,
+        ip_rules: Dict[str, RuleValue],
+        path_rules: Dict[str, RuleValue],
+        ip_path_rules: List[Dict[str, Any]],
+    ) -> None:
+        # Compile first so a request never sees new dicts with a stale index.
+        index = compile_rules(
+            ip_rules, path_rules, ip_path_rules, self._key_scheme, self._algorithm
+        )
+        self.rules_ip = ip_rules
+        self.rules_path = path_rules
+        self.rules_ip_path = ip_path_rules
+        self._index = index
+        # Cached denials were computed against the previous limits.
+        self._deny_cache.clear()
+        self._approx.clear()
+        if self._leases:
+            # Leases were sized against the previous limits; hand them back.
+            leases, self._leases = self._leases, {}
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                pass
+            else:
+                self._spawn(self._release(leases))
 
     @staticmethod
-    def _normalize_ip_rules(data: Dict[str, Any]) -> Dict[str, int]:
-        normalized: Dict[str, int] = {}
+    def _normalize_ip_rules(data: Dict[str, Any]) -> Dict[str, RuleValue]:
+        normalized: Dict[str, RuleValue] = {}
         for k, v in data.items():
             try:
-                limit = int(v)
+                value = normalize_rule_value(v)
             except Exception:
                 continue
-            if limit > 0:
-                normalized[str(k)] = limit
+            if value is not None:
+                normalized[str(k)] = value
         return normalized
 
     @staticmethod
-    def _normalize_path_rules(data: Dict[str, Any]) -> Dict[str, int]:
-        normalized: Dict[str, int] = {}
+    def _normalize_path_rules(data: Dict[str, Any]) -> Dict[str, RuleValue]:
+        normalized: Dict[str, RuleValue] = {}
         for k, v in data.items():
             try:
-                limit = int(v)
+                value = normalize_rule_value(v)
             except Exception:
                 continue
-            if limit > 0:
-                normalized[str(k)] = limit
+            if value is not None:
+                normalized[str(k)] = value
         return normalized
 
     @staticmethod
@@ -80,10 +253,13 @@ class RedisRateLimiter:
             prefix = str(item.get("path_prefix", "")).strip()
             try:
                 limit = int(item.get("limit", 0))
+                options = normalize_rule_options(item)
             except Exception:
                 continue
             if ip and prefix and limit > 0:
-                normalized.append({"ip": ip, "path_prefix": prefix, "limit": limit})
+                normalized.append(
+                    {"ip": ip, "path_prefix": prefix, "limit": limit, **options}
+                )
         return normalized
 
     @staticmethod
@@ -96,20 +272,20 @@ class RedisRateLimiter:
             return None
 
     @staticmethod
-    def _parse_float(raw: Optional[bytes]) -> Optional[float]:
+    def _parse_float(raw: Optional[bytes | str]) -> Optional[float]:
         if not raw:
             return None
         try:
-            return float(raw.decode())
+            return float(raw.decode() if isinstance(raw, bytes) else raw)
         except Exception:
             return None
 
     def _extract_dict_rules(
         self,
         raw: Optional[bytes],
-        normalizer: Callable[[Dict[str, Any]], Dict[str, int]],
-        default: Dict[str, int],
-    ) -> Dict[str, int]:
+        normalizer: Callable[[Dict[str, Any]], Dict[str, RuleValue]],
+        default: Dict[str, RuleValue],
+    ) -> Dict[str, RuleValue]:
         parsed = self._decode_json(raw)
         if isinstance(parsed, dict):
             try:
@@ -132,37 +308,156 @@ class RedisRateLimiter:
                 return default
         return default
 
+    def _refresh_interval(self) -> float:
+        return self._safety_poll if self._subscribed else self._cache_ttl
+
     async def _ensure_rules(self) -> None:
         now = time.time()
-        if now - self._last_refresh < self._cache_ttl:
+        if now - self._last_refresh < self._refresh_interval():
+            return
+        batched = await get_auto_pipeline()
+        # Cheap version check first; the rule blobs are only fetched on change.
+        updated_at = self._parse_float(await batched.get(self._RULES_UPDATED_AT))
+        if updated_at == self._updated_at:
+            self._last_refresh = now
             return
+
         r = await get_redis()
         pipe = r.pipeline()
         pipe.get(self._RULES_KEY_IP)
         pipe.get(self._RULES_KEY_PATH)
         pipe.get(self._RULES_KEY_IP_PATH)
-        pipe.get(self._RULES_UPDATED_AT)
-        raw_ip, raw_path, raw_ip_path, raw_updated_at = await pipe.execute()
+        raw_ip, raw_path, raw_ip_path = await pipe.execute()
 
-        self.rules_ip = self._extract_dict_rules(
-            raw_ip, self._normalize_ip_rules, self.settings.RATE_LIMIT_RULES_IP
-        )
-        self.rules_path = self._extract_dict_rules(
-            raw_path, self._normalize_path_rules, self.settings.RATE_LIMIT_RULES_PATH
-        )
-        self.rules_ip_path = self._extract_list_rules(
-            raw_ip_path,
-            self._normalize_ip_path_rules,
-            self.settings.RATE_LIMIT_RULES_IP_PATH,
+        self._replace_rules(
+            self._extract_dict_rules(
+                raw_ip, self._normalize_ip_rules, self.settings.RATE_LIMIT_RULES_IP
+            ),
+            self._extract_dict_rules(
+                raw_path,
+                self._normalize_path_rules,
+                self.settings.RATE_LIMIT_RULES_PATH,
+            ),
+            self._extract_list_rules(
+                raw_ip_path,
+                self._normalize_ip_path_rules,
+                self.settings.RATE_LIMIT_RULES_IP_PATH,
+            ),
         )
 
-        self._updated_at = self._parse_float(raw_updated_at)
+        self._updated_at = updated_at
         self._last_refresh = now
 
+    def _refresh_rules_soon(self) -> None:
+        """Reload the rules in the background once due; requests keep using
+        the compiled ones meanwhile instead of waiting on the reload."""
+        if self._rules_refresh is not None and not self._rules_refresh.done():
+            return
+        if time.time() - self._last_refresh < self._refresh_interval():
+            return
+        self._rules_refresh = task = asyncio.create_task(self._refresh_rules())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _refresh_rules(self) -> None:
+        started = time.perf_counter()
+        try:
+            async with asyncio.timeout(self._setup_timeout):
+                await self._ensure_rules()
+        except Exception:
+            # Retried by the next request; the breaker covers a Redis outage.
+            logger.warning("Rate-limit rules refresh failed", exc_info=True)
+            return
+        _PHASE_RULES.observe(time.perf_counter() - started)
+
+    async def warm_up(self) -> None:
+        """Connect to Redis, load the Lua scripts and fetch and compile the
+        rules, so the first requests after startup pay for none of it."""
+        r = await get_redis()
+        await asyncio.gather(*(script.load(r) for script in ALL_SCRIPTS))
+        self._last_refresh = 0.0
+        await self._ensure_rules()
+
+    def _apply_event(self, raw: Any) -> bool:
+        """Apply a payload published by ``set_rules``; stale events are ignored."""
+        if isinstance(raw, str):
+            raw = raw.encode()
+        payload = self._decode_json(raw)
+        if not isinstance(payload, dict):
+            return False
+        try:
+            ts = float(payload["ts"])
+        except Exception:
+            return False
+        if self._updated_at is not None and ts <= self._updated_at:
+            return False
+
+        ip_rules = payload.get("ip")
+        path_rules = payload.get("path")
+        ip_path_rules = payload.get("ip_path")
+        if not (
+            isinstance(ip_rules, dict)
+            and isinstance(path_rules, dict)
+            and isinstance(ip_path_rules, list)
+        ):
+            return False
+
+        self._replace_rules(
+            self._normalize_ip_rules(ip_rules),
+            self._normalize_path_rules(path_rules),
+            self._normalize_ip_path_rules(ip_path_rules),
+        )
+        self._updated_at = ts
+        self._last_refresh = time.time()
+        logger.info("Rate-limit rules applied from event", extra={"scope": "pubsub"})
+        return True
+
+    def start_subscriber(self) -> None:
+        """Start the background task that listens on ``rl:config:events``."""
+        if not self._subscribe_events:
+            return
+        if self._subscriber_task is not None and not self._subscriber_task.done():
+            return
+        self._subscriber_task = asyncio.create_task(self._run_subscriber())
+
+    async def stop_subscriber(self) -> None:
+        task, self._subscriber_task = self._subscriber_task, None
+        self._subscribed = False
+        if task is None:
+            return
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+    async def _run_subscriber(self) -> None:
+        backoff = 0.5
+        while True:
+            try:
+                r = await get_redis()
+                pubsub = r.pubsub()
+                try:
+                    await pubsub.subscribe(self._EVENT_CHANNEL)
+                    self._subscribed = True
+                    # Events may have been missed while disconnected.
+                    self._last_refresh = 0.0
+                    backoff = 0.5
+                    async for message in pubsub.listen():
+                        if message.get("type") == "message":
+                            self._apply_event(message.get("data"))
+                finally:
+                    self._subscribed = False
+                    await pubsub.aclose()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Rate-limit event subscriber failed", exc_info=True)
+            await asyncio.sleep(backoff)
+            backoff = min(30.0, backoff * 2)
+
     async def set_rules(
         self,
-        ip_rules: Dict[str, int],
-        path_rules: Dict[str, int],
+        ip_rules: Dict[str, RuleValue],
+        path_rules: Dict[str, RuleValue],
         ip_path_rules: List[Dict[str, Any]],
     ) -> None:
         normalized_ip = self._normalize_ip_rules(ip_rules)
@@ -196,9 +491,7 @@ class RedisRateLimiter:
         except Exception:
             logger.debug("Failed to publish rate-limit update event", exc_info=True)
 
-        self.rules_ip = normalized_ip
-        self.rules_path = normalized_path
-        self.rules_ip_path = normalized_ip_path
+        self._replace_rules(normalized_ip, normalized_path, normalized_ip_path)
         self._updated_at = now
         self._last_refresh = time.time()
         RATE_LIMIT_CONFIG_UPDATES.inc()
@@ -222,62 +515,586 @@ class RedisRateLimiter:
         now = time.time()
         return max(0, int(((int(now // 60) + 1) * 60) - now))
 
-    def _match_rules(self, client_ip: str, path: str) -> List[Tuple[str, str, int]]:
-        matched: List[Tuple[str, str, int]] = []
-        if client_ip in self.rules_ip:
-            matched.append(("ip", client_ip, int(self.rules_ip[client_ip])))
-        for prefix, limit in self.rules_path.items():
-            if path.startswith(prefix):
-                matched.append(("path", prefix, int(limit)))
-        for r in self.rules_ip_path:
-            ip = str(r.get("ip", ""))
-            prefix = str(r.get("path_prefix", ""))
-            limit = int(r.get("limit", 0))
-            if ip == client_ip and prefix and path.startswith(prefix):
-                matched.append(("ippath", f"{ip}:{prefix}", limit))
-        return matched
+    def _match_rules(self, client_ip: str, path: str) -> List[RateLimitRule]:
+        return self._index.match(client_ip, path)
 
-    @staticmethod
-    def _key(scope: str, ident: str, window_id: int) -> str:
-        return f"rl:{scope}:{ident}:{window_id}"
+    async def check_and_increment(self, client_ip: str, path: str) -> RateLimitDecision:
+        """Decide with Redis within the deadline, else apply the failure policy."""
+        started = time.perf_counter()
+        try:
+            return await self._decide(client_ip, path)
+        finally:
+            _PHASE_TOTAL.observe(time.perf_counter() - started)
 
-    async def check_and_increment(
-        self, client_ip: str, path: str
-    ) -> Tuple[bool, Optional[Tuple[str, str, int]], int, int]:
-        await self._ensure_rules()
+    async def _decide(self, client_ip: str, path: str) -> RateLimitDecision:
+        if not self._breaker.allow():
+            return self._degraded(client_ip, path)
+        try:
+            if not redis_connected():
+                # Connecting outlives this request if it gives up, so it has
+                # its own bound instead of the per-decision deadline.
+                async with asyncio.timeout(self._setup_timeout):
+                    await get_auto_pipeline()
+            self._refresh_rules_soon()
+            async with asyncio.timeout(self._redis_timeout):
+                decision = await self._check_with_redis(client_ip, path)
+        except Exception:
+            was_open = self._breaker.state == STATE_OPEN
+            self._breaker.record_failure()
+            if not was_open and self._breaker.state == STATE_OPEN:
+                RATE_LIMIT_BREAKER_OPENS.inc()
+                logger.warning(
+                    "Rate-limit Redis breaker opened; %s fallback for %.1fs",
+                    self._failure_policy,
+                    self._breaker.reset_timeout,
+                    exc_info=True,
+                )
+            return self._degraded(client_ip, path)
+        except BaseException:
+            # Cancelled (client gone, shutdown): no verdict on Redis, but a
+            # half-open probe must not stay claimed forever.
+            self._breaker.release()
+            raise
+        self._breaker.record_success()
+        return decision
+
+    def _degraded(self, client_ip: str, path: str) -> RateLimitDecision:
+        rules = self._match_rules(client_ip, path)
+        if not rules:
+            return True, None, 0, 0
+        RATE_LIMIT_DEGRADED.labels(policy=self._failure_policy).inc()
+        if self._failure_policy == FAILURE_OPEN:
+            # Nothing is known about the counters, so no headers either.
+            return True, None, 0, 0
+        if self._failure_policy == FAILURE_CLOSED:
+            return False, rules[0], 0, max(1, math.ceil(self._breaker.retry_in()))
+        denied, remaining = self._fallback.hit(rules, self._window_id())
+        reset_in = self._reset_in_seconds()
+        if denied is not None:
+            return False, denied, 0, max(1, reset_in)
+        return True, rules[0], remaining, reset_in
+
+    async def _check_with_redis(self, client_ip: str, path: str) -> RateLimitDecision:
         window_id = self._window_id()
         rules = self._match_rules(client_ip, path)
         if not rules:
             return True, None, 0, 0
 
+        denied = self._cached_denial(rules, window_id)
+        if denied is not None:
+            return denied
+
+        if all(rule.mode == MODE_EXACT and rule.shards == 1 for rule in rules):
+            return await self._check_exact(rules, window_id)
+        return await self._check_local(rules, window_id)
+
+    async def _check_local(
+        self, rules: List[RateLimitRule], window_id: int
+    ) -> RateLimitDecision:
+        """Mixed rule set: approximate, sharded and leased rules are decided in
+        memory."""
+        # Approximate and sharded rules are enforced against the last known
+        # global total plus the hits counted locally since it was read.
+        approx = [
+            rule for rule in rules if rule.mode == MODE_APPROXIMATE or rule.shards > 1
+        ]
+        counters = [self._approx_counter(rule, window_id) for rule in approx]
+        for rule, counter in zip(approx, counters):
+            if counter.estimate() >= rule.limit:
+                return self._local_denial(rule, window_id)
+
+        leases: List[QuotaLease] = []
+        for rule in rules:
+            if rule.mode != MODE_LEASE:
+                continue
+            lease = self._lease(rule, window_id)
+            if not await self._take_lease(rule, lease):
+                self._return_tokens(leases)
+                return self._local_denial(rule, window_id)
+            leases.append(lease)
+
+        exact = [rule for rule in rules if rule.mode == MODE_EXACT]
+        decision: Optional[RateLimitDecision] = None
+        if exact:
+            decision = await self._check_exact(exact, window_id)
+            if not decision[0]:
+                self._return_tokens(leases)
+                return decision
+
+        self._count_approximate(approx, counters)
+
+        first = rules[0]
+        if decision is not None and first.mode == MODE_EXACT and first.shards == 1:
+            return decision
+        remaining = self._local_remaining(first, counters, leases)
+        return True, first, remaining, self._reset_in_seconds()
+
+    def _count_approximate(
+        self, rules: List[RateLimitRule], counters: List[ApproximateCounter]
+    ) -> None:
+        now = time.monotonic()
+        for rule, counter in zip(rules, counters):
+            counter.pending += 1
+            threshold = self._approx_threshold(rule)
+            if rule.shards > 1:
+                # Hits were already written to a shard; only re-read the sum.
+                if counter.due(now, self._shard_interval, threshold):
+                    self._spawn(self._refresh_shards(rule, counter))
+            elif counter.due(now, self._approx_interval, threshold):
+                self._spawn(self._flush_approximate(rule, counter))
+
+    def _local_denial(self, rule: RateLimitRule, window_id: int) -> RateLimitDecision:
+        reset_in = max(1, self._reset_in_seconds())
+        self._deny_cache.add((rule.key_prefix, window_id), reset_in)
+        return False, rule, 0, reset_in
+
+    def _local_remaining(
+        self,
+        rule: RateLimitRule,
+        counters: List[ApproximateCounter],
+        leases: List[QuotaLease],
+    ) -> int:
+        """``rule`` is the first matched one, so it owns ``leases[0]`` or,
+        when approximate or sharded, ``counters[0]``. The objects
+        ``_check_local`` took are used rather than looked up again: the rules
+        may have been replaced (and these dropped) while it awaited Redis."""
+        if rule.mode == MODE_LEASE:
+            lease = leases[0]
+            # Budget nobody has reserved yet plus what this process still holds.
+            return max(0, rule.limit - lease.reserved + lease.tokens)
+        return max(0, rule.limit - counters[0].estimate())
+
+    async def _check_exact(
+        self, rules: List[RateLimitRule], window_id: int
+    ) -> RateLimitDecision:
+        started = time.perf_counter()
+        if self._use_script:
+            decision = await self._check_with_script(rules, window_id)
+        else:
+            decision = await self._check_with_pipeline(rules, window_id)
+        _PHASE_REDIS.observe(time.perf_counter() - started)
+
+        allowed, rule, _, reset_in = decision
+        if not allowed and rule is not None:
+            self._deny_cache.add((rule.key_prefix, window_id), reset_in)
+        return decision
+
+    def _approx_counter(
+        self, rule: RateLimitRule, window_id: int
+    ) -> ApproximateCounter:
+        entry = self._approx.get(rule.key_prefix)
+        if entry is None or entry[1].window_id != window_id:
+            # Hits still pending for a past window no longer matter.
+            entry = rule, ApproximateCounter(window_id)
+            self._approx[rule.key_prefix] = entry
+        return entry[1]
+
+    def _approx_threshold(self, rule: RateLimitRule) -> int:
+        return max(1, int(rule.limit * self._approx_share))
+
+    def _lease(self, rule: RateLimitRule, window_id: int) -> QuotaLease:
+        lease = self._leases.get(rule.key_prefix)
+        if lease is None or lease.window_id != window_id:
+            # Tokens leased for a past window expired with its counter.
+            lease = QuotaLease(window_id)
+            self._leases[rule.key_prefix] = lease
+        return lease
+
+    async def _take_lease(self, rule: RateLimitRule, lease: QuotaLease) -> bool:
+        while not lease.take():
+            if lease.exhausted:
+                return False
+            # Concurrent requests wait on the same lease request.
+            await asyncio.shield(self._refill(rule, lease))
+        if lease.running_low(self._lease_low_water):
+            self._refill(rule, lease)
+        return True
+
+    def _refill(self, rule: RateLimitRule, lease: QuotaLease) -> asyncio.Task[None]:
+        if lease.refill is None:
+            lease.refill = asyncio.create_task(self._acquire_lease(rule, lease))
+            lease.refill.add_done_callback(self._lease_refilled)
+        return lease.refill
+
+    @staticmethod
+    def _lease_refilled(task: asyncio.Task[None]) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Rate-limit lease request failed", exc_info=task.exception())
+
+    async def _acquire_lease(self, rule: RateLimitRule, lease: QuotaLease) -> None:
+        try:
+            key = f"{rule.key_prefix}:{lease.window_id}"
+            ttl = max(1, self._reset_in_seconds())
+            r = await get_auto_pipeline()
+            granted, reserved = await QUOTA_LEASE_SCRIPT(
+                r, [key], [rule.limit, self._lease_fraction, ttl]
+            )
+            RATE_LIMIT_LEASES.inc()
+            lease.reserved = int(reserved)
+            if int(granted) <= 0:
+                lease.exhausted = True
+            else:
+                lease.tokens += int(granted)
+                lease.last_grant = int(granted)
+        finally:
+            lease.refill = None
+
+    @staticmethod
+    def _return_tokens(leases: List[QuotaLease]) -> None:
+        # A later rule denied: the tokens taken for this request stay local.
+        for lease in leases:
+            lease.tokens += 1
+
+    async def release_leases(self) -> None:
+        """Return unspent lease tokens so other processes can use them."""
+        leases, self._leases = self._leases, {}
+        await self._release(leases)
+
+    async def drain(self, timeout: float) -> None:
+        """Flush approximate hits not yet sent and wait up to ``timeout``
+        seconds for background work. Run at shutdown, before Redis closes."""
+        deadline = time.monotonic() + timeout
+        # Flushes in flight first: hits counted meanwhile are sent after.
+        await self._wait_background(deadline)
+        window_id = self._window_id()
+        for rule, counter in list(self._approx.values()):
+            # Sharded hits are already in Redis; only their sum is local.
+            if (
+                rule.shards == 1
+                and counter.window_id == window_id
+                and counter.pending > 0
+                and not counter.flushing
+            ):
+                self._spawn(self._flush_approximate(rule, counter))
+        await self._wait_background(deadline)
+
+    async def _wait_background(self, deadline: float) -> None:
+        left = deadline - time.monotonic()
+        if self._background and left > 0:
+            await asyncio.wait(set(self._background), timeout=left)
+
+    async def _release(self, leases: Dict[str, QuotaLease]) -> None:
+        window_id = self._window_id()
+        held = [
+            (prefix, lease)
+            for prefix, lease in leases.items()
+            if lease.tokens > 0 and lease.window_id == window_id
+        ]
+        if not held:
+            return
+        try:
+            r = await get_auto_pipeline()
+            for prefix, lease in held:
+                tokens, lease.tokens = lease.tokens, 0
+                await QUOTA_RELEASE_SCRIPT(r, [f"{prefix}:{window_id}"], [tokens])
+        except Exception:
+            logger.warning("Failed to release rate-limit leases", exc_info=True)
+
+    def _counter_key(
+        self,
+        rule: RateLimitRule,
+        window_id: int,
+        picks: Optional[Mapping[RateLimitRule, int]] = None,
+    ) -> str:
+        if rule.shards == 1:
+            return f"{rule.key_prefix}:{window_id}"
+        shard = picks[rule] if picks else self._pick_shard(rule)
+        return f"{rule.shard_prefix(shard)}:{window_id}"
+
+    def _pick_shard(self, rule: RateLimitRule) -> int:
+        if self._shard_by_worker:
+            return os.getpid() % rule.shards
+        return random.randrange(rule.shards)
+
+    async def _refresh_shards(
+        self, rule: RateLimitRule, counter: ApproximateCounter
+    ) -> None:
+        counted = counter.pending
+        counter.flushing = True
+        try:
+            r = await get_redis()
+            pipe = r.pipeline()
+            for shard in range(rule.shards):
+                pipe.get(f"{rule.shard_prefix(shard)}:{counter.window_id}")
+            values = await pipe.execute()
+        except Exception:
+            logger.warning("Sharded rate-limit refresh failed", exc_info=True)
+        else:
+            # The sum includes every hit counted before the read started.
+            counter.global_count = sum(int(value or 0) for value in values)
+            counter.pending -= counted
+            RATE_LIMIT_SHARD_REFRESHES.inc()
+        finally:
+            counter.last_flush = time.monotonic()
+            counter.flushing = False
+
+    def _spawn(self, coro: Any) -> None:
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _flush_approximate(
+        self, rule: RateLimitRule, counter: ApproximateCounter
+    ) -> None:
+        delta, counter.pending = counter.pending, 0
+        counter.flushing = True
+        key = f"{rule.key_prefix}:{counter.window_id}"
+        try:
+            r = await get_redis()
+            if self._use_script:
+                ttl = max(1, self._reset_in_seconds())
+                total = await APPROX_FLUSH_SCRIPT(r, [key], [delta, ttl])
+            else:
+                pipe = r.pipeline()
+                pipe.incrby(key, delta)
+                pipe.expire(key, self._WINDOW_SECONDS)
+                total = (await pipe.execute())[0]
+        except Exception:
+            # Keep the hits so the next flush reports them.
+            counter.pending += delta
+            logger.warning("Approximate rate-limit flush failed", exc_info=True)
+        else:
+            counter.global_count = int(total)
+            RATE_LIMIT_APPROX_FLUSHES.inc()
+        finally:
+            counter.last_flush = time.monotonic()
+            counter.flushing = False
+
+    def _cached_denial(
+        self, rules: List[RateLimitRule], window_id: int
+    ) -> Optional[RateLimitDecision]:
+        """Answer already-blocked keys in memory until their window resets."""
+        if not len(self._deny_cache):
+            return None
+        for rule in rules:
+            left = self._deny_cache.remaining((rule.key_prefix, window_id))
+            if left is not None:
+                RATE_LIMIT_DENY_CACHE_HITS.inc()
+                return False, rule, 0, max(1, math.ceil(left))
+        return None
+
+    async def _check_with_script(
+        self, rules: List[RateLimitRule], window_id: int
+    ) -> RateLimitDecision:
+        if self._cluster:
+            # Shards are picked before grouping: each one is its own hash tag,
+            # and two rules sharing a tag may land on different shards.
+            picks = {rule: self._pick_shard(rule) for rule in rules if rule.shards > 1}
+            groups: Dict[str, List[RateLimitRule]] = {}
+            for rule in rules:
+                tag = rule.tag if rule.shards == 1 else f"{rule.tag}#{picks[rule]}"
+                groups.setdefault(tag, []).append(rule)
+            if len(groups) > 1:
+                return await self._check_slot_groups(
+                    rules, list(groups.values()), window_id, picks
+                )
+            return await self._run_window(rules, window_id, picks)
+        return await self._run_window(rules, window_id)
+
+    async def _check_slot_groups(
+        self,
+        rules: List[RateLimitRule],
+        groups: List[List[RateLimitRule]],
+        window_id: int,
+        picks: Mapping[RateLimitRule, int],
+    ) -> RateLimitDecision:
+        """One script per cluster slot, run concurrently.
+
+        Each group is atomic on its own; a denial in one group does not undo
+        the increments made by the others.
+        """
+        decisions = await asyncio.gather(
+            *(self._run_window(group, window_id, picks) for group in groups)
+        )
+        return self._pick_decision(rules, decisions)
+
+    @staticmethod
+    def _pick_decision(
+        rules: List[RateLimitRule], decisions: Sequence[RateLimitDecision]
+    ) -> RateLimitDecision:
+        """Merge decisions taken for disjoint subsets of ``rules``: the most
+        specific denial wins, otherwise the subset holding ``rules[0]``."""
+        order: Dict[Optional[RateLimitRule], int] = {
+            rule: i for i, rule in enumerate(rules)
+        }
+        denied = [decision for decision in decisions if not decision[0]]
+        return min(denied or decisions, key=lambda decision: order[decision[1]])
+
+    async def _run_window(
+        self,
+        rules: List[RateLimitRule],
+        window_id: int,
+        picks: Optional[Mapping[RateLimitRule, int]] = None,
+    ) -> RateLimitDecision:
+        gcra = [rule for rule in rules if rule.algorithm == ALGORITHM_GCRA]
+        if gcra:
+            if len(gcra) == len(rules):
+                return await self._run_gcra(rules)
+            others = [rule for rule in rules if rule.algorithm != ALGORITHM_GCRA]
+            # Different key layouts and scripts; both calls go out together.
+            decisions = await asyncio.gather(
+                self._run_gcra(gcra), self._run_window(others, window_id, picks)
+            )
+            return self._pick_decision(rules, decisions)
+        if any(rule.algorithm == ALGORITHM_SLIDING for rule in rules):
+            return await self._run_sliding_window(rules, window_id, picks)
+        return await self._run_fixed_window(rules, window_id, picks)
+
+    async def _run_gcra(self, rules: List[RateLimitRule]) -> RateLimitDecision:
+        # Not ":gcra": that key held millisecond TATs, which replicas still
+        # running the old script must not mix with microsecond ones.
+        keys = [f"{rule.key_prefix}:gcra_us" for rule in rules]
+        args: List[int] = []
+        for rule in rules:
+            # Whole microseconds keep the stored TAT an exact integer.
+            interval = max(1, math.ceil(self._WINDOW_SECONDS * 1_000_000 / rule.limit))
+            args += [interval, interval * rule.burst]
+
+        r = await get_auto_pipeline()
+        allowed, index, remaining, retry_us, reset_us = await GCRA_SCRIPT(r, keys, args)
+        rule = rules[int(index) - 1]
+        if not allowed:
+            return False, rule, 0, max(1, math.ceil(int(retry_us) / 1_000_000))
+        return True, rule, max(0, int(remaining)), math.ceil(int(reset_us) / 1_000_000)
+
+    async def _run_sliding_window(
+        self,
+        rules: List[RateLimitRule],
+        window_id: int,
+        picks: Optional[Mapping[RateLimitRule, int]] = None,
+    ) -> RateLimitDecision:
+        weight = self._sliding_weight(window_id)
+        reset_in = max(1, self._reset_in_seconds())
+        keys: List[str] = []
+        args: List[Any] = []
+        for rule in rules:
+            current = self._counter_key(rule, window_id, picks)
+            if rule.algorithm == ALGORITHM_SLIDING:
+                keys += [current, f"{rule.key_prefix}:{window_id - 1}"]
+                # Read back as the previous window during the next minute.
+                args += [rule.limit, weight, reset_in + self._WINDOW_SECONDS]
+            else:
+                keys += [current, current]
+                args += [rule.limit, 0, reset_in]
+
+        r = await get_auto_pipeline()
+        allowed, index, current_count, previous = await SLIDING_WINDOW_SCRIPT(
+            r, keys, args
+        )
+        return self._window_decision(
+            bool(allowed),
+            rules[int(index) - 1],
+            int(current_count),
+            int(previous),
+            weight,
+            reset_in,
+        )
+
+    async def _run_fixed_window(
+        self,
+        rules: List[RateLimitRule],
+        window_id: int,
+        picks: Optional[Mapping[RateLimitRule, int]] = None,
+    ) -> RateLimitDecision:
+        # ``rules`` is already ordered most specific first.
+        keys = [self._counter_key(rule, window_id, picks) for rule in rules]
+        # Counters expire with their window instead of 60 s after creation.
+        ttl = max(1, self._reset_in_seconds())
+        args = [ttl, *(rule.limit for rule in rules)]
+
+        r = await get_auto_pipeline()
+        allowed, index, remaining, reset = await FIXED_WINDOW_SCRIPT(r, keys, args)
+        reset_in = int(reset) if int(reset) >= 0 else self._reset_in_seconds()
+        return bool(allowed), rules[int(index) - 1], max(0, int(remaining)), reset_in
+
+    async def _check_with_pipeline(
+        self, rules: List[RateLimitRule], window_id: int
+    ) -> RateLimitDecision:
+        if any(rule.algorithm == ALGORITHM_GCRA for rule in rules):
+            # GCRA needs its script; single-key calls are valid on any node.
+            calls = [
+                self._run_gcra([rule])
+                for rule in rules
+                if rule.algorithm == ALGORITHM_GCRA
+            ]
+            others = [rule for rule in rules if rule.algorithm != ALGORITHM_GCRA]
+            if others:
+                calls.append(self._check_with_pipeline(others, window_id))
+            return self._pick_decision(rules, await asyncio.gather(*calls))
+
         r = await get_redis()
         pipe = r.pipeline()
-        limits: List[int] = []
 
-        for scope, ident, limit in rules:
-            k = self._key(scope, ident, window_id)
-            limits.append(limit)
+        for rule in rules:
+            k = self._counter_key(rule, window_id)
             pipe.incr(k)
-            pipe.expire(k, 60)
-
-        results = await pipe.execute()
-        counts = [int(results[i * 2]) for i in range(len(rules))]
+            if rule.algorithm == ALGORITHM_SLIDING:
+                pipe.expire(k, 2 * self._WINDOW_SECONDS)
+                pipe.get(f"{rule.key_prefix}:{window_id - 1}")
+            else:
+                pipe.expire(k, self._WINDOW_SECONDS)
 
+        results = iter(await pipe.execute())
+        weight = self._sliding_weight(window_id)
         reset_in = self._reset_in_seconds()
-        for idx, count in enumerate(counts):
-            if count > limits[idx]:
-                return False, rules[idx], max(0, limits[idx] - count), reset_in
+        decisions: List[RateLimitDecision] = []
+        for rule in rules:
+            count = int(next(results))
+            next(results)  # EXPIRE
+            previous = 0
+            if rule.algorithm == ALGORITHM_SLIDING:
+                previous = int(next(results) or 0)
+            allowed = math.floor(previous * weight) + count <= rule.limit
+            decision = self._window_decision(
+                allowed, rule, count, previous, weight, reset_in
+            )
+            if not allowed:
+                return decision
+            decisions.append(decision)
+        return decisions[0]
+
+    def _sliding_weight(self, window_id: int) -> float:
+        """Share of the previous window still inside the trailing minute."""
+        elapsed = time.time() - window_id * self._WINDOW_SECONDS
+        return min(1.0, max(0.0, 1.0 - elapsed / self._WINDOW_SECONDS))
 
-        def spec_weight(scope: str) -> int:
-            return 0 if scope == "ippath" else (1 if scope == "path" else 2)
+    def _window_decision(
+        self,
+        allowed: bool,
+        rule: RateLimitRule,
+        current: int,
+        previous: int,
+        weight: float,
+        reset_in: int,
+    ) -> RateLimitDecision:
+        used = current
+        if rule.algorithm == ALGORITHM_SLIDING:
+            used += math.floor(previous * weight)
+        if allowed:
+            return True, rule, max(0, rule.limit - used), reset_in
+        if rule.algorithm != ALGORITHM_SLIDING:
+            return False, rule, 0, reset_in
+        return (
+            False,
+            rule,
+            0,
+            self._sliding_retry_after(rule.limit, current, previous, weight),
+        )
 
-        most_specific_idx = sorted(
-            range(len(rules)), key=lambda i: spec_weight(rules[i][0])
-        )[0]
-        limit = limits[most_specific_idx]
-        current = counts[most_specific_idx]
-        remaining = max(0, limit - current)
-        return True, rules[most_specific_idx], remaining, reset_in
+    @classmethod
+    def _sliding_retry_after(
+        cls, limit: int, current: int, previous: int, weight: float
+    ) -> int:
+        """Seconds until the weighted count drops below ``limit`` without new
+        hits; unlike fixed windows this does not line up on the minute."""
+        window = cls._WINDOW_SECONDS
+        if current < limit and previous > 0:
+            # previous * (weight - t / window) < limit - current
+            return max(1, math.ceil((weight - (limit - current) / previous) * window))
+        # Wait for the next window, where this one becomes the previous:
+        # current * (1 - t / window) < limit
+        waited = weight * window + (1 - limit / max(current, 1)) * window
+        return max(1, math.ceil(waited))
 
 
 class _RateLimiterSingleton:
@@ -285,8 +1102,12 @@ class _RateLimiterSingleton:
 
     @classmethod
     def get_instance(cls) -> RedisRateLimiter:
+        settings = get_settings()
         if cls._instance is None:
-            cls._instance = RedisRateLimiter(Settings())
+            cls._instance = RedisRateLimiter(settings)
+        elif cls._instance.settings is not settings:
+            # Settings were reloaded (admin endpoint or SIGHUP).
+            cls._instance.apply_settings(settings)
         return cls._instance
 
     @classmethod
@@ -303,43 +1124,111 @@ def _set_rate_limiter(limiter: Optional[RedisRateLimiter]) -> None:
     _RateLimiterSingleton.set_instance(limiter)
 
 
-async def rate_limit_middleware(request: Request, call_next: Callable) -> Response:
-    limiter = get_rate_limiter()
-    client_ip = request.headers.get("x-forwarded-for", "").split(",")[0].strip() or (
-        request.client.host if request.client else ""
-    )
-    path = request.url.path
+if hasattr(os, "register_at_fork"):
+    # Leases, counters and tasks of the parent do not carry over to a worker.
+    os.register_at_fork(after_in_child=lambda: _set_rate_limiter(None))
+
 
-    allowed, rule, remaining, reset_in = await limiter.check_and_increment(
-        client_ip, path
+_RATE_LIMIT_HEADERS = (
+    b"x-ratelimit-limit",
+    b"x-ratelimit-remaining",
+    b"x-ratelimit-reset",
+)
+_BLOCKED_BODY_PREFIX = (
+    b'{"error":"RATE_LIMIT_EXCEEDED","message":"Too many requests","details":'
+)
+
+
+@lru_cache(maxsize=4096)
+def _blocked_details_prefix(scope: str, ident: str) -> bytes:
+    details = json.dumps(
+        {"scope": scope, "identifier": ident}, ensure_ascii=False, separators=(",", ":")
     )
-    if not allowed and rule is not None:
-        scope, ident, limit = rule
-        RATE_LIMIT_BLOCKED.labels(scope=scope).inc()
-        headers = {
-            "Retry-After": str(reset_in),
-            "X-RateLimit-Limit": str(limit),
-            "X-RateLimit-Remaining": str(remaining),
-        }
-        return JSONResponse(
-            status_code=429,
-            content={
-                "error": "RATE_LIMIT_EXCEEDED",
-                "message": "Too many requests",
-                "details": {
-                    "scope": scope,
-                    "identifier": ident,
-                    "reset_in": reset_in,
-                },
-            },
-            headers=headers,
+    return details[:-1].encode("utf-8") + b',"reset_in":'
+
+
+# Orchestrator probes are never rate limited (nor sent to Redis).
+_PROBE_PATHS = frozenset({"/livez", "/readyz"})
+
+
+def _client_ip(scope: Scope) -> str:
+    for name, value in scope["headers"]:
+        if name == b"x-forwarded-for":
+            forwarded: str = value.decode("latin-1").split(",")[0].strip()
+            if forwarded:
+                return forwarded
+            break
+    client = scope.get("client")
+    return str(client[0]) if client else ""
+
+
+class RateLimitMiddleware:
+    """Raw ASGI rate limiter: reads the client IP and path from the scope and
+    adds X-RateLimit headers by wrapping ``send``, so streaming responses pass
+    through untouched."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in _PROBE_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        limiter = get_rate_limiter()
+        allowed, rule, remaining, reset_in = await limiter.check_and_increment(
+            _client_ip(scope), scope["path"]
         )
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
 
-    response: Response = await call_next(request)
-    if rule is not None:
-        scope, ident, limit = rule
-        RATE_LIMIT_ALLOWED.labels(scope=scope).inc()
-        response.headers["X-RateLimit-Limit"] = str(limit)
-        response.headers["X-RateLimit-Remaining"] = str(remaining)
-        response.headers["X-RateLimit-Reset"] = str(reset_in)
-    return response
+        if not allowed:
+            RATE_LIMIT_BLOCKED.labels(scope=rule.scope).inc()
+            await self._send_blocked(send, rule, remaining, reset_in)
+            return
+
+        RATE_LIMIT_ALLOWED.labels(scope=rule.scope).inc()
+        extra_headers = [
+            (b"x-ratelimit-limit", str(rule.limit).encode()),
+            (b"x-ratelimit-remaining", str(remaining).encode()),
+            (b"x-ratelimit-reset", str(reset_in).encode()),
+        ]
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = [
+                    (name, value)
+                    for name, value in message.get("headers", [])
+                    if name.lower() not in _RATE_LIMIT_HEADERS
+                ]
+                message = {**message, "headers": headers + extra_headers}
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+    @staticmethod
+    async def _send_blocked(
+        send: Send, rule: RateLimitRule, remaining: int, reset_in: int
+    ) -> None:
+        body = (
+            _BLOCKED_BODY_PREFIX
+            + _blocked_details_prefix(rule.scope, rule.ident)
+            + str(reset_in).encode()
+            + b"}}"
+        )
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(reset_in).encode()),
+                    (b"x-ratelimit-limit", str(rule.limit).encode()),
+                    (b"x-ratelimit-remaining", str(remaining).encode()),
+                    (b"x-ratelimit-reset", str(reset_in).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
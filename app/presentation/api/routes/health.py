@@ -1,17 +1,45 @@
 from collections.abc import Awaitable
 from typing import Dict
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Response
 
 from app.infrastructure.redis_client import get_redis
+from app.presentation.readiness import get_snapshot, readiness
 
 router = APIRouter(tags=["Health"])
 
+_LIVE_BODY = b'{"status":"alive"}'
+
+
+@router.get("/livez")
+async def liveness() -> Response:
+    """The process answers; never touches Redis or upstream."""
+    return Response(_LIVE_BODY, media_type="application/json")
+
+
+@router.get("/readyz")
+async def readiness_check() -> Response:
+    """Served from the background-refreshed readiness snapshot."""
+    ready, body = readiness()
+    return Response(
+        body, status_code=200 if ready else 503, media_type="application/json"
+    )
+
 
 @router.get("/health")
 async def health_check() -> Dict[str, Dict[str, str] | str]:
     status = "healthy"
     redis_status = "connected"
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        # Reuse the monitor's last PING instead of sending one per call.
+        if not snapshot.redis_ok:
+            status = "unhealthy"
+            redis_status = snapshot.redis_error or "unhealthy"
+        return {
+            "status": status,
+            "redis": {"status": status, "details": redis_status},
+        }
     try:
         r = await get_redis()
         ping_result: bool | Awaitable[bool] = r.ping()
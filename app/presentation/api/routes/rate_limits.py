@@ -3,7 +3,7 @@ from __future__ import annotations
 from fastapi import APIRouter, Depends, HTTPException, status
 
 from app.core.config import Settings
-from app.presentation.api.dependencies import require_admin_token
+from app.presentation.api.dependencies import provide_settings, require_admin_token
 from app.presentation.api.middlewares.rate_limit import (
     RedisRateLimiter,
     get_rate_limiter,
@@ -33,10 +33,11 @@ async def replace_rate_limit_rules(
     payload: RateLimitRules,
     limiter: RedisRateLimiter = Depends(get_rate_limiter),
 ) -> RateLimitRules:
+    data = payload.model_dump()
     await limiter.set_rules(
-        ip_rules=dict(payload.ip),
-        path_rules=dict(payload.path),
-        ip_path_rules=[rule.model_dump() for rule in payload.ip_path],
+        ip_rules=data["ip"],
+        path_rules=data["path"],
+        ip_path_rules=data["ip_path"],
     )
     refreshed = await limiter.get_rules()
     return RateLimitRules.model_validate(refreshed)
@@ -55,14 +56,11 @@ async def patch_rate_limit_rules(
             detail="At least one of 'ip', 'path' or 'ip_path' must be provided.",
         )
 
-    next_ip = dict(payload.ip) if payload.ip is not None else dict(current["ip"])
-    next_path = (
-        dict(payload.path) if payload.path is not None else dict(current["path"])
-    )
+    data = payload.model_dump()
+    next_ip = data["ip"] if payload.ip is not None else dict(current["ip"])
+    next_path = data["path"] if payload.path is not None else dict(current["path"])
     next_ip_path = (
-        [rule.model_dump() for rule in payload.ip_path]
-        if payload.ip_path is not None
-        else list(current["ip_path"])
+        data["ip_path"] if payload.ip_path is not None else list(current["ip_path"])
     )
 
     await limiter.set_rules(
@@ -81,18 +79,20 @@ async def patch_rate_limit_rules(
 )
 async def reset_rate_limit_rules(
     limiter: RedisRateLimiter = Depends(get_rate_limiter),
+    settings: Settings = Depends(provide_settings),
 ) -> RateLimitRules:
-    settings = Settings()
-    defaults = RateLimitRules(
-        ip=settings.RATE_LIMIT_RULES_IP,
-        path=settings.RATE_LIMIT_RULES_PATH,
-        ip_path=settings.RATE_LIMIT_RULES_IP_PATH,
-    )
+    defaults = RateLimitRules.model_validate(
+        {
+            "ip": settings.RATE_LIMIT_RULES_IP,
+            "path": settings.RATE_LIMIT_RULES_PATH,
+            "ip_path": settings.RATE_LIMIT_RULES_IP_PATH,
+        }
+    ).model_dump()
 
     await limiter.set_rules(
-        ip_rules=dict(defaults.ip),
-        path_rules=dict(defaults.path),
-        ip_path_rules=[rule.model_dump() for rule in defaults.ip_path],
+        ip_rules=defaults["ip"],
+        path_rules=defaults["path"],
+        ip_path_rules=defaults["ip_path"],
     )
     refreshed = await limiter.get_rules()
     return RateLimitRules.model_validate(refreshed)
@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+import time
+
+from fastapi import APIRouter, Depends, status
+
+from app.core.config import reload_settings
+from app.presentation.api.dependencies import require_admin_token
+from app.presentation.api.middlewares.rate_limit import get_rate_limiter
+from app.presentation.schemas import SettingsReloadResult
+
+router = APIRouter(
+    prefix="/admin/settings",
+    tags=["Settings"],
+    dependencies=[Depends(require_admin_token)],
+)
+
+
+@router.post(
+    "/reload",
+    response_model=SettingsReloadResult,
+    status_code=status.HTTP_200_OK,
+)
+async def reload_app_settings() -> SettingsReloadResult:
+    reload_settings()
+    # The limiter picks up the new snapshot on its next lookup; do it now.
+    get_rate_limiter()
+    return SettingsReloadResult(reloaded_at=time.time())
@@ -0,0 +1,23 @@
+from __future__ import annotations
+
+from typing import List
+
+from fastapi import APIRouter, Depends
+
+from app.presentation.api.dependencies import require_admin_token
+from app.presentation.schemas import UpstreamBreakerStatus
+from app.presentation.upstream_breakers import get_upstream_breakers
+
+router = APIRouter(
+    prefix="/admin/upstreams",
+    tags=["Upstreams"],
+    dependencies=[Depends(require_admin_token)],
+)
+
+
+@router.get("/breakers", response_model=List[UpstreamBreakerStatus])
+async def get_upstream_breaker_states() -> List[UpstreamBreakerStatus]:
+    return [
+        UpstreamBreakerStatus.model_validate(item)
+        for item in get_upstream_breakers().snapshot()
+    ]
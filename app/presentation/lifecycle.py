@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Awaitable
+
+from app.core.config import Settings
+from app.infrastructure.redis_client import close_redis
+from app.presentation.api.middlewares.rate_limit import get_rate_limiter
+from app.presentation.proxy import _get_client, close_client, drain_background
+from app.presentation.upstream_pool import get_upstream_pool
+
+logger = logging.getLogger(__name__)
+
+
+class _LifecycleState:
+    ready = False
+
+
+def is_ready() -> bool:
+    """Whether startup warmup finished and shutdown has not begun."""
+    return _LifecycleState.ready
+
+
+def set_ready(ready: bool) -> None:
+    """Set by the lifespan once startup is done and when shutdown begins."""
+    _LifecycleState.ready = ready
+
+
+async def warm_up(settings: Settings) -> None:
+    """Build and exercise the Redis and upstream pools before serving.
+
+    Each part is best effort: failures are logged and the lazy paths take
+    over, so a slow dependency delays startup by at most
+    ``STARTUP_WARMUP_TIMEOUT`` instead of blocking it.
+    """
+    started = time.perf_counter()
+    timeout = settings.STARTUP_WARMUP_TIMEOUT
+    results = await asyncio.gather(
+        _bounded(get_rate_limiter().warm_up(), timeout),
+        _bounded(
+            get_upstream_pool(settings).warm_up(
+                _get_client(), settings.PROXY_WARMUP_CONNECTIONS
+            ),
+            timeout,
+        ),
+        return_exceptions=True,
+    )
+    for part, result in zip(("rate limiter", "upstream"), results):
+        if isinstance(result, BaseException):
+            logger.warning("Startup warmup of the %s failed: %r", part, result)
+    logger.info("Startup warmup took %.3fs", time.perf_counter() - started)
+
+
+async def _bounded(work: Awaitable[None], timeout: float) -> None:
+    async with asyncio.timeout(timeout):
+        await work
+
+
+async def drain(settings: Settings) -> None:
+    """Let background work finish, then close the Redis and upstream pools.
+
+    The server has stopped accepting connections and waited for in-flight
+    requests (up to ``SHUTDOWN_DRAIN_SECONDS``) by the time this runs.
+    Pending approximate rate-limit hits are flushed while Redis is still
+    open.
+    """
+    set_ready(False)
+    timeout = settings.SHUTDOWN_DRAIN_SECONDS
+    await asyncio.gather(drain_background(timeout), get_rate_limiter().drain(timeout))
+    await close_client()
+    await close_redis()
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import os
+from typing import Callable, Dict
+
+from prometheus_client import Gauge, multiprocess
+
+logger = logging.getLogger(__name__)
+
+# prometheus_client picks its storage from this variable when metrics are
+# created, so it is read once at import like the client itself does.
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+_SAMPLE_INTERVAL = 1.0
+
+# Shared by the phase histograms: sub-millisecond Redis and cache work up to
+# slow upstream responses, few enough buckets to keep the series count low.
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+class _GaugeSampler:
+    """Callback gauges for multiprocess mode.
+
+    ``/metrics`` then only reads what every worker wrote to the shared
+    directory, so callbacks registered here are evaluated and written on a
+    timer instead of at scrape time.
+    """
+
+    _callbacks: Dict[Gauge, Callable[[], float]] = {}
+    _task: asyncio.Task[None] | None = None
+
+    @classmethod
+    def register(cls, gauge: Gauge, fn: Callable[[], float]) -> None:
+        cls._callbacks[gauge] = fn
+
+    @classmethod
+    def sample(cls) -> None:
+        for gauge, fn in list(cls._callbacks.items()):
+            gauge.set(fn())
+
+    @classmethod
+    def start(cls) -> None:
+        if cls._task is not None and not cls._task.done():
+            return
+        cls._task = asyncio.create_task(cls._run())
+
+    @classmethod
+    async def stop(cls) -> None:
+        task, cls._task = cls._task, None
+        if task is None:
+            return
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+    @classmethod
+    async def _run(cls) -> None:
+        while True:
+            try:
+                cls.sample()
+            except Exception:
+                logger.warning("Sampling callback gauges failed", exc_info=True)
+            await asyncio.sleep(_SAMPLE_INTERVAL)
+
+
+def gauge_function(gauge: Gauge, fn: Callable[[], float]) -> None:
+    """``gauge.set_function(fn)`` that also works with several workers."""
+    if MULTIPROCESS:
+        _GaugeSampler.register(gauge, fn)
+    else:
+        gauge.set_function(fn)
+
+
+def start_worker_metrics() -> None:
+    """Start this worker's gauge sampler (multiprocess mode only)."""
+    if MULTIPROCESS:
+        _GaugeSampler.start()
+
+
+async def stop_worker_metrics() -> None:
+    """Stop the sampler and drop this worker's live gauges from the
+    aggregate, so a stopped worker does not keep reporting."""
+    if not MULTIPROCESS:
+        return
+    await _GaugeSampler.stop()
+    multiprocess.mark_process_dead(os.getpid())
@@ -1,14 +1,61 @@
 from __future__ import annotations
 
-from typing import Dict, Iterable
+import asyncio
+import importlib.util
+import logging
+import math
+import os
+import time
+from dataclasses import dataclass
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    Dict,
+    Hashable,
+    Iterable,
+    Optional,
+    Set,
+    Tuple,
+)
 
 import httpx
-from fastapi import APIRouter, Request, Response
+from fastapi import APIRouter, Depends, Request, Response
+from prometheus_client import Counter
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from app.core.config import Settings, get_settings
+from app.core.micro_cache import CacheRule, MicroCache, cache_lifetime
+from app.core.singleflight import SingleFlight
+from app.presentation.api.dependencies import provide_settings
+from app.presentation.upstream_breakers import UpstreamCircuitOpen
+from app.presentation.upstream_pool import UpstreamPool, get_upstream_pool
+from app.presentation.upstream_timing import TimedResponse, UpstreamTrace
 
-from app.core.config import Settings
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+PROXY_POOL_EXHAUSTED = Counter(
+    "meli_proxy_upstream_pool_exhausted_total",
+    "Requests rejected with 503 because no upstream connection was free",
+)
+PROXY_COALESCED = Counter(
+    "meli_proxy_upstream_coalesced_total",
+    "Requests answered by an identical in-flight upstream call",
+)
+
+PROXY_CACHE_REQUESTS = Counter(
+    "meli_proxy_cache_requests_total",
+    "Micro-cache lookups by result (hit, stale, miss)",
+    labelnames=["result"],
+)
+
+# Methods without a body whose responses may be shared between callers.
+COALESCE_METHODS = frozenset({"GET", "HEAD"})
+# Methods that may be hedged or retried upstream.
+IDEMPOTENT_METHODS = COALESCE_METHODS
+
 
 HOP_BY_HOP_HEADERS: set[str] = {
     "connection",
@@ -56,17 +103,31 @@ class _ProxyAsyncClientSingleton:
     @classmethod
     def get_client(cls) -> httpx.AsyncClient:
         if cls._client is None:
-            cls._client = httpx.AsyncClient(
-                follow_redirects=False,
-                timeout=httpx.Timeout(10.0, connect=2.0),
-                limits=httpx.Limits(
-                    max_connections=2000,
-                    max_keepalive_connections=2000,
-                    keepalive_expiry=30.0,
-                ),
-            )
+            cls._client = cls._build(get_settings())
         return cls._client
 
+    @staticmethod
+    def _build(settings: Settings) -> httpx.AsyncClient:
+        http2 = settings.PROXY_HTTP2
+        if http2 and importlib.util.find_spec("h2") is None:
+            logger.warning("PROXY_HTTP2 needs the 'h2' package; using HTTP/1.1")
+            http2 = False
+        return httpx.AsyncClient(
+            follow_redirects=False,
+            http2=http2,
+            timeout=httpx.Timeout(
+                connect=settings.PROXY_CONNECT_TIMEOUT,
+                read=settings.PROXY_READ_TIMEOUT,
+                write=settings.PROXY_WRITE_TIMEOUT,
+                pool=settings.PROXY_POOL_TIMEOUT,
+            ),
+            limits=httpx.Limits(
+                max_connections=settings.PROXY_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.PROXY_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.PROXY_KEEPALIVE_EXPIRY,
+            ),
+        )
+
     @classmethod
     def set_client(cls, client: httpx.AsyncClient | None) -> None:
         """Visible for tests to replace or clear the singleton instance."""
@@ -77,17 +138,449 @@ def _get_client() -> httpx.AsyncClient:
     return _ProxyAsyncClientSingleton.get_client()
 
 
+async def close_client() -> None:
+    """Close the upstream pool; a later request builds a new client."""
+    client = _ProxyAsyncClientSingleton._client
+    _ProxyAsyncClientSingleton.set_client(None)
+    if client is not None:
+        await client.aclose()
+
+
+async def drain_background(timeout: float) -> None:
+    """Wait up to ``timeout`` seconds for background cache refreshes."""
+    if _background:
+        await asyncio.wait(set(_background), timeout=timeout)
+
+
+if hasattr(os, "register_at_fork"):
+    # A forked worker must not share the parent's upstream connections.
+    os.register_at_fork(
+        after_in_child=lambda: _ProxyAsyncClientSingleton.set_client(None)
+    )
+
+
+def _pool_exhausted() -> Response:
+    PROXY_POOL_EXHAUSTED.inc()
+    return JSONResponse(
+        {
+            "error": "UPSTREAM_POOL_EXHAUSTED",
+            "message": "No upstream connection available",
+        },
+        status_code=503,
+        headers={"retry-after": "1"},
+    )
+
+
+def _circuit_open(exc: UpstreamCircuitOpen) -> Response:
+    return JSONResponse(
+        {
+            "error": "UPSTREAM_UNAVAILABLE",
+            "message": "Upstream circuit breaker is open",
+            "details": {"upstream": exc.upstream, "prefix": exc.prefix},
+        },
+        status_code=503,
+        headers={"retry-after": str(max(1, math.ceil(exc.retry_in)))},
+    )
+
+
 @router.api_route(
     "/{full_path:path}",
     methods=["GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS"],
     tags=["proxy"],
 )
-async def proxy_all(full_path: str, request: Request) -> Response:
-    settings = Settings()
-    upstream_base = settings.PROXY_UPSTREAM_BASE.rstrip("/")
-    url = f"{upstream_base}/{full_path}"
+async def proxy_all(
+    full_path: str,
+    request: Request,
+    settings: Settings = Depends(provide_settings),
+) -> Response:
+    headers = _upstream_headers(request)
+    client = _get_client()
+    pool = get_upstream_pool(settings)
+    try:
+        if request.method == "GET":
+            rule = settings.PROXY_CACHE_POLICY.match(request.url.path)
+            if rule is not None:
+                return await _cached(
+                    client, pool, full_path, headers, request, settings, rule
+                )
+        if settings.PROXY_COALESCE and request.method in COALESCE_METHODS:
+            return await _coalesced(client, pool, full_path, headers, request, settings)
+        return await _forward(
+            client, pool, request.method, full_path, headers, request, settings
+        )
+    except httpx.PoolTimeout:
+        return _pool_exhausted()
+    except UpstreamCircuitOpen as exc:
+        return _circuit_open(exc)
+
+
+@dataclass(frozen=True, slots=True)
+class _BufferedUpstream:
+    status_code: int
+    headers: Dict[str, str]
+    content: bytes
+
+    def to_response(self) -> Response:
+        return TimedResponse(
+            content=self.content,
+            status_code=self.status_code,
+            headers=self.headers,
+            media_type=self.headers.get("content-type"),
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class _PartialUpstream:
+    """An upstream response whose body outgrew a buffer: the raw bytes read
+    so far and the still open rest of the stream."""
+
+    upstream: httpx.Response
+    head: bytes
+    rest: AsyncIterator[bytes]
+
+    def to_response(self) -> Response:
+        return _UpstreamStreamingResponse(
+            self.upstream,
+            _filter_headers(self.upstream.headers.items()),
+            self._content(),
+        )
+
+    async def _content(self) -> AsyncIterator[bytes]:
+        if self.head:
+            yield self.head
+        async for chunk in self.rest:
+            yield chunk
+
+    async def aclose(self) -> None:
+        await self.upstream.aclose()
+
+
+class _Handoff:
+    """Passes a body too large to share to the caller that started the
+    shared fetch, the only one that streams it.
+
+    The fetch runs in its own task; if that caller is gone by the time the
+    body overflows, the upstream response is closed instead of leaked.
+    """
+
+    __slots__ = ("partial", "_abandoned")
+
+    def __init__(self) -> None:
+        self.partial: Optional[_PartialUpstream] = None
+        self._abandoned = False
+
+    async def give(self, partial: _PartialUpstream) -> None:
+        if self._abandoned:
+            await partial.aclose()
+        else:
+            self.partial = partial
+
+    async def abandon(self) -> None:
+        self._abandoned = True
+        partial, self.partial = self.partial, None
+        if partial is not None:
+            await partial.aclose()
+
+
+_inflight: SingleFlight[Optional[_BufferedUpstream]] = SingleFlight()
+
+
+def _request_key(
+    request: Request, path: str, vary: Tuple[str, ...]
+) -> Tuple[Hashable, ...]:
+    # Keyed by upstream path, not URL: every target serves the same content.
+    return (
+        request.method,
+        path,
+        request.url.query,
+        tuple(request.headers.get(name, "") for name in vary),
+    )
+
+
+async def _coalesced(
+    client: httpx.AsyncClient,
+    pool: UpstreamPool,
+    path: str,
+    headers: Dict[str, str],
+    request: Request,
+    settings: Settings,
+) -> Response:
+    """Identical concurrent requests share the first one's upstream call; the
+    response is buffered so every waiter gets its own copy."""
+    key = _request_key(request, path, settings.PROXY_COALESCE_VARY_HEADERS)
+    handoff = _Handoff()
+    try:
+        upstream, shared = await _inflight.do(
+            key,
+            lambda: _fetch_shareable(
+                client,
+                pool,
+                request.method,
+                path,
+                headers,
+                request,
+                _buffer_max(settings),
+                handoff,
+            ),
+        )
+    except BaseException:
+        await handoff.abandon()
+        raise
+    if upstream is None:
+        if handoff.partial is not None:
+            # This caller started the fetch: it streams what is left.
+            return handoff.partial.to_response()
+        # Too large to hold for every waiter: the others send their own.
+        return await _forward(
+            client, pool, request.method, path, headers, request, settings
+        )
+    if shared:
+        PROXY_COALESCED.inc()
+    return upstream.to_response()
+
+
+def _buffer_max(settings: Settings) -> Optional[int]:
+    """Largest body shared from memory; ``None`` when everything is
+    buffered anyway (streaming disabled)."""
+    return settings.PROXY_BUFFER_MAX_BYTES if settings.PROXY_STREAMING else None
+
+
+class _ResponseCacheSingleton:
+    _cache: MicroCache[_BufferedUpstream] | None = None
+
+    @classmethod
+    def get_cache(cls, max_bytes: int) -> MicroCache[_BufferedUpstream]:
+        if cls._cache is None or cls._cache.max_bytes != max_bytes:
+            cls._cache = MicroCache(max_bytes)
+        return cls._cache
+
+    @classmethod
+    def set_cache(cls, cache: MicroCache[_BufferedUpstream] | None) -> None:
+        """Visible for tests to replace or clear the shared cache."""
+        cls._cache = cache
 
-    method = request.method
+
+_background: Set[asyncio.Task[None]] = set()
+
+
+async def _cached(
+    client: httpx.AsyncClient,
+    pool: UpstreamPool,
+    path: str,
+    headers: Dict[str, str],
+    request: Request,
+    settings: Settings,
+    rule: CacheRule,
+) -> Response:
+    cache = _ResponseCacheSingleton.get_cache(settings.PROXY_CACHE_MAX_BYTES)
+    key = _request_key(request, path, settings.PROXY_CACHE_VARY_HEADERS)
+    cached, fresh = cache.get(key, time.monotonic())
+    if cached is None:
+        PROXY_CACHE_REQUESTS.labels(result="miss").inc()
+        # Concurrent misses for one key share the upstream call.
+        handoff = _Handoff()
+        try:
+            upstream, _ = await _inflight.do(
+                key,
+                lambda: _fetch_and_store(
+                    cache, key, rule, client, pool, path, headers, request, handoff
+                ),
+            )
+        except BaseException:
+            await handoff.abandon()
+            raise
+        if upstream is None:
+            # Too large to ever be cached: stream it instead.
+            if handoff.partial is not None:
+                response = handoff.partial.to_response()
+                response.headers["x-cache"] = "MISS"
+                return response
+            return await _forward(
+                client, pool, request.method, path, headers, request, settings
+            )
+        return _with_cache_status(upstream, "MISS")
+
+    if fresh:
+        PROXY_CACHE_REQUESTS.labels(result="hit").inc()
+        return _with_cache_status(cached, "HIT")
+
+    PROXY_CACHE_REQUESTS.labels(result="stale").inc()
+    if cache.claim_refresh(key):
+        task = asyncio.ensure_future(
+            _refresh(cache, key, rule, client, pool, path, headers, request)
+        )
+        _background.add(task)
+        task.add_done_callback(_background.discard)
+    return _with_cache_status(cached, "STALE")
+
+
+def _with_cache_status(upstream: _BufferedUpstream, status: str) -> Response:
+    response = upstream.to_response()
+    response.headers["x-cache"] = status
+    return response
+
+
+async def _fetch_and_store(
+    cache: MicroCache[_BufferedUpstream],
+    key: Hashable,
+    rule: CacheRule,
+    client: httpx.AsyncClient,
+    pool: UpstreamPool,
+    path: str,
+    headers: Dict[str, str],
+    request: Request,
+    handoff: Optional[_Handoff] = None,
+) -> Optional[_BufferedUpstream]:
+    """Fetch and cache ``key``; ``None`` when the body outgrows the cache,
+    whose rest then goes to ``handoff`` (closed without one)."""
+    # GETs carry no body; not reading it keeps background refreshes from
+    # waiting on a request that already got its response.
+    upstream_resp = await _send_buffered(
+        client, pool, "GET", path, headers, request, b""
+    )
+    # The cache would refuse a larger body anyway; do not hold it in memory.
+    body = await _read_raw_within(upstream_resp, cache.max_bytes)
+    if isinstance(body, _PartialUpstream):
+        cache.discard(key)
+        if handoff is None:
+            await body.aclose()
+        else:
+            await handoff.give(body)
+        return None
+    upstream = _BufferedUpstream(
+        upstream_resp.status_code,
+        _filter_headers(upstream_resp.headers.items()),
+        body,
+    )
+    lifetime = _cache_lifetime(upstream, rule)
+    if lifetime is None:
+        # Upstream no longer allows caching it (or failed): drop stale copies.
+        cache.discard(key)
+    else:
+        size = len(upstream.content) + sum(
+            len(name) + len(value) for name, value in upstream.headers.items()
+        )
+        cache.put(key, upstream, size, time.monotonic(), *lifetime)
+    return upstream
+
+
+def _cache_lifetime(
+    upstream: _BufferedUpstream, rule: CacheRule
+) -> Optional[Tuple[float, float]]:
+    headers = upstream.headers
+    if (
+        upstream.status_code != 200
+        or "set-cookie" in headers
+        or headers.get("vary", "").strip() == "*"
+    ):
+        return None
+    return cache_lifetime(rule, headers.get("cache-control"))
+
+
+async def _refresh(
+    cache: MicroCache[_BufferedUpstream],
+    key: Hashable,
+    rule: CacheRule,
+    client: httpx.AsyncClient,
+    pool: UpstreamPool,
+    path: str,
+    headers: Dict[str, str],
+    request: Request,
+) -> None:
+    try:
+        await _inflight.do(
+            key,
+            lambda: _fetch_and_store(
+                cache, key, rule, client, pool, path, headers, request
+            ),
+        )
+    except Exception:
+        cache.release(key)
+        logger.warning("Background cache refresh failed for %s", path, exc_info=True)
+
+
+async def _fetch_buffered(
+    client: httpx.AsyncClient,
+    pool: UpstreamPool,
+    method: str,
+    path: str,
+    headers: Dict[str, str],
+    request: Request,
+    body: bytes | None = None,
+) -> _BufferedUpstream:
+    upstream_resp = await _send_buffered(
+        client, pool, method, path, headers, request, body
+    )
+    return await _buffer(upstream_resp)
+
+
+async def _fetch_shareable(
+    client: httpx.AsyncClient,
+    pool: UpstreamPool,
+    method: str,
+    path: str,
+    headers: Dict[str, str],
+    request: Request,
+    buffer_max: Optional[int],
+    handoff: _Handoff,
+) -> Optional[_BufferedUpstream]:
+    """``_fetch_buffered`` for responses held for several callers, or
+    ``None`` when the body outgrows ``buffer_max``; its rest then goes to
+    ``handoff``."""
+    upstream_resp = await _send_buffered(
+        client, pool, method, path, headers, request, None
+    )
+    if buffer_max is None or method == "HEAD":
+        return await _buffer(upstream_resp)
+    body = await _read_raw_within(upstream_resp, buffer_max)
+    if isinstance(body, _PartialUpstream):
+        await handoff.give(body)
+        return None
+    return _BufferedUpstream(
+        upstream_resp.status_code,
+        _filter_headers(upstream_resp.headers.items()),
+        body,
+    )
+
+
+async def _send_buffered(
+    client: httpx.AsyncClient,
+    pool: UpstreamPool,
+    method: str,
+    path: str,
+    headers: Dict[str, str],
+    request: Request,
+    body: bytes | None,
+) -> httpx.Response:
+    if body is None:
+        body = await request.body()
+
+    def send(url: str) -> Awaitable[httpx.Response]:
+        upstream_req = client.build_request(
+            method,
+            url,
+            headers=headers,
+            params=request.query_params,
+            content=body,
+            extensions={"trace": UpstreamTrace()},
+        )
+        # Streamed so the body can be read raw, as upstream encoded it.
+        return client.send(upstream_req, stream=True)
+
+    send_via = pool.send_idempotent if method in IDEMPOTENT_METHODS else pool.send
+    return await send_via(path, request.url.path, send)
+
+
+async def _buffer(upstream_resp: httpx.Response) -> _BufferedUpstream:
+    # Raw (still encoded) bytes, so Content-Encoding/Length stay truthful.
+    return _BufferedUpstream(
+        upstream_resp.status_code,
+        _filter_headers(upstream_resp.headers.items()),
+        await _read_raw(upstream_resp),
+    )
+
+
+def _upstream_headers(request: Request) -> Dict[str, str]:
     headers = _filter_headers(request.headers.items())
     existing_forwarded_for = request.headers.get("x-forwarded-for", "")
     client_ip = existing_forwarded_for.split(",")[0].strip() or (
@@ -109,19 +602,137 @@ async def proxy_all(full_path: str, request: Request) -> Response:
         key.lower() == "x-forwarded-proto" for key in headers
     ):
         headers["X-Forwarded-Proto"] = request.url.scheme
+    return headers
 
-    body = await request.body()
 
-    client = _get_client()
-    upstream_resp = await client.request(
-        method, url, headers=headers, params=request.query_params, content=body
-    )
+async def _forward(
+    client: httpx.AsyncClient,
+    pool: UpstreamPool,
+    method: str,
+    path: str,
+    headers: Dict[str, str],
+    request: Request,
+    settings: Settings,
+) -> Response:
+    if settings.PROXY_STREAMING:
+        return await _proxy_streaming(
+            client,
+            pool,
+            method,
+            path,
+            headers,
+            request,
+            settings.PROXY_BUFFER_MAX_BYTES,
+        )
+
+    upstream = await _fetch_buffered(client, pool, method, path, headers, request)
+    return upstream.to_response()
+
 
+class _UpstreamStreamingResponse(StreamingResponse):
+    """Streams an upstream body and always releases the upstream connection."""
+
+    def __init__(
+        self,
+        upstream: httpx.Response,
+        headers: Dict[str, str],
+        content: Optional[AsyncIterator[bytes]] = None,
+    ) -> None:
+        super().__init__(
+            content=upstream.aiter_raw() if content is None else content,
+            status_code=upstream.status_code,
+            headers=headers,
+            media_type=upstream.headers.get("content-type"),
+        )
+        self._upstream = upstream
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            # Also runs when the client disconnects mid-stream.
+            await self._upstream.aclose()
+
+
+def _fits_buffer(length: str | None, buffer_max: int) -> bool:
+    return length is not None and length.isdigit() and int(length) <= buffer_max
+
+
+async def _read_raw(upstream: httpx.Response) -> bytes:
+    try:
+        return b"".join([chunk async for chunk in upstream.aiter_raw()])
+    finally:
+        await upstream.aclose()
+
+
+async def _read_raw_within(
+    upstream: httpx.Response, limit: int
+) -> bytes | _PartialUpstream:
+    """Read the raw body if it is at most ``limit`` bytes; otherwise stop
+    there and keep the response open for streaming."""
+    raw = upstream.aiter_raw()
+    length = upstream.headers.get("content-length")
+    if length is not None and length.isdigit() and int(length) > limit:
+        return _PartialUpstream(upstream, b"", raw)
+    # Without a length (chunked, HTTP/2) only reading tells.
+    chunks = []
+    size = 0
+    try:
+        async for chunk in raw:
+            chunks.append(chunk)
+            size += len(chunk)
+            if size > limit:
+                return _PartialUpstream(upstream, b"".join(chunks), raw)
+    except BaseException:
+        await upstream.aclose()
+        raise
+    await upstream.aclose()
+    return b"".join(chunks)
+
+
+async def _proxy_streaming(
+    client: httpx.AsyncClient,
+    pool: UpstreamPool,
+    method: str,
+    path: str,
+    headers: Dict[str, str],
+    request: Request,
+    buffer_max: int,
+) -> Response:
+    request_length = request.headers.get("content-length")
+    content: bytes | AsyncIterator[bytes]
+    if _fits_buffer(request_length, buffer_max) or (
+        request_length is None
+        and "chunked" not in request.headers.get("transfer-encoding", "").lower()
+    ):
+        content = await request.body()
+    else:
+        content = request.stream()
+
+    def send(url: str) -> Awaitable[httpx.Response]:
+        upstream_req = client.build_request(
+            method,
+            url,
+            headers=headers,
+            params=request.query_params,
+            content=content,
+            extensions={"trace": UpstreamTrace()},
+        )
+        return client.send(upstream_req, stream=True)
+
+    if method in IDEMPOTENT_METHODS and isinstance(content, bytes):
+        # Only a buffered body can be sent again by a hedge or retry.
+        upstream_resp = await pool.send_idempotent(path, request.url.path, send)
+    else:
+        upstream_resp = await pool.send(path, request.url.path, send)
     resp_headers = _filter_headers(upstream_resp.headers.items())
 
-    return Response(
-        content=upstream_resp.content,
-        status_code=upstream_resp.status_code,
-        headers=resp_headers,
-        media_type=upstream_resp.headers.get("content-type"),
-    )
+    # Raw (still encoded) bytes, so Content-Encoding/Length stay truthful.
+    if _fits_buffer(upstream_resp.headers.get("content-length"), buffer_max):
+        return TimedResponse(
+            content=await _read_raw(upstream_resp),
+            status_code=upstream_resp.status_code,
+            headers=resp_headers,
+            media_type=upstream_resp.headers.get("content-type"),
+        )
+    return _UpstreamStreamingResponse(upstream_resp, resp_headers)
@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import json
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Deque, Dict, List, Optional, Tuple
+
+from prometheus_client import Gauge
+
+from app.core.config import Settings, get_settings
+from app.infrastructure.redis_client import get_redis
+from app.presentation.api.middlewares.rate_limit import FAILURE_CLOSED
+from app.presentation.lifecycle import is_ready
+from app.presentation.upstream_breakers import get_upstream_breakers
+from app.presentation.upstream_pool import get_upstream_pool
+
+logger = logging.getLogger(__name__)
+
+EVENT_LOOP_LAG = Gauge(
+    "meli_proxy_event_loop_lag_seconds",
+    "How late the readiness monitor's timer fired on the event loop",
+    multiprocess_mode="livemax",
+)
+REDIS_RTT = Gauge(
+    "meli_proxy_redis_rtt_seconds",
+    "Round-trip time of the readiness monitor's Redis PING",
+    multiprocess_mode="livemax",
+)
+
+
+@dataclass(frozen=True, slots=True)
+class ReadinessSnapshot:
+    # time.monotonic() of the refresh that built it.
+    checked_at: float
+    redis_error: Optional[str]
+    # Why the instance is not ready; empty when it is.
+    reasons: Tuple[str, ...]
+    # JSON body rendered once, so probes only copy bytes.
+    body: bytes
+
+    @property
+    def ready(self) -> bool:
+        return not self.reasons
+
+    @property
+    def redis_ok(self) -> bool:
+        return self.redis_error is None
+
+
+def build_snapshot(
+    settings: Settings,
+    redis_rtt: Optional[float],
+    redis_error: Optional[str],
+    loop_lag: float,
+) -> ReadinessSnapshot:
+    breakers = get_upstream_breakers()
+    targets = get_upstream_pool(settings).balancer.targets
+    healthy = sum(1 for t in targets if t.healthy and breakers.available(t.base, ""))
+    saturation = sum(t.outstanding for t in targets) / max(
+        1, settings.PROXY_MAX_CONNECTIONS
+    )
+
+    reasons: List[str] = []
+    if redis_error is not None and settings.RATE_LIMIT_FAILURE_POLICY == FAILURE_CLOSED:
+        # Every request would be rejected until Redis is back.
+        reasons.append("redis_unavailable")
+    if healthy == 0:
+        reasons.append("upstream_unreachable")
+    if saturation >= settings.READINESS_MAX_POOL_SATURATION:
+        reasons.append("pool_saturated")
+    if loop_lag * 1000 >= settings.READINESS_MAX_LOOP_LAG_MS:
+        reasons.append("event_loop_lag")
+
+    data: Dict[str, Any] = {
+        "status": "not_ready" if reasons else "ready",
+        "reasons": reasons,
+        "checked_at": time.time(),
+        "redis": {
+            "status": "healthy" if redis_error is None else "unhealthy",
+            "rtt_ms": None if redis_rtt is None else round(redis_rtt * 1000, 3),
+            "details": redis_error or "connected",
+        },
+        "upstreams": {"healthy": healthy, "total": len(targets)},
+        "pool_saturation": round(saturation, 4),
+        "event_loop_lag_ms": round(loop_lag * 1000, 3),
+    }
+    return ReadinessSnapshot(
+        checked_at=time.monotonic(),
+        redis_error=redis_error,
+        reasons=tuple(reasons),
+        body=json.dumps(data, separators=(",", ":")).encode(),
+    )
+
+
+async def _ping_redis(timeout: float) -> tuple[Optional[float], Optional[str]]:
+    started = time.perf_counter()
+    try:
+        async with asyncio.timeout(timeout):
+            r = await get_redis()
+            ping_result: bool | Awaitable[bool] = r.ping()
+            pong = (
+                await ping_result
+                if isinstance(ping_result, Awaitable)
+                else bool(ping_result)
+            )
+            if not pong:
+                return None, "no_pong"
+    except TimeoutError:
+        return None, "timeout"
+    except Exception as exc:
+        return None, str(exc) or type(exc).__name__
+    return time.perf_counter() - started, None
+
+
+class _ReadinessMonitor:
+    """Refreshes the snapshot in the background, so probes never wait on
+    Redis or upstream and their rate does not add load to either."""
+
+    _snapshot: Optional[ReadinessSnapshot] = None
+    _task: asyncio.Task[None] | None = None
+
+    @classmethod
+    def start(cls) -> None:
+        if cls._task is not None and not cls._task.done():
+            return
+        cls._task = asyncio.create_task(cls._run())
+
+    @classmethod
+    async def stop(cls) -> None:
+        task, cls._task = cls._task, None
+        if task is None:
+            return
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+    @classmethod
+    async def refresh(cls, loop_lag: float = 0.0) -> ReadinessSnapshot:
+        settings = get_settings()
+        rtt, error = await _ping_redis(settings.READINESS_REDIS_TIMEOUT_MS / 1000)
+        EVENT_LOOP_LAG.set(loop_lag)
+        if rtt is not None:
+            REDIS_RTT.set(rtt)
+        cls._snapshot = build_snapshot(settings, rtt, error, loop_lag)
+        return cls._snapshot
+
+    @classmethod
+    async def _run(cls) -> None:
+        loop = asyncio.get_running_loop()
+        # Worst lag over the last few rounds, so one quiet round right after
+        # a stall does not flip readiness straight back.
+        lags: Deque[float] = deque([0.0], maxlen=5)
+        while True:
+            try:
+                await cls.refresh(max(lags))
+            except Exception:
+                logger.warning("Readiness refresh failed", exc_info=True)
+            interval = max(0.05, get_settings().READINESS_INTERVAL)
+            expected = loop.time() + interval
+            await asyncio.sleep(interval)
+            # A blocked loop fires the timer late; the delay is the lag.
+            lags.append(max(0.0, loop.time() - expected))
+
+
+def get_snapshot() -> Optional[ReadinessSnapshot]:
+    """The latest snapshot, or ``None`` when it is missing or too old to
+    trust (the monitor is not running or the loop is stuck)."""
+    snapshot = _ReadinessMonitor._snapshot
+    if snapshot is None:
+        return None
+    max_age = 3 * max(0.05, get_settings().READINESS_INTERVAL)
+    if time.monotonic() - snapshot.checked_at > max_age:
+        return None
+    return snapshot
+
+
+def _set_snapshot(snapshot: Optional[ReadinessSnapshot]) -> None:
+    """Visible for tests to install or clear the snapshot."""
+    _ReadinessMonitor._snapshot = snapshot
+
+
+async def refresh_readiness() -> ReadinessSnapshot:
+    return await _ReadinessMonitor.refresh()
+
+
+def start_readiness_monitor() -> None:
+    _ReadinessMonitor.start()
+
+
+async def stop_readiness_monitor() -> None:
+    await _ReadinessMonitor.stop()
+
+
+def readiness() -> tuple[bool, bytes]:
+    """Readiness verdict and JSON body for ``/readyz``."""
+    if not is_ready():
+        return False, b'{"status":"not_ready","reasons":["starting_or_draining"]}'
+    snapshot = get_snapshot()
+    if snapshot is None:
+        return False, b'{"status":"not_ready","reasons":["no_snapshot"]}'
+    return snapshot.ready, snapshot.body
@@ -2,10 +2,16 @@ from .rate_limits import (
     RateLimitIPPathRule,
     RateLimitRules,
     RateLimitRulesPatch,
+    RateLimitRuleSpec,
 )
+from .settings import SettingsReloadResult
+from .upstreams import UpstreamBreakerStatus
 
 __all__ = [
     "RateLimitIPPathRule",
     "RateLimitRules",
     "RateLimitRulesPatch",
+    "RateLimitRuleSpec",
+    "SettingsReloadResult",
+    "UpstreamBreakerStatus",
 ]
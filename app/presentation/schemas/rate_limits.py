@@ -1,23 +1,62 @@
 from __future__ import annotations
 
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Literal, Optional
 
-from pydantic import BaseModel, ConfigDict, Field, PositiveInt
+from pydantic import (
+    BaseModel,
+    ConfigDict,
+    Field,
+    NonNegativeInt,
+    PositiveInt,
+    SerializerFunctionWrapHandler,
+    model_serializer,
+)
 
+from app.core.rate_limit_rules import MAX_SHARDS
+
+RateLimitMode = Literal["exact", "approximate", "lease"]
+RateLimitAlgorithm = Literal["fixed", "sliding", "gcra"]
+
+
+class _RateLimitRuleOptions(BaseModel):
+    """Optional per-rule settings; unset options are omitted when serialized."""
 
-class RateLimitIPPathRule(BaseModel):
     model_config = ConfigDict(extra="forbid")
 
+    mode: Optional[RateLimitMode] = None
+    shards: Optional[int] = Field(default=None, ge=1, le=MAX_SHARDS)
+    algorithm: Optional[RateLimitAlgorithm] = None
+    burst: Optional[NonNegativeInt] = None
+
+    @model_serializer(mode="wrap")
+    def _drop_unset_options(
+        self, handler: SerializerFunctionWrapHandler
+    ) -> Dict[str, Any]:
+        data: Dict[str, Any] = handler(self)
+        for name in _RateLimitRuleOptions.model_fields:
+            if data.get(name) is None:
+                data.pop(name, None)
+        return data
+
+
+class RateLimitRuleSpec(_RateLimitRuleOptions):
+    limit: PositiveInt
+
+
+class RateLimitIPPathRule(_RateLimitRuleOptions):
     ip: str = Field(min_length=1)
     path_prefix: str = Field(min_length=1)
     limit: PositiveInt
 
 
+RateLimitValue = PositiveInt | RateLimitRuleSpec
+
+
 class RateLimitRules(BaseModel):
     model_config = ConfigDict(extra="forbid")
 
-    ip: Dict[str, PositiveInt] = Field(default_factory=dict)
-    path: Dict[str, PositiveInt] = Field(default_factory=dict)
+    ip: Dict[str, RateLimitValue] = Field(default_factory=dict)
+    path: Dict[str, RateLimitValue] = Field(default_factory=dict)
     ip_path: List[RateLimitIPPathRule] = Field(default_factory=list)
     updated_at: Optional[float] = None
 
@@ -25,6 +64,6 @@ class RateLimitRules(BaseModel):
 class RateLimitRulesPatch(BaseModel):
     model_config = ConfigDict(extra="forbid")
 
-    ip: Optional[Dict[str, PositiveInt]] = None
-    path: Optional[Dict[str, PositiveInt]] = None
+    ip: Optional[Dict[str, RateLimitValue]] = None
+    path: Optional[Dict[str, RateLimitValue]] = None
     ip_path: Optional[List[RateLimitIPPathRule]] = None
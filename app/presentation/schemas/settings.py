@@ -0,0 +1,9 @@
+from __future__ import annotations
+
+from pydantic import BaseModel, ConfigDict
+
+
+class SettingsReloadResult(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    reloaded_at: float
@@ -0,0 +1,16 @@
+from __future__ import annotations
+
+from typing import Literal
+
+from pydantic import BaseModel, ConfigDict
+
+
+class UpstreamBreakerStatus(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    upstream: str
+    prefix: str
+    state: Literal["closed", "open", "half_open"]
+    error_rate: float
+    slow_rate: float
+    retry_in: float
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+from prometheus_client import Counter, Gauge
+
+from app.core.circuit_breaker import (
+    STATE_CLOSED,
+    STATE_HALF_OPEN,
+    STATE_OPEN,
+    RateCircuitBreaker,
+)
+from app.core.config import Settings, get_settings
+from app.presentation.metrics import gauge_function
+
+_STATE_VALUES = {STATE_CLOSED: 0, STATE_OPEN: 1, STATE_HALF_OPEN: 2}
+
+UPSTREAM_BREAKER_STATE = Gauge(
+    "meli_proxy_upstream_breaker_state",
+    "Upstream circuit breaker state (0 closed, 1 open, 2 half-open)",
+    labelnames=["upstream", "prefix"],
+    # With several workers: the highest state value any worker reports.
+    multiprocess_mode="livemax",
+)
+UPSTREAM_BREAKER_REJECTED = Counter(
+    "meli_proxy_upstream_breaker_rejected_total",
+    "Requests failed fast with 503 by an open upstream circuit breaker",
+    labelnames=["upstream", "prefix"],
+)
+
+# (upstream host, path prefix or "" for the whole host)
+BreakerKey = Tuple[str, str]
+
+
+class UpstreamCircuitOpen(Exception):
+    def __init__(self, upstream: str, prefix: str, retry_in: float) -> None:
+        super().__init__(f"Circuit open for {upstream}{prefix}")
+        self.upstream = upstream
+        self.prefix = prefix
+        self.retry_in = retry_in
+
+
+class UpstreamBreakers:
+    """Lazily created ``RateCircuitBreaker`` per upstream host and prefix."""
+
+    def __init__(self, settings: Settings) -> None:
+        self.settings = settings
+        self._prefixes = settings.PROXY_BREAKER_PREFIX_LIST
+        self._breakers: Dict[BreakerKey, RateCircuitBreaker] = {}
+
+    def key(self, url: str, path: str) -> BreakerKey:
+        prefix = next((p for p in self._prefixes if path.startswith(p)), "")
+        return urlsplit(url).netloc, prefix
+
+    def get(self, key: BreakerKey) -> RateCircuitBreaker:
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            settings = self.settings
+            breaker = RateCircuitBreaker(
+                window=settings.PROXY_BREAKER_WINDOW,
+                min_calls=settings.PROXY_BREAKER_MIN_CALLS,
+                error_rate=settings.PROXY_BREAKER_ERROR_RATE,
+                slow_seconds=settings.PROXY_BREAKER_SLOW_MS / 1000,
+                slow_rate=settings.PROXY_BREAKER_SLOW_RATE,
+                reset_timeout=settings.PROXY_BREAKER_OPEN_SECONDS,
+                probes=settings.PROXY_BREAKER_HALF_OPEN_PROBES,
+            )
+            self._breakers[key] = breaker
+            gauge_function(
+                UPSTREAM_BREAKER_STATE.labels(*key),
+                lambda: _STATE_VALUES[breaker.state],
+            )
+        return breaker
+
+    def available(self, url: str, path: str) -> bool:
+        """Whether a call to ``url`` would get past its breaker right now."""
+        if not self.settings.PROXY_BREAKER_ENABLED:
+            return True
+        breaker = self._breakers.get(self.key(url, path))
+        return breaker is None or breaker.state != STATE_OPEN
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        items: List[Dict[str, Any]] = []
+        for (upstream, prefix), breaker in sorted(self._breakers.items()):
+            error_rate, slow_rate = breaker.rates()
+            items.append(
+                {
+                    "upstream": upstream,
+                    "prefix": prefix,
+                    "state": breaker.state,
+                    "error_rate": error_rate,
+                    "slow_rate": slow_rate,
+                    "retry_in": breaker.retry_in(),
+                }
+            )
+        return items
+
+
+class _UpstreamBreakersSingleton:
+    _instance: Optional[UpstreamBreakers] = None
+
+    @classmethod
+    def get_instance(cls) -> UpstreamBreakers:
+        settings = get_settings()
+        if cls._instance is None or cls._instance.settings is not settings:
+            # Built again on settings reload; breakers start closed.
+            cls._instance = UpstreamBreakers(settings)
+        return cls._instance
+
+    @classmethod
+    def set_instance(cls, breakers: Optional[UpstreamBreakers]) -> None:
+        cls._instance = breakers
+
+
+def get_upstream_breakers() -> UpstreamBreakers:
+    return _UpstreamBreakersSingleton.get_instance()
+
+
+def _set_upstream_breakers(breakers: Optional[UpstreamBreakers]) -> None:
+    """Visible for tests to override or reset the shared registry."""
+    _UpstreamBreakersSingleton.set_instance(breakers)
+
+
+async def guarded_send(
+    url: str, path: str, send: Callable[[], Awaitable[httpx.Response]]
+) -> httpx.Response:
+    """Run one upstream call through its breaker.
+
+    Raises ``UpstreamCircuitOpen`` without calling upstream while the
+    breaker is open. Transport errors and 5xx responses count as failures;
+    a pool timeout is a local condition and records nothing.
+    """
+    breakers = get_upstream_breakers()
+    if not breakers.settings.PROXY_BREAKER_ENABLED:
+        return await send()
+    key = breakers.key(url, path)
+    breaker = breakers.get(key)
+    if not breaker.allow():
+        UPSTREAM_BREAKER_REJECTED.labels(*key).inc()
+        raise UpstreamCircuitOpen(key[0], key[1], breaker.retry_in())
+    generation = breaker.generation
+    started = time.perf_counter()
+    try:
+        response = await send()
+    except httpx.TransportError as exc:
+        if isinstance(exc, httpx.PoolTimeout):
+            breaker.release(generation)
+        else:
+            breaker.record(False, time.perf_counter() - started, generation)
+        raise
+    except BaseException:
+        breaker.release(generation)
+        raise
+    breaker.record(
+        response.status_code < 500, time.perf_counter() - started, generation
+    )
+    return response
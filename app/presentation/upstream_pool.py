@@ -0,0 +1,318 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import logging
+import time
+from typing import Awaitable, Callable, List, Optional, Set
+
+import httpx
+from prometheus_client import Counter, Gauge
+
+from app.core.balancer import Balancer, UpstreamTarget
+from app.core.config import Settings, get_settings
+from app.core.hedging import LatencyTracker, RetryBudget
+from app.presentation.metrics import gauge_function
+from app.presentation.upstream_breakers import get_upstream_breakers, guarded_send
+
+logger = logging.getLogger(__name__)
+
+UPSTREAM_HEALTHY = Gauge(
+    "meli_proxy_upstream_healthy",
+    "Whether an upstream target passes its health checks (1) or not (0)",
+    labelnames=["upstream"],
+    # With several workers: healthy only if every worker sees it healthy.
+    multiprocess_mode="livemin",
+)
+UPSTREAM_EXTRA_ATTEMPTS = Counter(
+    "meli_proxy_upstream_extra_attempts_total",
+    "Hedged (kind=hedge) and retried (kind=retry) GET/HEAD upstream attempts",
+    labelnames=["kind"],
+)
+UPSTREAM_HEDGE_WINS = Counter(
+    "meli_proxy_upstream_hedge_wins_total",
+    "Hedged requests answered by the hedge rather than the first attempt",
+)
+UPSTREAM_RETRY_BUDGET_EXHAUSTED = Counter(
+    "meli_proxy_upstream_retry_budget_exhausted_total",
+    "Hedges and retries skipped because the retry budget was spent",
+)
+UPSTREAM_OUTSTANDING = Gauge(
+    "meli_proxy_upstream_outstanding",
+    "Requests waiting for an upstream target's response headers",
+    labelnames=["upstream"],
+    multiprocess_mode="livesum",
+)
+
+
+class UpstreamPool:
+    """Upstream base URLs from ``PROXY_UPSTREAM_BASES`` behind a ``Balancer``."""
+
+    def __init__(self, settings: Settings) -> None:
+        self.settings = settings
+        self.balancer = Balancer(
+            settings.PROXY_UPSTREAM_BASES,
+            settings.PROXY_BALANCER,
+            unhealthy_after=settings.PROXY_HEALTH_UNHEALTHY_AFTER,
+            healthy_after=settings.PROXY_HEALTH_HEALTHY_AFTER,
+        )
+        for target in self.balancer.targets:
+            _export(target)
+        self.latency = LatencyTracker()
+        self.budget = RetryBudget(
+            settings.PROXY_RETRY_BUDGET_RATIO,
+            settings.PROXY_RETRY_BUDGET_MIN_PER_SECOND,
+        )
+
+    async def send(
+        self,
+        path: str,
+        route: str,
+        send: Callable[[str], Awaitable[httpx.Response]],
+        tried: Optional[List[UpstreamTarget]] = None,
+    ) -> httpx.Response:
+        """Send ``path`` to the best target through its circuit breaker.
+
+        ``send`` gets the full upstream URL. Targets whose breaker is open are
+        skipped while another one is usable (outlier ejection); the request
+        only fails fast when every target is open. Targets already in
+        ``tried`` are avoided too, and the chosen one is appended to it.
+        """
+        breakers = get_upstream_breakers()
+        balancer = self.balancer
+        avoid = tried or ()
+        target = balancer.pick(
+            lambda t: t not in avoid and breakers.available(t.base, route)
+        )
+        if tried is not None:
+            tried.append(target)
+        url = f"{target.base}/{path}"
+        balancer.begin(target)
+        started = time.perf_counter()
+        elapsed: Optional[float] = None
+        try:
+            response = await guarded_send(url, route, lambda: send(url))
+            elapsed = time.perf_counter() - started
+            self.latency.observe(elapsed)
+            return response
+        finally:
+            # Failed calls leave the latency average alone; health checks and
+            # the breaker take those targets out instead.
+            balancer.end(target, elapsed)
+
+    async def send_idempotent(
+        self,
+        path: str,
+        route: str,
+        send: Callable[[str], Awaitable[httpx.Response]],
+    ) -> httpx.Response:
+        """``send`` for GET/HEAD: hedged when enabled and retried on connect
+        errors, both paid from the retry budget."""
+        settings = self.settings
+        self.budget.deposit()
+        tried: List[UpstreamTarget] = []
+        retries = 0
+        while True:
+            try:
+                if settings.PROXY_HEDGE:
+                    return await self._hedged(path, route, send, tried)
+                return await self.send(path, route, send, tried)
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                # The request never reached upstream, so resending is safe.
+                if retries >= settings.PROXY_RETRY_ATTEMPTS or not self._spend():
+                    raise
+                retries += 1
+                UPSTREAM_EXTRA_ATTEMPTS.labels(kind="retry").inc()
+
+    def hedge_delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or ``None`` until enough samples."""
+        settings = self.settings
+        latency = self.latency.percentile(settings.PROXY_HEDGE_PERCENTILE)
+        if latency is None:
+            return None
+        return min(
+            max(latency, settings.PROXY_HEDGE_MIN_DELAY_MS / 1000),
+            settings.PROXY_HEDGE_MAX_DELAY_MS / 1000,
+        )
+
+    async def _hedged(
+        self,
+        path: str,
+        route: str,
+        send: Callable[[str], Awaitable[httpx.Response]],
+        tried: List[UpstreamTarget],
+    ) -> httpx.Response:
+        primary = asyncio.ensure_future(self.send(path, route, send, tried))
+        delay = self.hedge_delay()
+        if delay is not None:
+            try:
+                done, _ = await asyncio.wait({primary}, timeout=delay)
+            except asyncio.CancelledError:
+                primary.cancel()
+                primary.add_done_callback(_discard)
+                raise
+            if not done and self._spend():
+                UPSTREAM_EXTRA_ATTEMPTS.labels(kind="hedge").inc()
+                hedge = asyncio.ensure_future(self.send(path, route, send, tried))
+                return await _first_response(primary, hedge)
+        return await primary
+
+    def _spend(self) -> bool:
+        if self.budget.try_withdraw():
+            return True
+        UPSTREAM_RETRY_BUDGET_EXHAUSTED.inc()
+        return False
+
+    async def warm_up(self, client: httpx.AsyncClient, connections: int) -> None:
+        """Open about ``connections`` keepalive connections to every target by
+        sending that many concurrent health-check requests to each."""
+        if connections <= 0:
+            return
+        settings = self.settings
+        results = await asyncio.gather(
+            *(
+                client.get(
+                    f"{target.base}{settings.PROXY_HEALTH_CHECK_PATH}",
+                    timeout=settings.PROXY_HEALTH_CHECK_TIMEOUT,
+                )
+                for target in self.balancer.targets
+                for _ in range(connections)
+            ),
+            return_exceptions=True,
+        )
+        failed = sum(isinstance(result, BaseException) for result in results)
+        if failed:
+            logger.warning(
+                "%d of %d upstream warm-up requests failed", failed, len(results)
+            )
+
+    async def check_health(self, client: httpx.AsyncClient) -> None:
+        """Probe every target once; a single target is never taken out."""
+        targets = self.balancer.targets
+        if len(targets) < 2:
+            return
+        await asyncio.gather(*(self._probe(client, t) for t in targets))
+
+    async def _probe(self, client: httpx.AsyncClient, target: UpstreamTarget) -> None:
+        settings = self.settings
+        try:
+            response = await client.get(
+                f"{target.base}{settings.PROXY_HEALTH_CHECK_PATH}",
+                timeout=settings.PROXY_HEALTH_CHECK_TIMEOUT,
+            )
+            ok = response.status_code < 500
+        except httpx.HTTPError:
+            ok = False
+        if self.balancer.record_probe(target, ok):
+            logger.warning(
+                "Upstream %s is now %s",
+                target.base,
+                "healthy" if target.healthy else "unhealthy",
+            )
+
+
+async def _first_response(
+    primary: asyncio.Future[httpx.Response], hedge: asyncio.Future[httpx.Response]
+) -> httpx.Response:
+    """The first attempt to produce a response wins; the other is cancelled.
+
+    A failed attempt only loses if the other one still answers: when both
+    fail, the primary's error is raised.
+    """
+    pending = {primary, hedge}
+    winner: Optional[asyncio.Future[httpx.Response]] = None
+    try:
+        while pending and winner is None:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            winner = next((t for t in done if t.exception() is None), None)
+        if winner is None:
+            return primary.result()
+        if winner is hedge:
+            UPSTREAM_HEDGE_WINS.inc()
+        return winner.result()
+    finally:
+        for attempt in (primary, hedge):
+            if attempt is not winner:
+                attempt.cancel()
+                attempt.add_done_callback(_discard)
+
+
+def _discard(attempt: asyncio.Future[httpx.Response]) -> None:
+    """Release a losing attempt's response (streamed ones hold a connection)."""
+    if attempt.cancelled() or attempt.exception() is not None:
+        return
+    task = asyncio.ensure_future(attempt.result().aclose())
+    _closing.add(task)
+    task.add_done_callback(_closing.discard)
+
+
+_closing: Set[asyncio.Future[None]] = set()
+
+
+def _export(target: UpstreamTarget) -> None:
+    gauge_function(UPSTREAM_HEALTHY.labels(target.base), lambda: float(target.healthy))
+    gauge_function(
+        UPSTREAM_OUTSTANDING.labels(target.base), lambda: float(target.outstanding)
+    )
+
+
+class _UpstreamPoolSingleton:
+    _instance: Optional[UpstreamPool] = None
+    _health_task: asyncio.Task[None] | None = None
+
+    @classmethod
+    def get_instance(cls, settings: Settings) -> UpstreamPool:
+        if cls._instance is None or cls._instance.settings is not settings:
+            # Built again on settings reload; targets start healthy.
+            cls._instance = UpstreamPool(settings)
+        return cls._instance
+
+    @classmethod
+    def set_instance(cls, pool: Optional[UpstreamPool]) -> None:
+        cls._instance = pool
+
+    @classmethod
+    def start_health_checks(cls, client: httpx.AsyncClient) -> None:
+        if cls._health_task is not None and not cls._health_task.done():
+            return
+        cls._health_task = asyncio.create_task(_run_health_checks(client))
+
+    @classmethod
+    async def stop_health_checks(cls) -> None:
+        task, cls._health_task = cls._health_task, None
+        if task is None:
+            return
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+
+def get_upstream_pool(settings: Optional[Settings] = None) -> UpstreamPool:
+    return _UpstreamPoolSingleton.get_instance(settings or get_settings())
+
+
+def _set_upstream_pool(pool: Optional[UpstreamPool]) -> None:
+    """Visible for tests to override or reset the shared pool."""
+    _UpstreamPoolSingleton.set_instance(pool)
+
+
+def start_health_checks(client: httpx.AsyncClient) -> None:
+    """Start the background task probing the current pool's targets."""
+    _UpstreamPoolSingleton.start_health_checks(client)
+
+
+async def stop_health_checks() -> None:
+    await _UpstreamPoolSingleton.stop_health_checks()
+
+
+async def _run_health_checks(client: httpx.AsyncClient) -> None:
+    while True:
+        # Looked up every round so reloaded settings take effect.
+        settings = get_settings()
+        try:
+            await get_upstream_pool(settings).check_health(client)
+        except Exception:
+            logger.warning("Upstream health check round failed", exc_info=True)
+        await asyncio.sleep(max(0.1, settings.PROXY_HEALTH_CHECK_INTERVAL))
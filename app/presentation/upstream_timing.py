@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import time
+from typing import Any, Dict
+
+from prometheus_client import Histogram
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from app.presentation.metrics import LATENCY_BUCKETS
+
+UPSTREAM_PHASE_SECONDS = Histogram(
+    "meli_proxy_upstream_phase_seconds",
+    "Time per phase of an upstream request: waiting for a pooled connection "
+    "(pool_wait), opening one (connect), until the response headers (ttfb), "
+    "reading the body (body) and writing a buffered response to the client "
+    "(write)",
+    labelnames=["phase"],
+    buckets=LATENCY_BUCKETS,
+)
+# Bound once; labels() costs a dict lookup and a lock on every call.
+_POOL_WAIT = UPSTREAM_PHASE_SECONDS.labels(phase="pool_wait")
+_CONNECT = UPSTREAM_PHASE_SECONDS.labels(phase="connect")
+_TTFB = UPSTREAM_PHASE_SECONDS.labels(phase="ttfb")
+_BODY = UPSTREAM_PHASE_SECONDS.labels(phase="body")
+_WRITE = UPSTREAM_PHASE_SECONDS.labels(phase="write")
+
+
+class UpstreamTrace:
+    """httpcore ``trace`` extension that times one upstream attempt.
+
+    httpcore reports events such as ``connection.connect_tcp.started`` or
+    ``http11.receive_response_headers.complete``; only the few that bound a
+    phase are looked at. Pass a new instance per attempt, right before
+    sending, as ``extensions={"trace": UpstreamTrace()}``. On a streamed
+    response the body phase lasts until the client has read it all.
+    """
+
+    __slots__ = ("_mark", "_connecting")
+
+    def __init__(self) -> None:
+        self._mark = time.perf_counter()
+        self._connecting = False
+
+    async def __call__(self, event: str, info: Dict[str, Any]) -> None:
+        # Drop the "connection."/"http11."/"http2." prefix.
+        name = event.partition(".")[2]
+        if name == "connect_tcp.started":
+            self._lap(_POOL_WAIT)
+            self._connecting = True
+        elif name == "send_request_headers.started":
+            # A reused keepalive connection goes straight here.
+            self._lap(_CONNECT if self._connecting else _POOL_WAIT)
+            self._connecting = False
+        elif name == "receive_response_headers.complete":
+            self._lap(_TTFB)
+        elif name == "receive_response_body.complete":
+            self._lap(_BODY)
+
+    def _lap(self, phase: Any) -> None:
+        now = time.perf_counter()
+        phase.observe(now - self._mark)
+        self._mark = now
+
+
+class TimedResponse(Response):
+    """``Response`` that records how long writing it to the client took."""
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        started = time.perf_counter()
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            _WRITE.observe(time.perf_counter() - started)
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import glob
+import os
+
+import uvicorn
+
+from app.core.config import Settings, get_settings
+
+
+def worker_count(settings: Settings) -> int:
+    if settings.WORKERS > 0:
+        return settings.WORKERS
+    return os.cpu_count() or 1
+
+
+def prepare_multiproc_dir(path: str) -> None:
+    """Create the metrics directory and drop files left by a previous run,
+    which would otherwise be added to this run's counters."""
+    os.makedirs(path, exist_ok=True)
+    for stale in glob.glob(os.path.join(path, "*.db")):
+        os.remove(stale)
+
+
+def main() -> None:
+    """``python -m app.serve``: run the API with ``WORKERS`` processes.
+
+    Each worker is a fresh interpreter with its own event loop, Redis and
+    httpx pools and lifespan. With more than one, Prometheus metrics go to a
+    shared directory and ``/metrics`` on any worker reports every worker.
+    """
+    settings = get_settings()
+    workers = worker_count(settings)
+    if workers > 1:
+        # Must be set before any worker imports prometheus_client.
+        path = os.environ.setdefault(
+            "PROMETHEUS_MULTIPROC_DIR", settings.METRICS_MULTIPROC_DIR
+        )
+        prepare_multiproc_dir(path)
+    uvicorn.run(
+        "app.fast_api:app",
+        host=settings.HOST,
+        port=settings.PORT,
+        workers=workers,
+        # In-flight requests get this long after SIGTERM; then the lifespan
+        # drains background work and closes the pools.
+        timeout_graceful_shutdown=int(settings.SHUTDOWN_DRAIN_SECONDS),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Round trips per request under Redis Cluster: plain vs. hash-tagged keys.
+
+Offline, the counter keys of a sample request mix are mapped to cluster slots
+and nodes (16384 slots split evenly, like ``redis-cli --cluster create``):
+
+* plain keys use the ``INCR``/``EXPIRE`` pipeline, two commands per key and
+  one round trip per node touched;
+* hash-tagged keys use one ``EVALSHA`` per slot group: all of a client's ip
+  and ip+path counters form one group, each global path counter another.
+
+With ``--cluster host:port`` the same mix is also replayed against a local
+multi-node cluster (e.g. ``docker compose`` with ``REDIS_CLUSTER_NODES``) and
+the mean ``check_and_increment`` latency is reported per scheme.
+
+Run with ``python -m benchmarks.bench_cluster_keys [--nodes 3] [--cluster ...]``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from typing import Any, Dict, List, Tuple
+
+from redis.crc import key_slot
+
+from app.core.config import Settings
+from app.core.rate_limit_rules import (
+    KEY_SCHEME_HASHTAG,
+    KEY_SCHEME_PLAIN,
+    RuleIndex,
+    compile_rules,
+)
+
+REQUESTS = 5_000
+SLOTS = 16384
+
+
+def _build_rules(
+    rng: random.Random,
+) -> Tuple[Dict[str, Any], Dict[str, Any], List[Dict[str, Any]], List[str]]:
+    ips = [f"10.0.{i // 256}.{i % 256}" for i in range(1_000)]
+    rules_ip: Dict[str, Any] = {ip: 1_000 for ip in ips}
+    rules_path: Dict[str, Any] = {"/categories/": 10_000, "/items/": 5_000}
+    rules_ip_path = [
+        {"ip": ip, "path_prefix": "/items/", "limit": 10} for ip in rng.sample(ips, 200)
+    ]
+    return rules_ip, rules_path, rules_ip_path, ips
+
+
+def _samples(rng: random.Random, ips: List[str]) -> List[Tuple[str, str]]:
+    paths = ["/items/MLA1", "/categories/MLA5725", "/sites/MLA"]
+    return [(rng.choice(ips), rng.choice(paths)) for _ in range(REQUESTS)]
+
+
+def _node_of(key: str, nodes: int) -> int:
+    return key_slot(key.encode()) * nodes // SLOTS
+
+
+def _round_trips(
+    index: RuleIndex, scheme: str, samples: List[Tuple[str, str]], nodes: int
+) -> Tuple[float, float]:
+    """Mean (round trips, commands) per request for one key scheme."""
+    trips: List[int] = []
+    commands: List[int] = []
+    for ip, path in samples:
+        rules = index.match(ip, path)
+        if not rules:
+            continue
+        if scheme == KEY_SCHEME_HASHTAG:
+            groups = len({rule.tag for rule in rules})
+            trips.append(groups)
+            commands.append(groups)
+        else:
+            trips.append(len({_node_of(rule.key_prefix, nodes) for rule in rules}))
+            commands.append(2 * len(rules))
+    return statistics.fmean(trips), statistics.fmean(commands)
+
+
+async def _replay(cluster: str, scheme: str, samples: List[Tuple[str, str]]) -> float:
+    from app.core import config
+    from app.infrastructure import redis_client
+    from app.presentation.api.middlewares.rate_limit import RedisRateLimiter
+
+    settings = Settings(REDIS_CLUSTER_NODES=cluster, RATE_LIMIT_KEY_SCHEME=scheme)
+    config._set_settings(settings)
+    redis_client._RedisClientSingleton._client = None
+    limiter = RedisRateLimiter(settings)
+    limiter._last_refresh = float("inf")
+    rng = random.Random(7)
+    rules_ip, rules_path, rules_ip_path, _ = _build_rules(rng)
+    limiter._replace_rules(rules_ip, rules_path, rules_ip_path)
+
+    started = time.perf_counter()
+    for ip, path in samples:
+        await limiter.check_and_increment(ip, path)
+    return (time.perf_counter() - started) / len(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", type=int, default=3)
+    parser.add_argument("--cluster", help="host:port of a cluster node")
+    options = parser.parse_args()
+
+    rng = random.Random(42)
+    rules_ip, rules_path, rules_ip_path, ips = _build_rules(rng)
+    samples = _samples(rng, ips)
+
+    print(f"{'scheme':>8} {'round trips/req':>16} {'commands/req':>13}")
+    for scheme in (KEY_SCHEME_PLAIN, KEY_SCHEME_HASHTAG):
+        index = compile_rules(rules_ip, rules_path, rules_ip_path, scheme)
+        trips, commands = _round_trips(index, scheme, samples, options.nodes)
+        print(f"{scheme:>8} {trips:>16.2f} {commands:>13.2f}")
+
+    if options.cluster:
+        print(f"\n{'scheme':>8} {'us/request':>11}")
+        for scheme in (KEY_SCHEME_PLAIN, KEY_SCHEME_HASHTAG):
+            mean = asyncio.run(_replay(options.cluster, scheme, samples[:1_000]))
+            print(f"{scheme:>8} {mean * 1e6:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Accuracy and Redis cost: fixed window vs. sliding-window counter.
+
+Replays synthetic traffic for one rule through an in-memory model of the two
+Lua scripts (``FIXED_WINDOW_LUA`` and ``SLIDING_WINDOW_LUA``) and reports:
+
+* the most requests admitted in any trailing 60 s (the limit is the target);
+* the share of denied requests told to retry within 1 s of a minute
+  boundary, i.e. how synchronized the retries hitting upstream are;
+* Redis commands executed inside the script per request (both scripts are a
+  single EVALSHA round trip).
+
+Run with ``python -m benchmarks.bench_sliding_window``.
+"""
+
+from __future__ import annotations
+
+import math
+import random
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.presentation.api.middlewares.rate_limit import RedisRateLimiter
+
+LIMIT = 100
+WINDOW = 60
+DURATION = 30 * WINDOW
+
+
+class _Store:
+    def __init__(self) -> None:
+        self.counts: Dict[int, int] = {}
+        self.commands = 0
+
+    def get(self, window_id: int) -> int:
+        self.commands += 1
+        return self.counts.get(window_id, 0)
+
+    def incr(self, window_id: int) -> None:
+        self.commands += 1
+        self.counts[window_id] = self.counts.get(window_id, 0) + 1
+        if self.counts[window_id] == 1:
+            self.commands += 1  # EXPIRE on creation
+
+
+# Each model returns None when admitted, else the Retry-After in seconds.
+def _fixed(store: _Store, now: float) -> Optional[float]:
+    window_id = int(now // WINDOW)
+    if store.get(window_id) >= LIMIT:
+        return (window_id + 1) * WINDOW - now
+    store.incr(window_id)
+    return None
+
+
+def _sliding(store: _Store, now: float) -> Optional[float]:
+    window_id = int(now // WINDOW)
+    weight = 1.0 - (now - window_id * WINDOW) / WINDOW
+    current = store.get(window_id)
+    previous = store.get(window_id - 1)
+    if math.floor(previous * weight) + current >= LIMIT:
+        return RedisRateLimiter._sliding_retry_after(LIMIT, current, previous, weight)
+    store.incr(window_id)
+    return None
+
+
+def _steady(rng: random.Random, rate: float) -> List[float]:
+    times, now = [], 0.0
+    while now < DURATION:
+        now += rng.expovariate(rate)
+        times.append(now)
+    return times
+
+
+def _boundary_bursts(rng: random.Random) -> List[float]:
+    # A client that fires its whole budget right before and after each minute.
+    times: List[float] = []
+    for minute in range(1, DURATION // WINDOW):
+        edge = minute * WINDOW
+        times += [edge - rng.random() for _ in range(LIMIT)]
+        times += [edge + rng.random() for _ in range(LIMIT)]
+    return sorted(times)
+
+
+def _replay(
+    algorithm: Callable[[_Store, float], Optional[float]], times: List[float]
+) -> Tuple[int, float, float]:
+    store = _Store()
+    admitted: deque[float] = deque()
+    peak = 0
+    denied = 0
+    at_edge = 0
+    for now in times:
+        retry_after = algorithm(store, now)
+        if retry_after is not None:
+            denied += 1
+            offset = (now + retry_after) % WINDOW
+            if offset < 1 or offset > WINDOW - 1:
+                at_edge += 1
+            continue
+        admitted.append(now)
+        while admitted[0] <= now - WINDOW:
+            admitted.popleft()
+        peak = max(peak, len(admitted))
+    return peak, at_edge / max(denied, 1), store.commands / len(times)
+
+
+def main() -> None:
+    rng = random.Random(42)
+    scenarios = {
+        "steady 1.5x": _steady(rng, 1.5 * LIMIT / WINDOW),
+        "edge bursts": _boundary_bursts(rng),
+    }
+    print(
+        f"{'scenario':>12} {'algorithm':>9} {'peak/60s':>9} {'limit':>6} "
+        f"{'retry at :00':>12} {'cmds/req':>9}"
+    )
+    for name, times in scenarios.items():
+        for label, algorithm in (("fixed", _fixed), ("sliding", _sliding)):
+            peak, edge, commands = _replay(algorithm, times)
+            print(
+                f"{name:>12} {label:>9} {peak:>9} {LIMIT:>6} "
+                f"{edge:>11.0%} {commands:>9.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import unittest
+
+from app.core.balancer import BALANCER_EWMA, Balancer
+
+
+class BalancerTest(unittest.TestCase):
+    def test_least_outstanding_picks_the_idlest_target(self) -> None:
+        balancer = Balancer(["https://a", "https://b", "https://c"])
+        a, b, c = balancer.targets
+        balancer.begin(a)
+        balancer.begin(c)
+        balancer.begin(c)
+
+        self.assertIs(balancer.pick(), b)
+
+        balancer.end(c, 0.1)
+        balancer.end(c, 0.1)
+        balancer.begin(b)
+        self.assertIs(balancer.pick(), c)
+
+    def test_ewma_prefers_the_faster_target(self) -> None:
+        balancer = Balancer(["https://a", "https://b"], BALANCER_EWMA, decay=0.5)
+        a, b = balancer.targets
+        for target, elapsed in ((a, 0.4), (b, 0.1)):
+            balancer.begin(target)
+            balancer.end(target, elapsed)
+
+        self.assertIs(balancer.pick(), b)
+
+        # Load on the fast target eventually outweighs its latency edge.
+        for _ in range(4):
+            balancer.begin(b)
+        self.assertIs(balancer.pick(), a)
+
+        balancer.begin(a)
+        balancer.end(a, 0.2)
+        self.assertAlmostEqual(a.ewma, 0.3)
+
+    def test_failed_calls_do_not_move_the_average(self) -> None:
+        balancer = Balancer(["https://a", "https://b"], BALANCER_EWMA)
+        a = balancer.targets[0]
+        balancer.begin(a)
+        balancer.end(a, 0.2)
+        balancer.begin(a)
+        balancer.end(a, None)
+
+        self.assertEqual(a.outstanding, 0)
+        self.assertAlmostEqual(a.ewma, 0.2)
+
+    def test_probes_remove_and_readmit_targets(self) -> None:
+        balancer = Balancer(
+            ["https://a", "https://b"], unhealthy_after=2, healthy_after=3
+        )
+        a, b = balancer.targets
+        balancer.begin(b)
+
+        self.assertFalse(balancer.record_probe(a, False))
+        self.assertTrue(balancer.record_probe(a, False))
+        self.assertFalse(a.healthy)
+        self.assertIs(balancer.pick(), b)
+
+        self.assertFalse(balancer.record_probe(a, True))
+        self.assertFalse(balancer.record_probe(a, True))
+        self.assertTrue(balancer.record_probe(a, True))
+        self.assertIs(balancer.pick(), a)
+
+    def test_falls_back_when_no_target_qualifies(self) -> None:
+        balancer = Balancer(["https://a", "https://b"], unhealthy_after=1)
+        a, b = balancer.targets
+        balancer.record_probe(a, False)
+        balancer.record_probe(b, False)
+        balancer.begin(a)
+
+        self.assertIs(balancer.pick(), b)
+        # An unusable target (open breaker) is only picked if nothing else is.
+        self.assertIs(balancer.pick(lambda t: t is a), a)
+        self.assertIs(balancer.pick(lambda t: False), b)
+
+    def test_requires_a_target(self) -> None:
+        with self.assertRaises(ValueError):
+            Balancer([])
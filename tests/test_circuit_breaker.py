@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import unittest
+
+from app.core.circuit_breaker import (
+    STATE_CLOSED,
+    STATE_HALF_OPEN,
+    STATE_OPEN,
+    CircuitBreaker,
+    RateCircuitBreaker,
+)
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.now = 100.0
+        self.breaker = CircuitBreaker(3, 5.0, clock=lambda: self.now)
+
+    def test_opens_after_consecutive_failures(self) -> None:
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, STATE_CLOSED)
+
+        self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.state, STATE_OPEN)
+        self.assertFalse(self.breaker.allow())
+        self.assertAlmostEqual(self.breaker.retry_in(), 5.0)
+
+    def test_half_open_lets_a_single_probe_through(self) -> None:
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.now += 5.0
+
+        self.assertEqual(self.breaker.state, STATE_HALF_OPEN)
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+
+        self.breaker.record_success()
+
+        self.assertEqual(self.breaker.state, STATE_CLOSED)
+        self.assertTrue(self.breaker.allow())
+
+    def test_failed_probe_reopens(self) -> None:
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.now += 5.0
+        self.assertTrue(self.breaker.allow())
+
+        self.breaker.record_failure()
+
+        self.assertEqual(self.breaker.state, STATE_OPEN)
+        self.assertAlmostEqual(self.breaker.retry_in(), 5.0)
+
+    def test_released_probe_lets_the_next_one_through(self) -> None:
+        for _ in range(3):
+            self.breaker.record_failure()
+        self.now += 5.0
+        self.assertTrue(self.breaker.allow())
+
+        self.breaker.release()
+
+        self.assertEqual(self.breaker.state, STATE_HALF_OPEN)
+        self.assertTrue(self.breaker.allow())
+
+
+class RateCircuitBreakerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.now = 100.0
+        self.breaker = RateCircuitBreaker(
+            window=10,
+            min_calls=4,
+            error_rate=0.5,
+            slow_seconds=1.0,
+            slow_rate=0.75,
+            reset_timeout=5.0,
+            probes=2,
+            clock=lambda: self.now,
+        )
+
+    def test_opens_on_error_rate_after_min_calls(self) -> None:
+        for ok in (False, False, True):
+            self.breaker.record(ok, 0.1)
+        self.assertEqual(self.breaker.state, STATE_CLOSED)
+
+        self.breaker.record(True, 0.1)
+
+        self.assertEqual(self.breaker.state, STATE_OPEN)
+        self.assertFalse(self.breaker.allow())
+
+    def test_opens_on_slow_call_rate(self) -> None:
+        for elapsed in (2.0, 2.0, 2.0, 0.1):
+            self.breaker.record(True, elapsed)
+
+        self.assertEqual(self.breaker.state, STATE_OPEN)
+
+    def test_old_outcomes_leave_the_window(self) -> None:
+        for ok in [True] * 6 + [False] * 4:
+            self.breaker.record(ok, 0.1)
+        self.assertEqual(self.breaker.state, STATE_CLOSED)
+        self.assertEqual(self.breaker.rates(), (0.4, 0.0))
+
+        for _ in range(10):
+            self.breaker.record(True, 0.1)
+
+        self.assertEqual(self.breaker.rates(), (0.0, 0.0))
+
+    def test_half_open_needs_every_probe_to_pass(self) -> None:
+        for _ in range(4):
+            self.breaker.record(False, 0.1)
+        self.now += 5.0
+
+        self.assertEqual(self.breaker.state, STATE_HALF_OPEN)
+        self.assertTrue(self.breaker.allow())
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+        self.breaker.record(True, 0.1)
+        self.assertEqual(self.breaker.state, STATE_HALF_OPEN)
+        self.breaker.record(True, 0.1)
+
+        self.assertEqual(self.breaker.state, STATE_CLOSED)
+
+    def test_failed_or_slow_probe_reopens(self) -> None:
+        for _ in range(4):
+            self.breaker.record(False, 0.1)
+        self.now += 5.0
+        self.breaker.allow()
+
+        self.breaker.record(True, 2.0)
+
+        self.assertEqual(self.breaker.state, STATE_OPEN)
+        self.assertAlmostEqual(self.breaker.retry_in(), 5.0)
+
+    def test_calls_admitted_before_opening_are_not_probes(self) -> None:
+        self.assertTrue(self.breaker.allow())
+        late = self.breaker.generation
+        for _ in range(4):
+            self.breaker.record(False, 0.1)
+        self.now += 5.0
+        self.assertTrue(self.breaker.allow())
+        probe = self.breaker.generation
+
+        # The slow call admitted while closed finishes during the probe.
+        self.breaker.record(False, 0.1, late)
+        self.breaker.release(late)
+
+        self.assertEqual(self.breaker.state, STATE_HALF_OPEN)
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+        self.breaker.record(True, 0.1, probe)
+        self.breaker.record(True, 0.1, probe)
+        self.assertEqual(self.breaker.state, STATE_CLOSED)
+
+    def test_outcomes_while_open_are_ignored(self) -> None:
+        for _ in range(4):
+            self.breaker.record(False, 0.1)
+        self.now += 1.0
+
+        self.breaker.record(False, 0.1)
+
+        self.assertAlmostEqual(self.breaker.retry_in(), 4.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
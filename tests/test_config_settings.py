@@ -2,7 +2,11 @@ from __future__ import annotations
 
 import unittest
 
+from pytest import MonkeyPatch
+
+from app.core import config
 from app.core.config import Settings
+from app.core.micro_cache import CacheRule
 
 
 class SettingsParsingTest(unittest.TestCase):
@@ -28,6 +32,31 @@ class SettingsParsingTest(unittest.TestCase):
 
         self.assertEqual(settings.RATE_LIMIT_RULES_PATH, {"/categories/": 10000})
 
+    def test_rate_limit_rules_path_json_rule_specs(self) -> None:
+        settings = Settings(
+            RATE_LIMIT_RULES_PATH_JSON=(
+                '{"/categories/": {"limit": 10000, "mode": "approximate"},'
+                ' "/items/": {"limit": 5, "mode": "exact"}, "/off/": {"limit": 0}}'
+            )
+        )
+
+        self.assertEqual(
+            settings.RATE_LIMIT_RULES_PATH,
+            {"/categories/": {"limit": 10000, "mode": "approximate"}, "/items/": 5},
+        )
+
+    def test_rate_limit_key_layout_defaults_by_deployment(self) -> None:
+        self.assertEqual(Settings().RATE_LIMIT_KEY_LAYOUT, "plain")
+        self.assertEqual(
+            Settings(REDIS_CLUSTER_NODES="node1:7000").RATE_LIMIT_KEY_LAYOUT, "hashtag"
+        )
+        self.assertEqual(
+            Settings(
+                REDIS_CLUSTER_NODES="node1:7000", RATE_LIMIT_KEY_SCHEME="plain"
+            ).RATE_LIMIT_KEY_LAYOUT,
+            "plain",
+        )
+
     def test_rate_limit_rules_ip_path_json_filtered_entries(self) -> None:
         settings = Settings(
             RATE_LIMIT_RULES_IP_PATH_JSON="""
@@ -58,15 +87,13 @@ class SettingsParsingTest(unittest.TestCase):
         )
 
     def test_rate_limit_rules_ip_path_json_invalid_entries_fallback(self) -> None:
-        settings = Settings(
-            RATE_LIMIT_RULES_IP_PATH_JSON="""
+        settings = Settings(RATE_LIMIT_RULES_IP_PATH_JSON="""
             [
                 "not a dict",
                 {"ip": "", "path_prefix": "/items/", "limit": 10},
                 {"ip": "1.1.1.1", "path_prefix": "/items/", "limit": "not-int"}
             ]
-            """
-        )
+            """)
 
         self.assertEqual(
             settings.RATE_LIMIT_RULES_IP_PATH,
@@ -74,15 +101,13 @@ class SettingsParsingTest(unittest.TestCase):
         )
 
     def test_rate_limit_rules_ip_path_json_only_filtered_fallback(self) -> None:
-        settings = Settings(
-            RATE_LIMIT_RULES_IP_PATH_JSON="""
+        settings = Settings(RATE_LIMIT_RULES_IP_PATH_JSON="""
             [
                 {"ip": "", "path_prefix": "/items/", "limit": 5},
                 {"ip": "1.1.1.1", "path_prefix": "", "limit": 5},
                 {"ip": "1.1.1.1", "path_prefix": "/items/", "limit": 0}
             ]
-            """
-        )
+            """)
 
         self.assertEqual(
             settings.RATE_LIMIT_RULES_IP_PATH,
@@ -103,6 +128,54 @@ class SettingsParsingTest(unittest.TestCase):
 
         self.assertEqual(settings.PROXY_UPSTREAM_BASE, "https://example.com")
 
+    def test_admin_api_key_set_is_frozenset(self) -> None:
+        settings = Settings(ADMIN_API_TOKENS="foo, bar")
+
+        self.assertEqual(settings.ADMIN_API_KEY_SET, frozenset({"foo", "bar"}))
+
+    def test_proxy_upstream_base_is_pre_stripped(self) -> None:
+        settings = Settings(MELI_API_URL="https://example.com/")
+
+        self.assertEqual(settings.PROXY_UPSTREAM_BASE, "https://example.com")
+
+    def test_proxy_cache_policy_parses_rules(self) -> None:
+        settings = Settings(
+            PROXY_CACHE_RULES_JSON='{"/categories/": 60, "/sites/": {"ttl": 5}}'
+        )
+
+        self.assertEqual(
+            settings.PROXY_CACHE_POLICY.match("/categories/MLA1"), CacheRule(60)
+        )
+        self.assertFalse(Settings(PROXY_CACHE_RULES_JSON="not json").PROXY_CACHE_POLICY)
+
+    def test_derived_values_are_computed_once(self) -> None:
+        settings = Settings(RATE_LIMIT_RULES_PATH_JSON='{"/a/": 1}').precompute()
+
+        self.assertIs(settings.RATE_LIMIT_RULES_PATH, settings.RATE_LIMIT_RULES_PATH)
+
+
+class SettingsCacheTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.monkeypatch = MonkeyPatch()
+        config._set_settings(None)
+
+    def tearDown(self) -> None:
+        self.monkeypatch.undo()
+        config._set_settings(None)
+
+    def test_get_settings_is_cached(self) -> None:
+        self.assertIs(config.get_settings(), config.get_settings())
+
+    def test_reload_settings_rereads_environment(self) -> None:
+        first = config.get_settings()
+        self.monkeypatch.setenv("ADMIN_API_TOKENS", "rotated")
+
+        reloaded = config.reload_settings()
+
+        self.assertIsNot(first, reloaded)
+        self.assertIs(config.get_settings(), reloaded)
+        self.assertEqual(reloaded.ADMIN_API_KEY_SET, frozenset({"rotated"}))
+
 
 if __name__ == "__main__":
     unittest.main()
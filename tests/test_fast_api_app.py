@@ -14,7 +14,7 @@ class FastAPICreationTest(unittest.TestCase):
 
         with patch.object(
             fast_api, "Instrumentator", return_value=instrumentator
-        ), patch.object(fast_api, "Settings") as settings_cls:
+        ), patch.object(fast_api, "get_settings") as settings_cls:
             settings_cls.return_value = SimpleNamespace(
                 API_TITLE="Test API",
                 API_VERSION="0.0.1",
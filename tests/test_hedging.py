@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import unittest
+
+from app.core.hedging import LatencyTracker, RetryBudget
+
+
+class LatencyTrackerTest(unittest.TestCase):
+    def test_percentile_needs_enough_samples(self) -> None:
+        tracker = LatencyTracker(window=100, min_samples=10)
+        for _ in range(9):
+            tracker.observe(0.1)
+
+        self.assertIsNone(tracker.percentile(95))
+
+        tracker.observe(0.1)
+        self.assertEqual(tracker.percentile(95), 0.1)
+
+    def test_percentile_over_the_recent_window(self) -> None:
+        tracker = LatencyTracker(window=100, min_samples=1)
+        for ms in range(1, 101):
+            tracker.observe(ms / 1000)
+
+        self.assertAlmostEqual(tracker.percentile(50) or 0, 0.05)
+        self.assertAlmostEqual(tracker.percentile(95) or 0, 0.095)
+        self.assertAlmostEqual(tracker.percentile(100) or 0, 0.1)
+
+        # Old samples fall out of the window once it is full.
+        for _ in range(100):
+            tracker.observe(0.5)
+        self.assertEqual(len(tracker), 100)
+        self.assertEqual(tracker.percentile(50), 0.5)
+
+
+class RetryBudgetTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.now = 0.0
+
+    def _budget(self, ratio: float, min_per_second: float) -> RetryBudget:
+        return RetryBudget(ratio, min_per_second, clock=lambda: self.now)
+
+    def test_requests_pay_for_a_share_of_retries(self) -> None:
+        budget = self._budget(0.25, 0.0)
+        self.assertTrue(budget.try_withdraw())
+        self.assertFalse(budget.try_withdraw())
+
+        for _ in range(3):
+            budget.deposit()
+        self.assertFalse(budget.try_withdraw())
+        budget.deposit()
+        self.assertTrue(budget.try_withdraw())
+
+    def test_reserve_refills_over_time_up_to_capacity(self) -> None:
+        budget = self._budget(0.1, 2.0)
+        self.assertTrue(budget.try_withdraw())
+        self.assertTrue(budget.try_withdraw())
+        self.assertFalse(budget.try_withdraw())
+
+        self.now += 0.5
+        self.assertTrue(budget.try_withdraw())
+        self.assertFalse(budget.try_withdraw())
+
+        # Idle time does not build up more than the capacity.
+        self.now += 60
+        for _ in range(50):
+            budget.deposit()
+        self.assertEqual(budget.tokens, 2.0)
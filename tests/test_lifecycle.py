@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import asyncio
+import unittest
+from typing import List
+
+import httpx
+from pytest import MonkeyPatch
+
+from app.core import config
+from app.core.config import Settings
+from app.presentation import lifecycle, proxy
+from app.presentation import upstream_pool as up
+
+
+class DummyLimiter:
+    def __init__(self, delay: float = 0.0) -> None:
+        self.delay = delay
+        self.warmed = False
+        self.drained: float | None = None
+
+    async def warm_up(self) -> None:
+        await asyncio.sleep(self.delay)
+        self.warmed = True
+
+    async def drain(self, timeout: float) -> None:
+        self.drained = timeout
+
+
+class LifecycleTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.monkeypatch = MonkeyPatch()
+        self.settings = Settings(
+            PROXY_UPSTREAM_URLS="http://a.test,http://b.test",
+            PROXY_WARMUP_CONNECTIONS=3,
+            STARTUP_WARMUP_TIMEOUT=0.2,
+            SHUTDOWN_DRAIN_SECONDS=1,
+        )
+        config._set_settings(self.settings)
+        up._set_upstream_pool(None)
+        self.hits: List[str] = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            self.hits.append(f"{request.url.host}{request.url.path}")
+            return httpx.Response(200)
+
+        self.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        proxy._ProxyAsyncClientSingleton.set_client(self.client)
+        self.limiter = DummyLimiter()
+        self.monkeypatch.setattr(lifecycle, "get_rate_limiter", lambda: self.limiter)
+        self.redis_closed = False
+        self.drained_before_close: bool | None = None
+
+        async def close_redis() -> None:
+            self.drained_before_close = self.limiter.drained is not None
+            self.redis_closed = True
+
+        self.monkeypatch.setattr(lifecycle, "close_redis", close_redis)
+
+    async def asyncTearDown(self) -> None:
+        await self.client.aclose()
+        proxy._ProxyAsyncClientSingleton.set_client(None)
+        up._set_upstream_pool(None)
+        config._set_settings(None)
+        lifecycle.set_ready(False)
+        self.monkeypatch.undo()
+
+    async def test_warm_up_prepares_limiter_and_upstream_connections(self) -> None:
+        await lifecycle.warm_up(self.settings)
+
+        self.assertTrue(self.limiter.warmed)
+        self.assertEqual(sorted(self.hits), ["a.test/sites"] * 3 + ["b.test/sites"] * 3)
+
+    async def test_slow_warm_up_is_bounded(self) -> None:
+        self.limiter.delay = 10
+
+        with self.assertLogs(lifecycle.logger, "WARNING"):
+            await asyncio.wait_for(lifecycle.warm_up(self.settings), 2)
+
+        self.assertFalse(self.limiter.warmed)
+        self.assertEqual(len(self.hits), 6)
+
+    async def test_drain_waits_for_background_work_and_closes_pools(self) -> None:
+        lifecycle.set_ready(True)
+        finished = asyncio.Event()
+
+        async def refresh() -> None:
+            await asyncio.sleep(0.05)
+            finished.set()
+
+        task = asyncio.ensure_future(refresh())
+        proxy._background.add(task)
+        task.add_done_callback(proxy._background.discard)
+
+        await lifecycle.drain(self.settings)
+
+        self.assertFalse(lifecycle.is_ready())
+        self.assertTrue(finished.is_set())
+        self.assertTrue(self.client.is_closed)
+        self.assertTrue(self.redis_closed)
+        # Pending rate-limit hits go out while Redis is still open.
+        self.assertTrue(self.drained_before_close)
+        self.assertEqual(self.limiter.drained, 1)
+        self.assertIsNone(proxy._ProxyAsyncClientSingleton._client)
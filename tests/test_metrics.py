@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import unittest
+
+from prometheus_client import CollectorRegistry, Gauge
+from pytest import MonkeyPatch
+
+from app.presentation import metrics
+
+
+class GaugeFunctionTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.monkeypatch = MonkeyPatch()
+        self.monkeypatch.setattr(metrics._GaugeSampler, "_callbacks", {})
+        self.registry = CollectorRegistry()
+        self.gauge = Gauge("test_gauge", "Test", registry=self.registry)
+        self.value = 3.0
+
+    def tearDown(self) -> None:
+        self.monkeypatch.undo()
+
+    def _read(self) -> float | None:
+        return self.registry.get_sample_value("test_gauge")
+
+    def test_single_process_reads_the_callback_at_scrape(self) -> None:
+        self.monkeypatch.setattr(metrics, "MULTIPROCESS", False)
+        metrics.gauge_function(self.gauge, lambda: self.value)
+
+        self.value = 5.0
+
+        self.assertEqual(self._read(), 5.0)
+
+    def test_multiprocess_writes_sampled_values(self) -> None:
+        self.monkeypatch.setattr(metrics, "MULTIPROCESS", True)
+        metrics.gauge_function(self.gauge, lambda: self.value)
+        self.assertEqual(self._read(), 0.0)
+
+        metrics._GaugeSampler.sample()
+        self.value = 5.0
+
+        self.assertEqual(self._read(), 3.0)
+        metrics._GaugeSampler.sample()
+        self.assertEqual(self._read(), 5.0)
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import unittest
+
+from app.core.micro_cache import (
+    CachePolicy,
+    CacheRule,
+    MicroCache,
+    cache_lifetime,
+    parse_cache_rules,
+)
+
+
+class CacheRulesTest(unittest.TestCase):
+    def test_parse_accepts_ttl_or_spec_and_drops_disabled(self) -> None:
+        rules = parse_cache_rules(
+            {"/categories/": 60, "/sites/": {"ttl": 300, "stale": 30}, "/items/": 0}
+        )
+
+        self.assertEqual(
+            rules,
+            {"/categories/": CacheRule(60.0), "/sites/": CacheRule(300.0, 30.0)},
+        )
+
+    def test_policy_prefers_longest_prefix(self) -> None:
+        policy = CachePolicy({"/sites/": CacheRule(10), "/sites/MLA": CacheRule(20)})
+
+        self.assertEqual(policy.match("/sites/MLA/categories"), CacheRule(20))
+        self.assertEqual(policy.match("/sites/MLB"), CacheRule(10))
+        self.assertIsNone(policy.match("/items/MLA1"))
+        self.assertFalse(CachePolicy({}))
+
+    def test_lifetime_honors_cache_control(self) -> None:
+        rule = CacheRule(60, 30)
+
+        self.assertEqual(cache_lifetime(rule, None), (60, 30))
+        self.assertEqual(cache_lifetime(rule, "public, max-age=10"), (10, 30))
+        self.assertEqual(cache_lifetime(rule, "max-age=10, s-maxage=20"), (20, 30))
+        self.assertEqual(
+            cache_lifetime(rule, "max-age=600, stale-while-revalidate=5"), (60, 5)
+        )
+        self.assertIsNone(cache_lifetime(rule, "private, max-age=600"))
+        self.assertIsNone(cache_lifetime(rule, "no-store"))
+        self.assertIsNone(cache_lifetime(rule, "max-age=0"))
+
+
+class MicroCacheTest(unittest.TestCase):
+    def test_fresh_then_stale_then_gone(self) -> None:
+        cache: MicroCache[str] = MicroCache(100)
+        cache.put("k", "v", 10, now=0.0, ttl=5, stale=5)
+
+        self.assertEqual(cache.get("k", 4.0), ("v", True))
+        self.assertEqual(cache.get("k", 6.0), ("v", False))
+        self.assertEqual(cache.get("k", 10.0), (None, False))
+        self.assertEqual(cache.size_bytes, 0)
+
+    def test_evicts_least_recently_used_by_bytes(self) -> None:
+        cache: MicroCache[str] = MicroCache(100)
+        cache.put("a", "a", 40, now=0.0, ttl=60)
+        cache.put("b", "b", 40, now=0.0, ttl=60)
+        cache.get("a", 1.0)
+        cache.put("c", "c", 40, now=1.0, ttl=60)
+
+        self.assertEqual(cache.get("a", 2.0), ("a", True))
+        self.assertEqual(cache.get("b", 2.0), (None, False))
+        self.assertEqual(cache.size_bytes, 80)
+
+    def test_oversized_value_is_not_stored(self) -> None:
+        cache: MicroCache[str] = MicroCache(10)
+
+        self.assertFalse(cache.put("k", "v", 11, now=0.0, ttl=60))
+        self.assertEqual(len(cache), 0)
+
+    def test_only_one_refresh_is_claimed(self) -> None:
+        cache: MicroCache[str] = MicroCache(100)
+        cache.put("k", "v", 1, now=0.0, ttl=1, stale=10)
+
+        self.assertTrue(cache.claim_refresh("k"))
+        self.assertFalse(cache.claim_refresh("k"))
+        cache.release("k")
+        self.assertTrue(cache.claim_refresh("k"))
+
+
+if __name__ == "__main__":
+    unittest.main()
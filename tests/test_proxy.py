@@ -1,11 +1,17 @@
+import asyncio
+import gzip
 import unittest
 from types import SimpleNamespace
+from typing import Any, AsyncIterator, Callable
 
+import httpx
 from fastapi.testclient import TestClient
 from pytest import MonkeyPatch
 from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
 
 import app.fast_api as fast_api
+from app.core.micro_cache import CachePolicy, CacheRule
 
 
 class DummyUpstreamResp:
@@ -13,6 +19,13 @@ class DummyUpstreamResp:
         self.content = content
         self.status_code = status_code
         self.headers = headers
+        self.closed = False
+
+    async def aiter_raw(self) -> AsyncIterator[bytes]:
+        yield self.content
+
+    async def aclose(self) -> None:
+        self.closed = True
 
 
 class DummyClient:
@@ -27,6 +40,42 @@ class DummyClient:
             self.captured_request["kwargs"] = kwargs
         return self._resp
 
+    def build_request(self, *args: Any, **kwargs: Any) -> SimpleNamespace:
+        return SimpleNamespace(args=args, kwargs=kwargs)
+
+    async def send(
+        self, request: SimpleNamespace, stream: bool = False
+    ) -> DummyUpstreamResp:
+        self.captured_request["args"] = request.args
+        self.captured_request["kwargs"] = request.kwargs
+        self.captured_request["stream"] = stream
+        return self._resp
+
+
+def _settings(
+    streaming: bool = True,
+    coalesce: bool = False,
+    cache_rules: dict[str, CacheRule] | None = None,
+) -> SimpleNamespace:
+    return SimpleNamespace(
+        PROXY_UPSTREAM_BASE="https://upstream.test",
+        PROXY_UPSTREAM_BASES=("https://upstream.test",),
+        PROXY_BALANCER="least_outstanding",
+        PROXY_HEALTH_UNHEALTHY_AFTER=2,
+        PROXY_HEALTH_HEALTHY_AFTER=2,
+        PROXY_HEDGE=False,
+        PROXY_RETRY_ATTEMPTS=1,
+        PROXY_RETRY_BUDGET_RATIO=0.1,
+        PROXY_RETRY_BUDGET_MIN_PER_SECOND=5.0,
+        PROXY_STREAMING=streaming,
+        PROXY_BUFFER_MAX_BYTES=16,
+        PROXY_COALESCE=coalesce,
+        PROXY_COALESCE_VARY_HEADERS=("accept", "authorization"),
+        PROXY_CACHE_POLICY=CachePolicy(cache_rules or {}),
+        PROXY_CACHE_MAX_BYTES=1024,
+        PROXY_CACHE_VARY_HEADERS=("accept",),
+    )
+
 
 class DummyLimiter:
     async def check_and_increment(
@@ -131,17 +180,45 @@ class TestProxyLazyClient(unittest.TestCase):
         self.assertIn("timeout", kwargs)
         self.assertIn("limits", kwargs)
 
+    def test_client_pool_and_timeouts_come_from_settings(self) -> None:
+        import app.presentation.proxy as proxy
+        from app.core.config import Settings
+
+        settings = Settings(
+            PROXY_MAX_CONNECTIONS=50,
+            PROXY_MAX_KEEPALIVE_CONNECTIONS=20,
+            PROXY_CONNECT_TIMEOUT=1.5,
+            PROXY_READ_TIMEOUT=4.0,
+            PROXY_POOL_TIMEOUT=0.25,
+            PROXY_HTTP2=True,
+        )
+        self.monkeypatch.setattr(proxy, "get_settings", lambda: settings)
+        self.monkeypatch.setattr(proxy.importlib.util, "find_spec", lambda name: None)
+
+        client = proxy._get_client()
+        self.addCleanup(asyncio.run, client.aclose())
+
+        pool = client._transport._pool
+        self.assertEqual(pool._max_connections, 50)
+        self.assertEqual(pool._max_keepalive_connections, 20)
+        # Without the h2 package the client falls back to HTTP/1.1.
+        self.assertFalse(pool._http2)
+        self.assertEqual(client.timeout.connect, 1.5)
+        self.assertEqual(client.timeout.read, 4.0)
+        self.assertEqual(client.timeout.pool, 0.25)
+
 
 def _make_request(
     headers: list[tuple[bytes, bytes]],
     client: tuple[str, int] | None = ("127.0.0.1", 12345),
     scheme: str = "http",
+    body: bytes = b"",
 ) -> Request:
     scope = {
         "type": "http",
         "asgi": {"version": "3.0", "spec_version": "2.3"},
         "http_version": "1.1",
-        "method": "GET",
+        "method": "POST" if body else "GET",
         "path": "/proxy/test",
         "raw_path": b"/proxy/test",
         "headers": headers,
@@ -157,7 +234,7 @@ def _make_request(
         if body_sent["value"]:
             return {"type": "http.disconnect"}
         body_sent["value"] = True
-        return {"type": "http.request", "body": b"", "more_body": False}
+        return {"type": "http.request", "body": body, "more_body": False}
 
     return Request(scope, receive)
 
@@ -178,19 +255,13 @@ class TestProxyHeaderEdgeCases(unittest.IsolatedAsyncioTestCase):
         dummy_resp = DummyUpstreamResp(b"{}", 200, {"content-type": "application/json"})
         dummy_client = DummyClient(dummy_resp)
         self.proxy_module._ProxyAsyncClientSingleton.set_client(dummy_client)
-        self.monkeypatch.setattr(
-            self.proxy_module,
-            "Settings",
-            lambda: SimpleNamespace(PROXY_UPSTREAM_BASE="https://upstream.test"),
-            raising=True,
-        )
         request = _make_request(
             headers=[(b"x-forwarded-for", b"   ")],
             client=None,
             scheme="https",
         )
 
-        response = await self.proxy_module.proxy_all("proxy/test", request)
+        response = await self.proxy_module.proxy_all("proxy/test", request, _settings())
 
         self.assertEqual(response.status_code, 200)
         sent_headers = dummy_client.captured_request["kwargs"]["headers"]
@@ -200,18 +271,12 @@ class TestProxyHeaderEdgeCases(unittest.IsolatedAsyncioTestCase):
         dummy_resp = DummyUpstreamResp(b"{}", 200, {"content-type": "application/json"})
         dummy_client = DummyClient(dummy_resp)
         self.proxy_module._ProxyAsyncClientSingleton.set_client(dummy_client)
-        self.monkeypatch.setattr(
-            self.proxy_module,
-            "Settings",
-            lambda: SimpleNamespace(PROXY_UPSTREAM_BASE="https://upstream.test"),
-            raising=True,
-        )
         request = _make_request(
             headers=[],
             client=("203.0.113.1", 4242),
         )
 
-        response = await self.proxy_module.proxy_all("proxy/test", request)
+        response = await self.proxy_module.proxy_all("proxy/test", request, _settings())
 
         self.assertEqual(response.status_code, 200)
         sent_headers = dummy_client.captured_request["kwargs"]["headers"]
@@ -221,18 +286,12 @@ class TestProxyHeaderEdgeCases(unittest.IsolatedAsyncioTestCase):
         dummy_resp = DummyUpstreamResp(b"{}", 200, {"content-type": "application/json"})
         dummy_client = DummyClient(dummy_resp)
         self.proxy_module._ProxyAsyncClientSingleton.set_client(dummy_client)
-        self.monkeypatch.setattr(
-            self.proxy_module,
-            "Settings",
-            lambda: SimpleNamespace(PROXY_UPSTREAM_BASE="https://upstream.test"),
-            raising=True,
-        )
         request = _make_request(
             headers=[(b"x-forwarded-for", b"1.1.1.1")],
             client=("10.0.0.2", 5000),
         )
 
-        response = await self.proxy_module.proxy_all("proxy/test", request)
+        response = await self.proxy_module.proxy_all("proxy/test", request, _settings())
 
         self.assertEqual(response.status_code, 200)
         sent_headers = dummy_client.captured_request["kwargs"]["headers"]
@@ -248,12 +307,6 @@ class TestProxyHeaderEdgeCases(unittest.IsolatedAsyncioTestCase):
         dummy_resp = DummyUpstreamResp(b"{}", 200, {"content-type": "application/json"})
         dummy_client = DummyClient(dummy_resp)
         self.proxy_module._ProxyAsyncClientSingleton.set_client(dummy_client)
-        self.monkeypatch.setattr(
-            self.proxy_module,
-            "Settings",
-            lambda: SimpleNamespace(PROXY_UPSTREAM_BASE="https://upstream.test"),
-            raising=True,
-        )
         request = _make_request(
             headers=[
                 (b"host", b"incoming.example"),
@@ -265,7 +318,7 @@ class TestProxyHeaderEdgeCases(unittest.IsolatedAsyncioTestCase):
             scheme="https",
         )
 
-        response = await self.proxy_module.proxy_all("proxy/test", request)
+        response = await self.proxy_module.proxy_all("proxy/test", request, _settings())
 
         self.assertEqual(response.status_code, 200)
         sent_headers = dummy_client.captured_request["kwargs"]["headers"]
@@ -275,6 +328,492 @@ class TestProxyHeaderEdgeCases(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(sent_headers["x-forwarded-proto"], "https")
 
 
+class TestProxyStreaming(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.monkeypatch = MonkeyPatch()
+        from app.presentation import proxy as proxy_module
+
+        self.proxy_module = proxy_module
+
+    async def asyncTearDown(self) -> None:
+        self.proxy_module._ProxyAsyncClientSingleton.set_client(None)
+        self.monkeypatch.undo()
+
+    def _use(self, resp: DummyUpstreamResp) -> DummyClient:
+        dummy_client = DummyClient(resp)
+        self.proxy_module._ProxyAsyncClientSingleton.set_client(dummy_client)
+        return dummy_client
+
+    async def test_large_response_is_streamed_and_upstream_closed(self) -> None:
+        resp = DummyUpstreamResp(b"x" * 64, 200, {"content-type": "text/plain"})
+        dummy_client = self._use(resp)
+
+        response = await self.proxy_module.proxy_all(
+            "proxy/test", _make_request(headers=[]), _settings()
+        )
+
+        self.assertIsInstance(response, StreamingResponse)
+        self.assertTrue(dummy_client.captured_request["stream"])
+        self.assertEqual(dummy_client.captured_request["kwargs"]["content"], b"")
+        sent: list[dict] = []
+
+        async def receive() -> dict:
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message: dict) -> None:
+            sent.append(message)
+
+        await response({"type": "http", "asgi": {"spec_version": "2.4"}}, receive, send)
+
+        body = b"".join(m.get("body", b"") for m in sent)
+        self.assertEqual(body, b"x" * 64)
+        self.assertTrue(resp.closed)
+
+    async def test_small_response_is_buffered(self) -> None:
+        resp = DummyUpstreamResp(
+            b"{}", 200, {"content-type": "application/json", "content-length": "2"}
+        )
+        self._use(resp)
+
+        response = await self.proxy_module.proxy_all(
+            "proxy/test", _make_request(headers=[]), _settings()
+        )
+
+        self.assertNotIsInstance(response, StreamingResponse)
+        self.assertEqual(response.body, b"{}")
+        self.assertTrue(resp.closed)
+
+    async def test_large_request_body_is_streamed(self) -> None:
+        resp = DummyUpstreamResp(b"{}", 200, {"content-length": "2"})
+        dummy_client = self._use(resp)
+        payload = b"y" * 32
+        request = _make_request(
+            headers=[(b"content-length", str(len(payload)).encode())], body=payload
+        )
+
+        await self.proxy_module.proxy_all("proxy/test", request, _settings())
+
+        content = dummy_client.captured_request["kwargs"]["content"]
+        self.assertNotIsInstance(content, bytes)
+        self.assertEqual(b"".join([chunk async for chunk in content]), payload)
+
+    async def test_buffered_mode_reads_whole_body_and_closes(self) -> None:
+        resp = DummyUpstreamResp(b"x" * 64, 200, {"content-type": "text/plain"})
+        self._use(resp)
+
+        response = await self.proxy_module.proxy_all(
+            "proxy/test", _make_request(headers=[]), _settings(streaming=False)
+        )
+
+        self.assertNotIsInstance(response, StreamingResponse)
+        self.assertEqual(response.body, b"x" * 64)
+        self.assertTrue(resp.closed)
+
+
+class PoolTimeoutClient(DummyClient):
+    async def request(self, *args: Any, **kwargs: Any) -> DummyUpstreamResp:
+        raise httpx.PoolTimeout("pool exhausted")
+
+    async def send(
+        self, request: SimpleNamespace, stream: bool = False
+    ) -> DummyUpstreamResp:
+        raise httpx.PoolTimeout("pool exhausted")
+
+
+class TestProxyPoolExhaustion(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        from app.presentation import proxy as proxy_module
+
+        self.proxy_module = proxy_module
+        proxy_module._ProxyAsyncClientSingleton.set_client(
+            PoolTimeoutClient(DummyUpstreamResp(b"", 200, {}))
+        )
+
+    async def asyncTearDown(self) -> None:
+        self.proxy_module._ProxyAsyncClientSingleton.set_client(None)
+
+    async def test_pool_timeout_returns_503_and_counts(self) -> None:
+        counter = self.proxy_module.PROXY_POOL_EXHAUSTED
+        for streaming in (True, False):
+            before = counter._value.get()
+
+            response = await self.proxy_module.proxy_all(
+                "proxy/test", _make_request(headers=[]), _settings(streaming)
+            )
+
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response.headers["retry-after"], "1")
+            self.assertIn(b"UPSTREAM_POOL_EXHAUSTED", response.body)
+            self.assertEqual(counter._value.get(), before + 1)
+
+
+class TestProxyCircuitOpen(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        from app.presentation import proxy as proxy_module
+        from app.presentation import upstream_breakers
+
+        self.proxy_module = proxy_module
+        self.breakers = upstream_breakers
+        self.client = CountingClient(DummyUpstreamResp(b"", 500, {}))
+        proxy_module._ProxyAsyncClientSingleton.set_client(self.client)
+        upstream_breakers._set_upstream_breakers(None)
+
+    async def asyncTearDown(self) -> None:
+        self.proxy_module._ProxyAsyncClientSingleton.set_client(None)
+        self.breakers._set_upstream_breakers(None)
+
+    async def test_open_breaker_fails_fast_with_503(self) -> None:
+        breaker = self.breakers.get_upstream_breakers().get(("upstream.test", ""))
+        for _ in range(breaker.min_calls):
+            breaker.record(False, 0.1)
+
+        response = await self.proxy_module.proxy_all(
+            "proxy/test", _make_request(headers=[]), _settings(streaming=False)
+        )
+
+        self.assertEqual(response.status_code, 503)
+        self.assertIn(b"UPSTREAM_UNAVAILABLE", response.body)
+        self.assertGreaterEqual(int(response.headers["retry-after"]), 1)
+        self.assertEqual(self.client.calls, 0)
+
+
+class SlowClient(DummyClient):
+    def __init__(self, response: DummyUpstreamResp) -> None:
+        super().__init__(response)
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def send(
+        self, request: SimpleNamespace, stream: bool = False
+    ) -> DummyUpstreamResp:
+        self.calls += 1
+        await self.release.wait()
+        return self._resp
+
+
+class RawTransport(httpx.AsyncBaseTransport):
+    """Like ``httpx.MockTransport`` but leaves the body unread, as a network
+    transport does, so the raw bytes can still be streamed."""
+
+    def __init__(self, handler: Callable[[httpx.Request], httpx.Response]) -> None:
+        self.handler = handler
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return self.handler(request)
+
+
+class ChunkedStream(httpx.AsyncByteStream):
+    """Body without a Content-Length, as a chunked or HTTP/2 upstream sends."""
+
+    def __init__(self, *chunks: bytes) -> None:
+        self.chunks = chunks
+        self.closed = False
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        for chunk in self.chunks:
+            yield chunk
+
+    async def aclose(self) -> None:
+        self.closed = True
+
+
+async def _play(response: Response) -> bytes:
+    """Run ``response`` as an ASGI app and return the body it sent."""
+    sent: list[dict] = []
+
+    async def receive() -> dict:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: dict) -> None:
+        sent.append(message)
+
+    await response({"type": "http", "asgi": {"spec_version": "2.4"}}, receive, send)
+    return b"".join(m.get("body", b"") for m in sent)
+
+
+class TestProxyCoalescing(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        from app.presentation import proxy as proxy_module
+
+        self.proxy_module = proxy_module
+        self.client = SlowClient(
+            DummyUpstreamResp(
+                b'{"id":1}',
+                200,
+                {"content-type": "application/json", "content-length": "8"},
+            )
+        )
+        proxy_module._ProxyAsyncClientSingleton.set_client(self.client)
+
+    async def asyncTearDown(self) -> None:
+        self.proxy_module._ProxyAsyncClientSingleton.set_client(None)
+
+    async def _gather(self, *requests: Request) -> list:
+        tasks = [
+            asyncio.ensure_future(
+                self.proxy_module.proxy_all(
+                    "categories/MLA1", request, _settings(coalesce=True)
+                )
+            )
+            for request in requests
+        ]
+        await asyncio.sleep(0)
+        self.client.release.set()
+        return await asyncio.gather(*tasks)
+
+    async def test_identical_requests_share_one_upstream_call(self) -> None:
+        counter = self.proxy_module.PROXY_COALESCED
+        before = counter._value.get()
+
+        responses = await self._gather(*(_make_request(headers=[]) for _ in range(3)))
+
+        self.assertEqual(self.client.calls, 1)
+        self.assertEqual([r.body for r in responses], [b'{"id":1}'] * 3)
+        self.assertEqual(len({id(r) for r in responses}), 3)
+        self.assertEqual(counter._value.get(), before + 2)
+        self.assertEqual(len(self.proxy_module._inflight), 0)
+
+    async def test_vary_headers_split_calls(self) -> None:
+        await self._gather(
+            _make_request(headers=[(b"authorization", b"Bearer a")]),
+            _make_request(headers=[(b"authorization", b"Bearer b")]),
+        )
+
+        self.assertEqual(self.client.calls, 2)
+
+    async def _proxy_with(self, transport: httpx.AsyncBaseTransport) -> Response:
+        client = httpx.AsyncClient(transport=transport)
+        self.addAsyncCleanup(client.aclose)
+        self.proxy_module._ProxyAsyncClientSingleton.set_client(client)
+        settings = _settings(coalesce=True)
+        settings.PROXY_BUFFER_MAX_BYTES = 48
+        return await self.proxy_module.proxy_all(
+            "categories/MLA1", _make_request(headers=[]), settings
+        )
+
+    async def test_shares_the_encoded_body_as_upstream_sent_it(self) -> None:
+        encoded = gzip.compress(b'{"id":1}')
+
+        def upstream(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(
+                200,
+                headers={
+                    "content-encoding": "gzip",
+                    "content-length": str(len(encoded)),
+                },
+                stream=httpx.ByteStream(encoded),
+            )
+
+        response = await self._proxy_with(RawTransport(upstream))
+
+        self.assertEqual(response.body, encoded)
+        self.assertEqual(response.headers["content-encoding"], "gzip")
+        self.assertEqual(response.headers["content-length"], str(len(encoded)))
+
+    async def test_large_responses_are_streamed_not_shared(self) -> None:
+        calls = []
+        stream = ChunkedStream(b"a" * 32, b"b" * 32, b"c" * 32)
+
+        def upstream(request: httpx.Request) -> httpx.Response:
+            calls.append(request)
+            return httpx.Response(200, stream=stream)
+
+        response = await self._proxy_with(RawTransport(upstream))
+
+        self.assertIsInstance(response, StreamingResponse)
+        # The caller streams the bytes already read, then the rest.
+        self.assertEqual(await _play(response), b"a" * 32 + b"b" * 32 + b"c" * 32)
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(stream.closed)
+        self.assertEqual(len(self.proxy_module._inflight), 0)
+
+    async def test_small_bodies_without_a_length_are_shared(self) -> None:
+        self.client._resp = DummyUpstreamResp(
+            b'{"id":1}', 200, {"content-type": "application/json"}
+        )
+
+        responses = await self._gather(*(_make_request(headers=[]) for _ in range(3)))
+
+        self.assertEqual(self.client.calls, 1)
+        self.assertEqual([r.body for r in responses], [b'{"id":1}'] * 3)
+
+    async def test_followers_of_an_oversized_body_send_their_own(self) -> None:
+        self.client._resp = DummyUpstreamResp(b"x" * 64, 200, {})
+
+        responses = await self._gather(*(_make_request(headers=[]) for _ in range(3)))
+
+        self.assertEqual(self.client.calls, 3)
+        self.assertTrue(
+            all(isinstance(r, StreamingResponse) for r in responses), responses
+        )
+
+    async def test_oversized_body_is_closed_when_its_caller_left(self) -> None:
+        resp = DummyUpstreamResp(b"x" * 64, 200, {})
+        self.client._resp = resp
+        leader = asyncio.ensure_future(
+            self.proxy_module.proxy_all(
+                "categories/MLA1", _make_request(headers=[]), _settings(coalesce=True)
+            )
+        )
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await leader
+        self.client.release.set()
+        while len(self.proxy_module._inflight):
+            await asyncio.sleep(0)
+
+        self.assertTrue(resp.closed)
+
+    async def test_unsafe_methods_are_not_coalesced(self) -> None:
+        await self._gather(
+            _make_request(headers=[], body=b"{}"), _make_request(headers=[], body=b"{}")
+        )
+
+        self.assertEqual(self.client.calls, 2)
+
+
+class CountingClient(DummyClient):
+    def __init__(self, response: DummyUpstreamResp) -> None:
+        super().__init__(response)
+        self.calls = 0
+
+    async def send(
+        self, request: SimpleNamespace, stream: bool = False
+    ) -> DummyUpstreamResp:
+        self.calls += 1
+        return self._resp
+
+
+class TestProxyMicroCache(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        from app.presentation import proxy as proxy_module
+
+        self.proxy_module = proxy_module
+        self.now = 1000.0
+        self.monkeypatch = MonkeyPatch()
+        self.monkeypatch.setattr(proxy_module.time, "monotonic", lambda: self.now)
+        proxy_module._ResponseCacheSingleton.set_cache(None)
+
+    async def asyncTearDown(self) -> None:
+        self.proxy_module._ProxyAsyncClientSingleton.set_client(None)
+        self.proxy_module._ResponseCacheSingleton.set_cache(None)
+        self.monkeypatch.undo()
+
+    def _use(self, headers: dict[str, str]) -> CountingClient:
+        client = CountingClient(DummyUpstreamResp(b'{"v":1}', 200, headers))
+        self.proxy_module._ProxyAsyncClientSingleton.set_client(client)
+        return client
+
+    async def _get(self, rule: CacheRule) -> Response:
+        return await self.proxy_module.proxy_all(
+            "proxy/test",
+            _make_request(headers=[]),
+            _settings(cache_rules={"/proxy/": rule}),
+        )
+
+    async def test_second_request_is_a_hit(self) -> None:
+        client = self._use({"content-type": "application/json"})
+
+        first = await self._get(CacheRule(60))
+        second = await self._get(CacheRule(60))
+
+        self.assertEqual(client.calls, 1)
+        self.assertEqual(first.headers["x-cache"], "MISS")
+        self.assertEqual(second.headers["x-cache"], "HIT")
+        self.assertEqual(second.body, b'{"v":1}')
+
+    async def test_stale_entry_is_served_while_refreshing(self) -> None:
+        client = self._use({"cache-control": "max-age=10"})
+        await self._get(CacheRule(60, 30))
+        self.now += 15
+
+        stale = await self._get(CacheRule(60, 30))
+        await asyncio.gather(*self.proxy_module._background)
+        refreshed = await self._get(CacheRule(60, 30))
+
+        self.assertEqual(stale.headers["x-cache"], "STALE")
+        self.assertEqual(refreshed.headers["x-cache"], "HIT")
+        self.assertEqual(client.calls, 2)
+
+    async def test_no_store_responses_are_not_cached(self) -> None:
+        client = self._use({"cache-control": "no-store"})
+
+        await self._get(CacheRule(60))
+        second = await self._get(CacheRule(60))
+
+        self.assertEqual(client.calls, 2)
+        self.assertEqual(second.headers["x-cache"], "MISS")
+
+    async def _get_from(self, transport: httpx.AsyncBaseTransport) -> Response:
+        client = httpx.AsyncClient(transport=transport)
+        self.addAsyncCleanup(client.aclose)
+        self.proxy_module._ProxyAsyncClientSingleton.set_client(client)
+        return await self._get(CacheRule(60))
+
+    async def test_caches_the_encoded_body_as_upstream_sent_it(self) -> None:
+        encoded = gzip.compress(b'{"v":1}' * 20)
+        headers = {"content-encoding": "gzip", "content-length": str(len(encoded))}
+
+        def upstream(request: httpx.Request) -> httpx.Response:
+            return httpx.Response(
+                200, headers=headers, stream=httpx.ByteStream(encoded)
+            )
+
+        transport = RawTransport(upstream)
+        miss = await self._get_from(transport)
+        hit = await self._get_from(transport)
+
+        for response in (miss, hit):
+            self.assertEqual(response.body, encoded)
+            self.assertEqual(response.headers["content-encoding"], "gzip")
+            self.assertEqual(response.headers["content-length"], str(len(encoded)))
+        self.assertEqual(hit.headers["x-cache"], "HIT")
+        cache = self.proxy_module._ResponseCacheSingleton.get_cache(1024)
+        self.assertEqual(
+            cache.size_bytes,
+            len(encoded) + sum(len(k) + len(v) for k, v in headers.items()),
+        )
+
+    async def test_bodies_larger_than_the_cache_are_streamed(self) -> None:
+        calls = []
+
+        def upstream(request: httpx.Request) -> httpx.Response:
+            calls.append(request)
+            return httpx.Response(
+                200,
+                headers={"content-length": "2048"},
+                stream=httpx.ByteStream(b"x" * 2048),
+            )
+
+        response = await self._get_from(RawTransport(upstream))
+
+        self.assertIsInstance(response, StreamingResponse)
+        self.assertEqual(await _play(response), b"x" * 2048)
+        self.assertEqual(len(calls), 1)
+        cache = self.proxy_module._ResponseCacheSingleton.get_cache(1024)
+        self.assertEqual(len(cache), 0)
+
+    async def test_chunked_bodies_stop_buffering_at_the_cache_size(self) -> None:
+        stream = ChunkedStream(*(bytes([65 + i]) * 512 for i in range(4)))
+        calls = []
+
+        def upstream(request: httpx.Request) -> httpx.Response:
+            calls.append(request)
+            return httpx.Response(200, stream=stream)
+
+        response = await self._get_from(RawTransport(upstream))
+
+        self.assertIsInstance(response, StreamingResponse)
+        self.assertEqual(response.headers["x-cache"], "MISS")
+        self.assertEqual(await _play(response), b"".join(stream.chunks))
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(stream.closed)
+        cache = self.proxy_module._ResponseCacheSingleton.get_cache(1024)
+        self.assertEqual(len(cache), 0)
+
+
 class TestComposeForwardedFor(unittest.TestCase):
     def test_returns_none_when_client_ip_missing(self) -> None:
         from app.presentation.proxy import _compose_forwarded_for
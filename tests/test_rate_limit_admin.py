@@ -4,6 +4,7 @@ from fastapi.testclient import TestClient
 from pytest import MonkeyPatch
 
 import app.fast_api as fast_api
+from app.core import config
 from app.presentation.api.middlewares import rate_limit as rl
 
 
@@ -61,6 +62,9 @@ class DummyRedis:
     def pipeline(self) -> DummyPipeline:
         return DummyPipeline(self.store)
 
+    async def get(self, key: str) -> bytes | None:
+        return self.store.get(key)
+
     async def ping(self) -> bool:
         return True
 
@@ -74,6 +78,7 @@ class RateLimitAdminRoutesTest(unittest.TestCase):
         self.monkeypatch = MonkeyPatch()
         self.redis = DummyRedis()
         self.monkeypatch.setenv("ADMIN_API_TOKENS", "secret-token")
+        config._set_settings(None)
 
         async def fake_get_redis() -> DummyRedis:
             return self.redis
@@ -81,6 +86,7 @@ class RateLimitAdminRoutesTest(unittest.TestCase):
         # Ensure the limiter uses our fake Redis and does not retain previous state.
         rl._set_rate_limiter(None)
         self.monkeypatch.setattr(rl, "get_redis", fake_get_redis, raising=True)
+        self.monkeypatch.setattr(rl, "get_auto_pipeline", fake_get_redis, raising=True)
 
         limiter = rl.RedisRateLimiter(rl.Settings())  # type: ignore[attr-defined]
         self.monkeypatch.setattr(rl, "get_rate_limiter", lambda: limiter, raising=True)
@@ -92,6 +98,7 @@ class RateLimitAdminRoutesTest(unittest.TestCase):
         self.client.close()
         rl._set_rate_limiter(None)
         self.monkeypatch.undo()
+        config._set_settings(None)
 
     def test_get_returns_defaults(self) -> None:
         resp = self.client.get("/admin/rate-limits", headers=self.headers)
@@ -145,6 +152,35 @@ class RateLimitAdminRoutesTest(unittest.TestCase):
         # Defaults should remain for untouched sections.
         assert data["path"]["/categories/"] == 10000
 
+    def test_put_accepts_approximate_rule_specs(self) -> None:
+        payload = {
+            "ip": {"10.0.0.1": 50},
+            "path": {"/categories/": {"limit": 10000, "mode": "approximate"}},
+            "ip_path": [
+                {
+                    "ip": "10.0.0.1",
+                    "path_prefix": "/items/",
+                    "limit": 5,
+                    "mode": "exact",
+                }
+            ],
+        }
+        resp = self.client.put("/admin/rate-limits", json=payload, headers=self.headers)
+        assert resp.status_code == 200
+        data = resp.json()
+        assert data["path"] == {"/categories/": {"limit": 10000, "mode": "approximate"}}
+        # Default options are not echoed back.
+        assert data["ip_path"] == [
+            {"ip": "10.0.0.1", "path_prefix": "/items/", "limit": 5}
+        ]
+
+        resp = self.client.put(
+            "/admin/rate-limits",
+            json={**payload, "path": {"/categories/": {"limit": 1, "mode": "bogus"}}},
+            headers=self.headers,
+        )
+        assert resp.status_code == 422
+
     def test_patch_requires_at_least_one_section(self) -> None:
         resp = self.client.patch("/admin/rate-limits", json={}, headers=self.headers)
         assert resp.status_code == 400
@@ -170,6 +206,18 @@ class RateLimitAdminRoutesTest(unittest.TestCase):
         assert defaults["ip_path"][0]["path_prefix"] == "/items/"
         assert defaults["updated_at"] is not None
 
+    def test_settings_reload_applies_new_tokens(self) -> None:
+        self.monkeypatch.setenv("ADMIN_API_TOKENS", "secret-token,rotated")
+
+        resp = self.client.post("/admin/settings/reload", headers=self.headers)
+
+        assert resp.status_code == 200
+        assert resp.json()["reloaded_at"] > 0
+        resp_get = self.client.get(
+            "/admin/rate-limits", headers={"X-Admin-Token": "rotated"}
+        )
+        assert resp_get.status_code == 200
+
     def test_missing_token_rejected(self) -> None:
         resp = self.client.get("/admin/rate-limits")
         assert resp.status_code == 401
@@ -185,6 +233,7 @@ class RateLimitAdminAuthDisabledTest(unittest.TestCase):
     def setUp(self) -> None:
         self.monkeypatch = MonkeyPatch()
         self.monkeypatch.delenv("ADMIN_API_TOKENS", raising=False)
+        config._set_settings(None)
         from app.presentation.api.middlewares import rate_limit as rl
 
         rl._set_rate_limiter(None)
@@ -196,6 +245,7 @@ class RateLimitAdminAuthDisabledTest(unittest.TestCase):
 
         rl._set_rate_limiter(None)
         self.monkeypatch.undo()
+        config._set_settings(None)
 
     def test_admin_routes_disabled_without_tokens(self) -> None:
         resp = self.client.get("/admin/rate-limits")
@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import unittest
+from unittest.mock import patch
+
+from app.core import rate_limit_local
+from app.core.rate_limit_local import DenyCache, FallbackLimiter
+from app.core.rate_limit_rules import RateLimitRule
+
+
+class DenyCacheTest(unittest.TestCase):
+    def test_entry_expires_after_ttl(self) -> None:
+        cache = DenyCache(10)
+        with patch.object(rate_limit_local.time, "monotonic", return_value=100.0):
+            cache.add(("rl:ip:1.1.1.1", 1), 5)
+            self.assertAlmostEqual(cache.remaining(("rl:ip:1.1.1.1", 1)) or 0, 5)
+        with patch.object(rate_limit_local.time, "monotonic", return_value=105.0):
+            self.assertIsNone(cache.remaining(("rl:ip:1.1.1.1", 1)))
+        self.assertEqual(len(cache), 0)
+
+    def test_evicts_least_recently_used(self) -> None:
+        cache = DenyCache(2)
+        cache.add("a", 60)
+        cache.add("b", 60)
+        cache.remaining("a")
+        cache.add("c", 60)
+
+        self.assertIsNotNone(cache.remaining("a"))
+        self.assertIsNone(cache.remaining("b"))
+        self.assertIsNotNone(cache.remaining("c"))
+
+    def test_disabled_cache_stores_nothing(self) -> None:
+        cache = DenyCache(0)
+        cache.add("a", 60)
+
+        self.assertFalse(cache.enabled)
+        self.assertIsNone(cache.remaining("a"))
+
+
+class FallbackLimiterTest(unittest.TestCase):
+    def test_enforces_per_instance_share(self) -> None:
+        limiter = FallbackLimiter(instances=3)
+        ip_path = RateLimitRule.build("ippath", "1.1.1.1:/items/", 10)
+        ip = RateLimitRule.build("ip", "1.1.1.1", 7)
+
+        results = [limiter.hit([ip_path, ip], 1) for _ in range(3)]
+
+        self.assertEqual(results, [(None, 2), (None, 1), (ip, 0)])
+
+    def test_share_is_never_zero(self) -> None:
+        self.assertEqual(FallbackLimiter(instances=10).share(3), 1)
+
+    def test_new_window_resets_counts(self) -> None:
+        limiter = FallbackLimiter(instances=1)
+        rule = RateLimitRule.build("ip", "1.1.1.1", 1)
+        limiter.hit([rule], 1)
+
+        self.assertEqual(limiter.hit([rule], 1), (rule, 0))
+        self.assertEqual(limiter.hit([rule], 2), (None, 0))
+        self.assertEqual(len(limiter), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import unittest
+
+from fastapi.testclient import TestClient
+from pytest import MonkeyPatch
+from starlette.responses import PlainTextResponse
+from starlette.types import Receive, Scope, Send
+
+from app.core.rate_limit_rules import RateLimitRule
+from app.presentation.api.middlewares import rate_limit as rl
+
+
+class StubLimiter:
+    def __init__(self, allowed: bool, rule: RateLimitRule | None) -> None:
+        self.allowed = allowed
+        self.rule = rule
+        self.calls: list[tuple[str, str]] = []
+
+    async def check_and_increment(
+        self, client_ip: str, path: str
+    ) -> tuple[bool, RateLimitRule | None, int, int]:
+        self.calls.append((client_ip, path))
+        return self.allowed, self.rule, 0 if not self.allowed else 4, 42
+
+
+async def downstream(scope: Scope, receive: Receive, send: Send) -> None:
+    response = PlainTextResponse("ok", headers={"X-RateLimit-Limit": "upstream"})
+    await response(scope, receive, send)
+
+
+class RateLimitMiddlewareTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.monkeypatch = MonkeyPatch()
+        self.client = TestClient(rl.RateLimitMiddleware(downstream))
+        self.rule = RateLimitRule.build("ippath", "1.1.1.1:/items/", 10)
+
+    def tearDown(self) -> None:
+        self.client.close()
+        self.monkeypatch.undo()
+
+    def _use(self, limiter: StubLimiter) -> None:
+        self.monkeypatch.setattr(rl, "get_rate_limiter", lambda: limiter, raising=True)
+
+    def test_blocked_request_gets_pre_encoded_429(self) -> None:
+        limiter = StubLimiter(False, self.rule)
+        self._use(limiter)
+
+        resp = self.client.get(
+            "/items/MLA1", headers={"X-Forwarded-For": "1.1.1.1, 10.0.0.1"}
+        )
+
+        self.assertEqual(resp.status_code, 429)
+        self.assertEqual(
+            resp.json(),
+            {
+                "error": "RATE_LIMIT_EXCEEDED",
+                "message": "Too many requests",
+                "details": {
+                    "scope": "ippath",
+                    "identifier": "1.1.1.1:/items/",
+                    "reset_in": 42,
+                },
+            },
+        )
+        self.assertEqual(resp.headers["retry-after"], "42")
+        self.assertEqual(resp.headers["x-ratelimit-reset"], "42")
+        self.assertEqual(resp.headers["x-ratelimit-limit"], "10")
+        self.assertEqual(resp.headers["x-ratelimit-remaining"], "0")
+        self.assertEqual(limiter.calls, [("1.1.1.1", "/items/MLA1")])
+
+    def test_allowed_request_gets_rate_limit_headers(self) -> None:
+        self._use(StubLimiter(True, self.rule))
+
+        resp = self.client.get("/items/MLA1")
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.text, "ok")
+        self.assertEqual(resp.headers.get_list("x-ratelimit-limit"), ["10"])
+        self.assertEqual(resp.headers["x-ratelimit-remaining"], "4")
+        self.assertEqual(resp.headers["x-ratelimit-reset"], "42")
+
+    def test_unmatched_request_passes_through(self) -> None:
+        limiter = StubLimiter(True, None)
+        self._use(limiter)
+
+        resp = self.client.get("/sites")
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.headers["x-ratelimit-limit"], "upstream")
+        self.assertEqual(limiter.calls, [("testclient", "/sites")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import unittest
+
+from app.core.rate_limit_rules import (
+    PrefixIndex,
+    RateLimitRule,
+    compile_rules,
+    normalize_rule_value,
+)
+
+
+class RuleIndexTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.index = compile_rules(
+            {"1.1.1.1": 100},
+            {"/items/": 50, "/items/MLA": 20, "/categories/": 10},
+            [
+                {"ip": "1.1.1.1", "path_prefix": "/items/", "limit": 2},
+                {"ip": "2.2.2.2", "path_prefix": "/items/", "limit": 3},
+            ],
+        )
+
+    def test_match_orders_most_specific_first(self) -> None:
+        matched = self.index.match("1.1.1.1", "/items/MLA123")
+
+        self.assertEqual(
+            [(rule.scope, rule.ident, rule.limit) for rule in matched],
+            [
+                ("ippath", "1.1.1.1:/items/", 2),
+                ("path", "/items/MLA", 20),
+                ("path", "/items/", 50),
+                ("ip", "1.1.1.1", 100),
+            ],
+        )
+
+    def test_ip_path_rules_are_bucketed_by_ip(self) -> None:
+        matched = self.index.match("3.3.3.3", "/items/MLA123")
+
+        self.assertEqual([rule.scope for rule in matched], ["path", "path"])
+
+    def test_no_match_returns_empty(self) -> None:
+        self.assertEqual(self.index.match("9.9.9.9", "/sites/MLA"), [])
+
+    def test_prefix_longer_than_path_is_skipped(self) -> None:
+        index = PrefixIndex({"/items/": RateLimitRule.build("path", "/items/", 1)})
+        out: list[RateLimitRule] = []
+
+        index.match("/it", out)
+
+        self.assertEqual(out, [])
+
+    def test_invalid_ip_path_entries_are_dropped(self) -> None:
+        index = compile_rules(
+            {},
+            {},
+            [
+                {"ip": "", "path_prefix": "/items/", "limit": 1},
+                {"ip": "1.1.1.1", "path_prefix": "", "limit": 1},
+                {"ip": "1.1.1.1", "path_prefix": "/items/", "limit": 0},
+            ],
+        )
+
+        self.assertEqual(index.match("1.1.1.1", "/items/x"), [])
+
+    def test_rule_key_prefix(self) -> None:
+        rule = RateLimitRule.build("path", "/categories/", 10)
+
+        self.assertEqual(rule.key_prefix, "rl:path:/categories/")
+
+    def test_hashtag_scheme_tags_client_and_path_keys(self) -> None:
+        index = compile_rules(
+            {"1.1.1.1": 100},
+            {"/items/": 50},
+            [{"ip": "1.1.1.1", "path_prefix": "/items/", "limit": 2}],
+            key_scheme="hashtag",
+        )
+
+        self.assertEqual(
+            [rule.key_prefix for rule in index.match("1.1.1.1", "/items/x")],
+            [
+                "rl:{1.1.1.1}:ippath:1.1.1.1:/items/",
+                "rl:{path:/items/}:path:/items/",
+                "rl:{1.1.1.1}:ip:1.1.1.1",
+            ],
+        )
+
+    def test_sharded_rule_keys(self) -> None:
+        plain = RateLimitRule.from_value("path", "/c/", {"limit": 9, "shards": 4})
+        tagged = RateLimitRule.from_value(
+            "path", "/c/", {"limit": 9, "shards": 4}, tag="path:/c/"
+        )
+        approx = RateLimitRule.from_value(
+            "path", "/c/", {"limit": 9, "mode": "approximate", "shards": 4}
+        )
+
+        self.assertEqual(plain.shard_prefix(3), "rl:path:/c/#3")
+        self.assertEqual(tagged.shard_prefix(3), "rl:{path:/c/#3}:path:/c/")
+        self.assertEqual(approx.shards, 1)
+
+    def test_default_algorithm_and_per_rule_override(self) -> None:
+        index = compile_rules(
+            {"1.1.1.1": {"limit": 5, "algorithm": "fixed"}},
+            {
+                "/items/": 50,
+                "/items/MLA": {"limit": 20, "mode": "approximate"},
+            },
+            [],
+            algorithm="sliding",
+        )
+
+        self.assertEqual(
+            [rule.algorithm for rule in index.match("1.1.1.1", "/items/MLA1")],
+            ["fixed", "sliding", "fixed"],
+        )
+
+    def test_gcra_burst_defaults_to_a_whole_window(self) -> None:
+        default = RateLimitRule.from_value("ip", "1.1.1.1", 10, algorithm="gcra")
+        explicit = RateLimitRule.from_value(
+            "ip", "1.1.1.1", {"limit": 10, "algorithm": "gcra", "burst": 0}
+        )
+
+        self.assertEqual(default.burst, 9)
+        self.assertEqual(explicit.burst, 0)
+        # An explicit zero survives normalization instead of reading as unset.
+        self.assertEqual(
+            normalize_rule_value({"limit": 10, "burst": 0}), {"limit": 10, "burst": 0}
+        )
+        self.assertEqual(normalize_rule_value({"limit": 10}), 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
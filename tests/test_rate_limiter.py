@@ -0,0 +1,1075 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import json
+import math
+import unittest
+from typing import Any, AsyncIterator
+
+from prometheus_client import REGISTRY
+from pytest import MonkeyPatch
+from redis.exceptions import NoScriptError
+
+from app.core import config
+from app.core.config import Settings
+from app.core.rate_limit_rules import RateLimitRule
+from app.infrastructure import redis_scripts
+from app.presentation.api.middlewares import rate_limit as rl
+
+
+class ScriptRedis:
+    """Minimal Redis double that emulates the rate-limit Lua scripts."""
+
+    def __init__(self) -> None:
+        self.store: dict[str, int] = {}
+        self.ttl: dict[str, int] = {}
+        self.loaded: set[str] = set()
+        self.load_calls = 0
+        self.evalsha_calls: list[tuple[str, list[str], list[Any]]] = []
+        self.now_us = 1_000_000_000
+        self.ttl_ms: dict[str, int] = {}
+
+    def pipeline(self) -> "ScriptRedis._Pipe":
+        return ScriptRedis._Pipe(self)
+
+    class _Pipe:
+        def __init__(self, owner: "ScriptRedis") -> None:
+            self.owner = owner
+            self.ops: list[tuple[str, str]] = []
+
+        def get(self, key: str) -> None:
+            self.ops.append(("get", key))
+
+        def incr(self, key: str) -> None:
+            self.ops.append(("incr", key))
+
+        def expire(self, key: str, ttl: int) -> None:
+            self.ops.append(("expire", key))
+
+        async def execute(self) -> list:
+            store = self.owner.store
+            results: list[Any] = []
+            for op, key in self.ops:
+                if op == "incr":
+                    store[key] = store.get(key, 0) + 1
+                    results.append(store[key])
+                elif op == "get":
+                    results.append(store.get(key))
+                else:
+                    results.append(True)
+            return results
+
+    async def get(self, key: str) -> Any:
+        return self.store.get(key)
+
+    async def script_load(self, source: str) -> bytes:
+        self.load_calls += 1
+        sha = {
+            redis_scripts.APPROX_FLUSH_LUA: "sha-approx",
+            redis_scripts.QUOTA_LEASE_LUA: "sha-lease",
+            redis_scripts.QUOTA_RELEASE_LUA: "sha-release",
+            redis_scripts.SLIDING_WINDOW_LUA: "sha-sliding",
+            redis_scripts.GCRA_LUA: "sha-gcra",
+        }.get(source, "sha-fixed")
+        self.loaded.add(sha)
+        return sha.encode()
+
+    async def evalsha(self, sha: str, numkeys: int, *keys_and_args: Any) -> Any:
+        if sha not in self.loaded:
+            raise NoScriptError("NOSCRIPT")
+        keys = [str(k) for k in keys_and_args[:numkeys]]
+        args = list(keys_and_args[numkeys:])
+        self.evalsha_calls.append((sha, keys, args))
+        if sha == "sha-approx":
+            return self._approx_flush(keys[0], int(args[0]), int(args[1]))
+        if sha == "sha-lease":
+            return self._lease(keys[0], int(args[0]), float(args[1]))
+        if sha == "sha-gcra":
+            return self._gcra(keys, [int(arg) for arg in args])
+        if sha == "sha-sliding":
+            return self._sliding_window(keys, args)
+        if sha == "sha-release":
+            if keys[0] in self.store:
+                self.store[keys[0]] -= int(args[0])
+            return self.store.get(keys[0], 0)
+        return self._fixed_window(keys, args)
+
+    def _sliding_window(self, keys: list[str], args: list[Any]) -> list:
+        previous: list[int] = []
+        for i in range(len(keys) // 2):
+            current = self.store.get(keys[2 * i], 0)
+            weight = float(args[3 * i + 1])
+            previous.append(self.store.get(keys[2 * i + 1], 0) if weight > 0 else 0)
+            if math.floor(previous[i] * weight) + current >= int(args[3 * i]):
+                return [0, i + 1, current, previous[i]]
+        first = 0
+        for i in range(len(keys) // 2):
+            key = keys[2 * i]
+            self.store[key] = self.store.get(key, 0) + 1
+            if self.store[key] == 1:
+                self.ttl[key] = int(args[3 * i + 2])
+            if i == 0:
+                first = self.store[key]
+        return [1, 1, first, previous[0]]
+
+    def _gcra(self, keys: list[str], args: list[int]) -> list[int]:
+        now = self.now_us
+        tats: list[int] = []
+        for i, key in enumerate(keys):
+            interval, capacity = args[2 * i], args[2 * i] + args[2 * i + 1]
+            tat = max(self.store.get(key, 0), now)
+            if tat + interval - now > capacity:
+                return [0, i + 1, 0, tat + interval - capacity - now, tat - now]
+            tats.append(tat + interval)
+        for key, tat in zip(keys, tats):
+            self.store[key] = tat
+            self.ttl_ms[key] = math.ceil((tat - now) / 1000)
+        headroom = args[0] + args[1] - (tats[0] - now)
+        return [1, 1, headroom // args[0], 0, tats[0] - now]
+
+    def _lease(self, key: str, limit: int, share: float) -> list[int]:
+        available = limit - self.store.get(key, 0)
+        if available <= 0:
+            return [0, limit - available]
+        grant = min(available, math.ceil(available * share))
+        self.store[key] = self.store.get(key, 0) + grant
+        return [grant, self.store[key]]
+
+    def _approx_flush(self, key: str, delta: int, ttl: int) -> int:
+        self.store[key] = self.store.get(key, 0) + delta
+        if self.store[key] == delta:
+            self.ttl[key] = ttl
+        return self.store[key]
+
+    def _fixed_window(self, keys: list[str], args: list[Any]) -> list:
+        ttl = int(args[0])
+        for i, key in enumerate(keys):
+            if self.store.get(key, 0) >= int(args[i + 1]):
+                return [0, i + 1, 0, self.ttl.get(key, -2)]
+        remaining, reset = 0, ttl
+        for i, key in enumerate(keys):
+            self.store[key] = self.store.get(key, 0) + 1
+            if self.store[key] == 1:
+                self.ttl[key] = ttl
+            if i == 0:
+                remaining = int(args[1]) - self.store[key]
+                reset = self.ttl[key]
+        return [1, 1, remaining, reset]
+
+
+class RedisRateLimiterScriptTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.monkeypatch = MonkeyPatch()
+        self.redis = ScriptRedis()
+
+        async def fake_get_redis() -> ScriptRedis:
+            return self.redis
+
+        self.monkeypatch.setattr(rl, "get_redis", fake_get_redis, raising=True)
+        self.monkeypatch.setattr(rl, "get_auto_pipeline", fake_get_redis, raising=True)
+        self.monkeypatch.setattr(
+            redis_scripts.FIXED_WINDOW_SCRIPT, "sha", None, raising=True
+        )
+        self.limiter = rl.RedisRateLimiter(Settings())
+        self.limiter._last_refresh = float("inf")
+        self.limiter._replace_rules(
+            {"1.1.1.1": 100},
+            {"/items/": 50},
+            [{"ip": "1.1.1.1", "path_prefix": "/items/", "limit": 2}],
+        )
+
+    async def asyncTearDown(self) -> None:
+        self.monkeypatch.undo()
+
+    async def test_single_evalsha_with_most_specific_key_first(self) -> None:
+        allowed, rule, remaining, reset_in = await self.limiter.check_and_increment(
+            "1.1.1.1", "/items/MLA1"
+        )
+
+        self.assertTrue(allowed)
+        self.assertEqual(rule, RateLimitRule.build("ippath", "1.1.1.1:/items/", 2))
+        self.assertEqual(remaining, 1)
+        self.assertGreaterEqual(reset_in, 1)
+        self.assertEqual(self.redis.load_calls, 1)
+        _, keys, args = self.redis.evalsha_calls[0]
+        self.assertTrue(keys[0].startswith("rl:ippath:1.1.1.1:/items/:"))
+        self.assertTrue(keys[1].startswith("rl:path:/items/:"))
+        self.assertTrue(keys[2].startswith("rl:ip:1.1.1.1:"))
+        self.assertEqual(args[1:], [2, 50, 100])
+
+    async def test_warm_up_loads_scripts_and_rules(self) -> None:
+        for script in redis_scripts.ALL_SCRIPTS:
+            self.monkeypatch.setattr(script, "sha", None)
+        self.limiter._last_refresh = 0.0
+
+        await self.limiter.warm_up()
+
+        self.assertEqual(self.redis.load_calls, len(redis_scripts.ALL_SCRIPTS))
+        self.assertTrue(all(s.sha for s in redis_scripts.ALL_SCRIPTS))
+        self.assertGreater(self.limiter._last_refresh, 0.0)
+        await self.limiter.check_and_increment("1.1.1.1", "/items/MLA1")
+        self.assertEqual(self.redis.load_calls, len(redis_scripts.ALL_SCRIPTS))
+
+    async def test_times_rules_redis_round_trip_and_total(self) -> None:
+        def count(phase: str) -> float:
+            value = REGISTRY.get_sample_value(
+                "meli_proxy_rate_limit_phase_seconds_count", {"phase": phase}
+            )
+            return value or 0.0
+
+        before = {phase: count(phase) for phase in ("rules", "redis", "total")}
+        self.limiter._last_refresh = 0.0
+
+        await self.limiter.check_and_increment("1.1.1.1", "/items/MLA1")
+        # No matching rule: the counters are never touched.
+        await self.limiter.check_and_increment("2.2.2.2", "/other")
+        await asyncio.gather(*self.limiter._background)
+
+        # One background reload, shared by both requests.
+        self.assertEqual(count("rules") - before["rules"], 1)
+        self.assertEqual(count("redis") - before["redis"], 1)
+        self.assertEqual(count("total") - before["total"], 2)
+
+    async def test_denied_request_does_not_increment_counters(self) -> None:
+        for _ in range(2):
+            await self.limiter.check_and_increment("1.1.1.1", "/items/MLA1")
+        before = dict(self.redis.store)
+
+        allowed, rule, remaining, _ = await self.limiter.check_and_increment(
+            "1.1.1.1", "/items/MLA1"
+        )
+
+        self.assertFalse(allowed)
+        self.assertEqual(rule, RateLimitRule.build("ippath", "1.1.1.1:/items/", 2))
+        self.assertEqual(remaining, 0)
+        self.assertEqual(self.redis.store, before)
+        self.assertEqual(self.redis.load_calls, 1)
+
+    async def test_blocked_key_is_answered_from_deny_cache(self) -> None:
+        for _ in range(3):
+            await self.limiter.check_and_increment("1.1.1.1", "/items/MLA1")
+        calls = len(self.redis.evalsha_calls)
+
+        allowed, rule, remaining, reset_in = await self.limiter.check_and_increment(
+            "1.1.1.1", "/items/MLA2"
+        )
+
+        self.assertFalse(allowed)
+        self.assertEqual(rule, RateLimitRule.build("ippath", "1.1.1.1:/items/", 2))
+        self.assertEqual(remaining, 0)
+        self.assertGreaterEqual(reset_in, 1)
+        self.assertEqual(len(self.redis.evalsha_calls), calls)
+
+        # New limits invalidate cached denials.
+        self.limiter._replace_rules({}, {}, [])
+        self.assertEqual(len(self.limiter._deny_cache), 0)
+
+    async def test_reloads_script_after_noscript(self) -> None:
+        await self.limiter.check_and_increment("1.1.1.1", "/items/MLA1")
+        self.redis.loaded.clear()
+
+        allowed, _, _, _ = await self.limiter.check_and_increment(
+            "1.1.1.1", "/items/MLA1"
+        )
+
+        self.assertTrue(allowed)
+        self.assertEqual(self.redis.load_calls, 2)
+
+    async def test_cluster_mode_with_plain_keys_uses_pipeline(self) -> None:
+        limiter = rl.RedisRateLimiter(
+            Settings(REDIS_CLUSTER_NODES="node1:7000", RATE_LIMIT_KEY_SCHEME="plain")
+        )
+
+        self.assertFalse(limiter._use_script)
+
+    async def test_cluster_mode_groups_tagged_keys_by_slot(self) -> None:
+        limiter = rl.RedisRateLimiter(Settings(REDIS_CLUSTER_NODES="node1:7000"))
+        limiter._last_refresh = float("inf")
+        limiter._replace_rules(
+            {"1.1.1.1": 100},
+            {"/items/": 1},
+            [{"ip": "1.1.1.1", "path_prefix": "/items/", "limit": 2}],
+        )
+        self.assertTrue(limiter._use_script)
+
+        await limiter.check_and_increment("1.1.1.1", "/items/MLA1")
+        allowed, rule, _, _ = await limiter.check_and_increment(
+            "1.1.1.1", "/items/MLA1"
+        )
+
+        self.assertFalse(allowed)
+        self.assertEqual(rule.scope if rule else None, "path")
+        client_keys, path_keys = (keys for _, keys, _ in self.redis.evalsha_calls[:2])
+        self.assertEqual(
+            [key.rsplit(":", 1)[0] for key in client_keys],
+            ["rl:{1.1.1.1}:ippath:1.1.1.1:/items/", "rl:{1.1.1.1}:ip:1.1.1.1"],
+        )
+        self.assertEqual(
+            [key.rsplit(":", 1)[0] for key in path_keys],
+            ["rl:{path:/items/}:path:/items/"],
+        )
+
+    async def test_cluster_mode_keeps_each_script_on_one_shard_slot(self) -> None:
+        limiter = rl.RedisRateLimiter(Settings(REDIS_CLUSTER_NODES="node1:7000"))
+        limiter._last_refresh = float("inf")
+        limiter._replace_rules(
+            {"1.1.1.1": {"limit": 100, "shards": 4}},
+            {},
+            [{"ip": "1.1.1.1", "path_prefix": "/items/", "limit": 50, "shards": 4}],
+        )
+        # Consecutive picks differ, so the two rules land on different shards.
+        picks = itertools.cycle(range(4))
+        self.monkeypatch.setattr(
+            rl.random, "randrange", lambda stop: next(picks) % stop, raising=True
+        )
+
+        for _ in range(4):
+            allowed, _, _, _ = await limiter.check_and_increment(
+                "1.1.1.1", "/items/MLA1"
+            )
+            self.assertTrue(allowed)
+
+        self.assertEqual(len(self.redis.evalsha_calls), 8)
+        for _, keys, _ in self.redis.evalsha_calls:
+            self.assertEqual(len({key.split("}")[0] for key in keys}), 1, keys)
+
+    async def test_standalone_sends_one_script_for_tagged_keys(self) -> None:
+        limiter = rl.RedisRateLimiter(Settings(RATE_LIMIT_KEY_SCHEME="hashtag"))
+        limiter._last_refresh = float("inf")
+        limiter._replace_rules({"1.1.1.1": 100}, {"/items/": 50}, [])
+
+        await limiter.check_and_increment("1.1.1.1", "/items/MLA1")
+
+        self.assertEqual(len(self.redis.evalsha_calls), 1)
+
+
+class RedisRateLimiterApproximateTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.monkeypatch = MonkeyPatch()
+        self.redis = ScriptRedis()
+
+        async def fake_get_redis() -> ScriptRedis:
+            return self.redis
+
+        self.monkeypatch.setattr(rl, "get_redis", fake_get_redis, raising=True)
+        self.monkeypatch.setattr(rl, "get_auto_pipeline", fake_get_redis, raising=True)
+        for script in (
+            redis_scripts.FIXED_WINDOW_SCRIPT,
+            redis_scripts.APPROX_FLUSH_SCRIPT,
+        ):
+            self.monkeypatch.setattr(script, "sha", None, raising=True)
+        # Flush on hit count only, 10 % error -> every 10 hits for a limit of 100.
+        self.limiter = rl.RedisRateLimiter(
+            Settings(RATE_LIMIT_APPROX_FLUSH_MS=3_600_000, RATE_LIMIT_APPROX_ERROR=0.1)
+        )
+        self.limiter._last_refresh = float("inf")
+        self.limiter._replace_rules(
+            {}, {"/categories/": {"limit": 100, "mode": "approximate"}}, []
+        )
+
+    async def asyncTearDown(self) -> None:
+        self.monkeypatch.undo()
+
+    async def _hit(self, times: int) -> rl.RateLimitDecision:
+        decision: rl.RateLimitDecision = (True, None, 0, 0)
+        for _ in range(times):
+            decision = await self.limiter.check_and_increment("1.1.1.1", "/categories/")
+            # Let spawned flushes run.
+            await asyncio.sleep(0)
+        return decision
+
+    def _global_count(self) -> int:
+        return sum(
+            count
+            for key, count in self.redis.store.items()
+            if key.startswith("rl:path:")
+        )
+
+    async def test_counts_locally_and_flushes_in_batches(self) -> None:
+        allowed, rule, remaining, _ = await self._hit(25)
+
+        self.assertTrue(allowed)
+        self.assertEqual(
+            rule, RateLimitRule.build("path", "/categories/", 100, "approximate")
+        )
+        self.assertEqual(remaining, 75)
+        # First hit flushes immediately to learn the global total, then every 10.
+        self.assertEqual(len(self.redis.evalsha_calls), 3)
+        self.assertEqual(self._global_count(), 21)
+
+    async def test_drain_flushes_pending_hits(self) -> None:
+        await self._hit(25)
+        self.assertEqual(self._global_count(), 21)
+
+        await self.limiter.drain(1.0)
+
+        self.assertEqual(self._global_count(), 25)
+        self.assertEqual(len(self.limiter._background), 0)
+
+    async def test_enforces_using_global_total_from_flush(self) -> None:
+        key = f"rl:path:/categories/:{self.limiter._window_id()}"
+        self.redis.store[key] = 99
+
+        await self._hit(1)
+        allowed, rule, remaining, reset_in = await self._hit(1)
+
+        self.assertFalse(allowed)
+        self.assertEqual(rule.ident if rule else None, "/categories/")
+        self.assertEqual(remaining, 0)
+        self.assertGreaterEqual(reset_in, 1)
+        self.assertEqual(self.redis.store[key], 100)
+
+    async def test_rules_replaced_during_exact_check_keep_counter(self) -> None:
+        rules = {"/categories/": {"limit": 100, "mode": "approximate"}}
+        self.limiter._replace_rules({"1.1.1.1": 2}, rules, [])
+        check_exact = self.limiter._check_exact
+
+        async def replacing_check_exact(*args: Any) -> rl.RateLimitDecision:
+            decision = await check_exact(*args)
+            # A config event lands while the request waits on Redis.
+            self.limiter._replace_rules({"1.1.1.1": 2}, rules, [])
+            return decision
+
+        self.monkeypatch.setattr(self.limiter, "_check_exact", replacing_check_exact)
+
+        allowed, rule, remaining, _ = await self.limiter.check_and_increment(
+            "1.1.1.1", "/categories/"
+        )
+
+        self.assertTrue(allowed)
+        self.assertEqual(rule.ident if rule else None, "/categories/")
+        self.assertEqual(remaining, 99)
+        # Decided with Redis, not by the failure policy.
+        self.assertEqual(self.limiter._breaker.failures, 0)
+
+    async def test_exact_rules_are_still_checked_per_request(self) -> None:
+        self.limiter._replace_rules(
+            {"1.1.1.1": 2}, {"/categories/": {"limit": 100, "mode": "approximate"}}, []
+        )
+
+        first = await self._hit(2)
+        third = await self._hit(1)
+
+        self.assertTrue(first[0])
+        self.assertEqual(
+            first[1], RateLimitRule.build("path", "/categories/", 100, "approximate")
+        )
+        self.assertFalse(third[0])
+        self.assertEqual(third[1], RateLimitRule.build("ip", "1.1.1.1", 2))
+        fixed_calls = [c for c in self.redis.evalsha_calls if c[0] == "sha-fixed"]
+        self.assertEqual(len(fixed_calls), 3)
+        self.assertEqual(
+            fixed_calls[0][1][0][: len("rl:ip:1.1.1.1:")], "rl:ip:1.1.1.1:"
+        )
+
+
+class RedisRateLimiterShardedTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.monkeypatch = MonkeyPatch()
+        self.redis = ScriptRedis()
+
+        async def fake_get_redis() -> ScriptRedis:
+            return self.redis
+
+        self.monkeypatch.setattr(rl, "get_redis", fake_get_redis, raising=True)
+        self.monkeypatch.setattr(rl, "get_auto_pipeline", fake_get_redis, raising=True)
+        self.monkeypatch.setattr(
+            redis_scripts.FIXED_WINDOW_SCRIPT, "sha", None, raising=True
+        )
+        self.limiter = rl.RedisRateLimiter(Settings())
+        self.limiter._last_refresh = float("inf")
+        self.limiter._replace_rules(
+            {"1.1.1.1": 100}, {"/categories/": {"limit": 10, "shards": 4}}, []
+        )
+
+    async def asyncTearDown(self) -> None:
+        self.monkeypatch.undo()
+
+    def _shard_counts(self) -> dict[str, int]:
+        return {
+            key.split(":")[2]: count
+            for key, count in self.redis.store.items()
+            if key.startswith("rl:path:")
+        }
+
+    async def test_spreads_hits_and_enforces_summed_limit(self) -> None:
+        decisions = []
+        for _ in range(12):
+            decisions.append(
+                await self.limiter.check_and_increment("1.1.1.1", "/categories/x")
+            )
+            await asyncio.sleep(0)
+
+        self.assertEqual([d[0] for d in decisions], [True] * 10 + [False] * 2)
+        self.assertEqual(decisions[-1][1].scope if decisions[-1][1] else None, "path")
+        counts = self._shard_counts()
+        self.assertGreater(len(counts), 1)
+        self.assertTrue(set(counts) <= {f"/categories/#{i}" for i in range(4)})
+        self.assertEqual(sum(counts.values()), 10)
+        # The ip counter still shares the single EVALSHA with the shard key.
+        self.assertEqual(len(self.redis.evalsha_calls), 10)
+
+    async def test_worker_pick_uses_one_shard(self) -> None:
+        self.limiter.apply_settings(Settings(RATE_LIMIT_SHARD_PICK="worker"))
+        self.limiter._last_refresh = float("inf")
+
+        for _ in range(3):
+            await self.limiter.check_and_increment("1.1.1.1", "/categories/x")
+
+        self.assertEqual(len(self._shard_counts()), 1)
+
+
+class RedisRateLimiterSlidingWindowTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.monkeypatch = MonkeyPatch()
+        self.redis = ScriptRedis()
+
+        async def fake_get_redis() -> ScriptRedis:
+            return self.redis
+
+        self.monkeypatch.setattr(rl, "get_redis", fake_get_redis, raising=True)
+        self.monkeypatch.setattr(rl, "get_auto_pipeline", fake_get_redis, raising=True)
+        for script in (
+            redis_scripts.FIXED_WINDOW_SCRIPT,
+            redis_scripts.SLIDING_WINDOW_SCRIPT,
+        ):
+            self.monkeypatch.setattr(script, "sha", None, raising=True)
+
+    async def asyncTearDown(self) -> None:
+        self.monkeypatch.undo()
+
+    def _limiter(self, **overrides: Any) -> rl.RedisRateLimiter:
+        limiter = rl.RedisRateLimiter(Settings(**overrides))
+        limiter._last_refresh = float("inf")
+        limiter._replace_rules(
+            {"1.1.1.1": 100}, {"/items/": {"limit": 10, "algorithm": "sliding"}}, []
+        )
+        # Half of the previous window still counts.
+        self.monkeypatch.setattr(limiter, "_sliding_weight", lambda window_id: 0.5)
+        self.window = limiter._window_id()
+        self.redis.store[f"rl:path:/items/:{self.window - 1}"] = 8
+        return limiter
+
+    async def _allowed(self, limiter: rl.RedisRateLimiter, times: int) -> list[bool]:
+        return [
+            (await limiter.check_and_increment("1.1.1.1", "/items/x"))[0]
+            for _ in range(times)
+        ]
+
+    async def test_weights_previous_window_in_one_script_call(self) -> None:
+        limiter = self._limiter()
+
+        allowed = await self._allowed(limiter, 7)
+
+        self.assertEqual(allowed, [True] * 6 + [False])
+        self.assertEqual(self.redis.store[f"rl:path:/items/:{self.window}"], 6)
+        self.assertEqual(len(self.redis.evalsha_calls), 7)
+        _, keys, args = self.redis.evalsha_calls[0]
+        self.assertEqual(len(keys), 4)
+        self.assertEqual(args[1], 0.5)
+        # The fixed ip rule ignores its previous window.
+        self.assertEqual(args[4], 0)
+
+    async def test_pipeline_applies_same_weighting(self) -> None:
+        limiter = self._limiter(RATE_LIMIT_USE_SCRIPT=False)
+
+        allowed = await self._allowed(limiter, 7)
+
+        self.assertEqual(allowed, [True] * 6 + [False])
+        self.assertEqual(self.redis.evalsha_calls, [])
+
+    def test_retry_after_follows_the_decaying_previous_window(self) -> None:
+        retry_after = rl.RedisRateLimiter._sliding_retry_after
+
+        self.assertEqual(retry_after(10, 4, 12, 0.75), 15)
+        self.assertEqual(retry_after(10, 10, 0, 0.5), 30)
+        self.assertEqual(retry_after(10, 20, 0, 0.5), 60)
+
+
+class RedisRateLimiterGCRATest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.monkeypatch = MonkeyPatch()
+        self.redis = ScriptRedis()
+
+        async def fake_get_redis() -> ScriptRedis:
+            return self.redis
+
+        self.monkeypatch.setattr(rl, "get_redis", fake_get_redis, raising=True)
+        self.monkeypatch.setattr(rl, "get_auto_pipeline", fake_get_redis, raising=True)
+        for script in (redis_scripts.FIXED_WINDOW_SCRIPT, redis_scripts.GCRA_SCRIPT):
+            self.monkeypatch.setattr(script, "sha", None, raising=True)
+        self.limiter = rl.RedisRateLimiter(
+            Settings(RATE_LIMIT_ALGORITHM="gcra", RATE_LIMIT_DENY_CACHE_SIZE=0)
+        )
+        self.limiter._last_refresh = float("inf")
+        # One request per second with a burst of two on top.
+        self.limiter._replace_rules({"1.1.1.1": {"limit": 60, "burst": 2}}, {}, [])
+
+    async def asyncTearDown(self) -> None:
+        self.monkeypatch.undo()
+
+    async def _check(self) -> rl.RateLimitDecision:
+        return await self.limiter.check_and_increment("1.1.1.1", "/items/x")
+
+    async def test_burst_then_steady_rate_with_one_key(self) -> None:
+        decisions = [await self._check() for _ in range(4)]
+
+        self.assertEqual([d[0] for d in decisions], [True, True, True, False])
+        self.assertEqual([d[2] for d in decisions], [2, 1, 0, 0])
+        # Retry-After is the time to the next free cell, not the minute end.
+        self.assertEqual(decisions[3][3], 1)
+        self.assertEqual(decisions[2][3], 3)
+        self.assertEqual(list(self.redis.store), ["rl:ip:1.1.1.1:gcra_us"])
+        self.assertEqual(self.redis.ttl_ms["rl:ip:1.1.1.1:gcra_us"], 3000)
+
+        self.redis.now_us += 1_000_000
+        self.assertTrue((await self._check())[0])
+
+    async def test_default_burst_admits_the_whole_limit_back_to_back(self) -> None:
+        self.limiter._replace_rules({"1.1.1.1": 5}, {}, [])
+
+        decisions = [await self._check() for _ in range(6)]
+
+        self.assertEqual([d[0] for d in decisions], [True] * 5 + [False])
+        self.assertEqual([d[2] for d in decisions[:5]], [4, 3, 2, 1, 0])
+
+    async def test_limits_above_one_per_millisecond_are_exact(self) -> None:
+        self.limiter._replace_rules({"1.1.1.1": {"limit": 120_000, "burst": 0}}, {}, [])
+
+        decisions = [await self._check() for _ in range(3)]
+        # Half a millisecond later the next cell is free again.
+        self.redis.now_us += 500
+        later = await self._check()
+
+        self.assertEqual([d[0] for d in decisions], [True, False, False])
+        self.assertTrue(later[0])
+        _, _, args = self.redis.evalsha_calls[0]
+        self.assertEqual(args, [500, 0])
+
+    async def test_mixed_with_fixed_window_rule(self) -> None:
+        self.limiter._replace_rules(
+            {"1.1.1.1": {"limit": 60, "burst": 2}},
+            {"/items/": {"limit": 1, "algorithm": "fixed"}},
+            [],
+        )
+
+        first = await self._check()
+        second = await self._check()
+
+        self.assertTrue(first[0])
+        self.assertEqual(first[1].scope if first[1] else None, "path")
+        self.assertFalse(second[0])
+        self.assertEqual(second[1].scope if second[1] else None, "path")
+        shas = sorted(call[0] for call in self.redis.evalsha_calls[:2])
+        self.assertEqual(shas, ["sha-fixed", "sha-gcra"])
+
+
+class RedisRateLimiterLeaseTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.monkeypatch = MonkeyPatch()
+        self.redis = ScriptRedis()
+
+        async def fake_get_redis() -> ScriptRedis:
+            return self.redis
+
+        self.monkeypatch.setattr(rl, "get_redis", fake_get_redis, raising=True)
+        self.monkeypatch.setattr(rl, "get_auto_pipeline", fake_get_redis, raising=True)
+        for script in (
+            redis_scripts.FIXED_WINDOW_SCRIPT,
+            redis_scripts.QUOTA_LEASE_SCRIPT,
+            redis_scripts.QUOTA_RELEASE_SCRIPT,
+        ):
+            self.monkeypatch.setattr(script, "sha", None, raising=True)
+        self.limiter = rl.RedisRateLimiter(Settings(RATE_LIMIT_LEASE_FRACTION=0.5))
+        self.limiter._last_refresh = float("inf")
+        self.limiter._replace_rules(
+            {}, {"/categories/": {"limit": 10, "mode": "lease"}}, []
+        )
+        self.key = f"rl:path:/categories/:{self.limiter._window_id()}"
+
+    async def asyncTearDown(self) -> None:
+        self.monkeypatch.undo()
+
+    def _lease_calls(self) -> int:
+        return sum(1 for call in self.redis.evalsha_calls if call[0] == "sha-lease")
+
+    async def test_concurrent_requests_never_exceed_global_limit(self) -> None:
+        # Another replica already reserved 4 tokens.
+        self.redis.store[self.key] = 4
+
+        decisions = await asyncio.gather(
+            *(
+                self.limiter.check_and_increment("1.1.1.1", "/categories/")
+                for _ in range(12)
+            )
+        )
+
+        self.assertEqual(sum(1 for d in decisions if d[0]), 6)
+        self.assertEqual(self.redis.store[self.key], 10)
+        self.assertLess(self._lease_calls(), 12)
+
+    async def test_serves_from_lease_and_prefetches_when_low(self) -> None:
+        allowed, rule, remaining, _ = await self.limiter.check_and_increment(
+            "1.1.1.1", "/categories/"
+        )
+
+        self.assertTrue(allowed)
+        self.assertEqual(rule, RateLimitRule.build("path", "/categories/", 10, "lease"))
+        # 5 tokens leased, 1 spent: 5 unreserved + 4 held.
+        self.assertEqual(remaining, 9)
+        self.assertEqual(self._lease_calls(), 1)
+
+        for _ in range(4):
+            await self.limiter.check_and_increment("1.1.1.1", "/categories/")
+        await asyncio.sleep(0)
+
+        # The lease ran dry, so the next block was reserved in the background.
+        self.assertEqual(self._lease_calls(), 2)
+        self.assertEqual(self.limiter._leases["rl:path:/categories/"].tokens, 3)
+
+    async def test_rules_replaced_while_taking_lease_keep_lease(self) -> None:
+        rules = {"/categories/": {"limit": 10, "mode": "lease"}}
+        refill = self.limiter._refill
+
+        def replacing_refill(rule: RateLimitRule, lease: Any) -> Any:
+            task = refill(rule, lease)
+            # A config event lands while the request waits for its lease.
+            self.limiter._replace_rules({}, rules, [])
+            return task
+
+        self.monkeypatch.setattr(self.limiter, "_refill", replacing_refill)
+
+        allowed, rule, remaining, _ = await self.limiter.check_and_increment(
+            "1.1.1.1", "/categories/"
+        )
+
+        self.assertTrue(allowed)
+        self.assertEqual(rule, RateLimitRule.build("path", "/categories/", 10, "lease"))
+        self.assertEqual(remaining, 9)
+        # Decided with Redis, not by the failure policy.
+        self.assertEqual(self.limiter._breaker.failures, 0)
+
+    async def test_exact_denial_keeps_leased_token(self) -> None:
+        self.limiter._replace_rules(
+            {"1.1.1.1": 1}, {"/categories/": {"limit": 10, "mode": "lease"}}, []
+        )
+        await self.limiter.check_and_increment("1.1.1.1", "/categories/")
+
+        allowed, rule, _, _ = await self.limiter.check_and_increment(
+            "1.1.1.1", "/categories/"
+        )
+
+        self.assertFalse(allowed)
+        self.assertEqual(rule, RateLimitRule.build("ip", "1.1.1.1", 1))
+        self.assertEqual(self.limiter._leases["rl:path:/categories/"].tokens, 4)
+
+    async def test_release_returns_unspent_tokens(self) -> None:
+        await self.limiter.check_and_increment("1.1.1.1", "/categories/")
+
+        await self.limiter.release_leases()
+
+        self.assertEqual(self.redis.store[self.key], 1)
+        self.assertEqual(self.limiter._leases, {})
+
+
+class FailingRedis(ScriptRedis):
+    """Script double whose EVALSHA fails or hangs until ``healthy`` is set."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.healthy = False
+        self.hang = False
+        self.calls = 0
+
+    async def evalsha(self, sha: str, numkeys: int, *keys_and_args: Any) -> Any:
+        self.calls += 1
+        if self.hang:
+            await asyncio.sleep(10)
+        if not self.healthy:
+            raise ConnectionError("redis down")
+        return await super().evalsha(sha, numkeys, *keys_and_args)
+
+
+class RedisRateLimiterDegradedTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.monkeypatch = MonkeyPatch()
+        self.redis = FailingRedis()
+
+        async def fake_get_redis() -> ScriptRedis:
+            return self.redis
+
+        self.monkeypatch.setattr(rl, "get_redis", fake_get_redis, raising=True)
+        self.monkeypatch.setattr(rl, "get_auto_pipeline", fake_get_redis, raising=True)
+        self.monkeypatch.setattr(
+            redis_scripts.FIXED_WINDOW_SCRIPT, "sha", None, raising=True
+        )
+
+    async def asyncTearDown(self) -> None:
+        self.monkeypatch.undo()
+
+    def _limiter(self, **overrides: Any) -> rl.RedisRateLimiter:
+        limiter = rl.RedisRateLimiter(
+            Settings(
+                RATE_LIMIT_INSTANCES=2,
+                RATE_LIMIT_BREAKER_FAILURES=2,
+                RATE_LIMIT_BREAKER_RESET_SECONDS=60,
+                **overrides,
+            )
+        )
+        limiter._last_refresh = float("inf")
+        limiter._replace_rules({"1.1.1.1": 6}, {}, [])
+        return limiter
+
+    async def test_local_policy_enforces_share_of_limit(self) -> None:
+        limiter = self._limiter()
+
+        results = [
+            await limiter.check_and_increment("1.1.1.1", "/items/") for _ in range(4)
+        ]
+
+        self.assertEqual([r[0] for r in results], [True, True, True, False])
+        self.assertEqual(results[0][2], 2)
+        self.assertEqual(results[3][1], RateLimitRule.build("ip", "1.1.1.1", 6))
+
+    async def test_open_policy_admits_without_headers(self) -> None:
+        limiter = self._limiter(RATE_LIMIT_FAILURE_POLICY="open")
+
+        decision = await limiter.check_and_increment("1.1.1.1", "/items/")
+
+        self.assertEqual(decision, (True, None, 0, 0))
+
+    async def test_closed_policy_denies(self) -> None:
+        limiter = self._limiter(RATE_LIMIT_FAILURE_POLICY="closed")
+
+        allowed, rule, remaining, reset_in = await limiter.check_and_increment(
+            "1.1.1.1", "/items/"
+        )
+
+        self.assertFalse(allowed)
+        self.assertIsNotNone(rule)
+        self.assertEqual(remaining, 0)
+        self.assertGreaterEqual(reset_in, 1)
+
+    async def test_slow_redis_hits_the_deadline(self) -> None:
+        self.redis.hang = True
+        limiter = self._limiter(RATE_LIMIT_REDIS_TIMEOUT_MS=10)
+
+        allowed, _, _, _ = await asyncio.wait_for(
+            limiter.check_and_increment("1.1.1.1", "/items/"), 1
+        )
+
+        self.assertTrue(allowed)
+        self.assertEqual(limiter._breaker.failures, 1)
+
+    async def test_slow_rule_reload_runs_outside_the_deadline(self) -> None:
+        self.redis.healthy = True
+        limiter = self._limiter(RATE_LIMIT_REDIS_TIMEOUT_MS=10)
+        limiter._last_refresh = 0.0
+        reloaded = asyncio.Event()
+
+        async def slow_ensure_rules() -> None:
+            await asyncio.sleep(0.05)
+            reloaded.set()
+
+        self.monkeypatch.setattr(limiter, "_ensure_rules", slow_ensure_rules)
+
+        allowed, rule, _, _ = await limiter.check_and_increment("1.1.1.1", "/items/")
+        await asyncio.wait_for(reloaded.wait(), 1)
+
+        self.assertTrue(allowed)
+        self.assertEqual(rule, RateLimitRule.build("ip", "1.1.1.1", 6))
+        self.assertEqual(limiter._breaker.failures, 0)
+
+    async def test_slow_connect_gets_its_own_bound(self) -> None:
+        self.redis.healthy = True
+        limiter = self._limiter(
+            RATE_LIMIT_REDIS_TIMEOUT_MS=10, RATE_LIMIT_SETUP_TIMEOUT_MS=1000
+        )
+
+        connected = asyncio.Event()
+
+        async def slow_connect() -> ScriptRedis:
+            if not connected.is_set():
+                await asyncio.sleep(0.05)
+                connected.set()
+            return self.redis
+
+        self.monkeypatch.setattr(rl, "get_auto_pipeline", slow_connect)
+
+        allowed, rule, _, _ = await limiter.check_and_increment("1.1.1.1", "/items/")
+
+        self.assertTrue(allowed)
+        self.assertEqual(rule, RateLimitRule.build("ip", "1.1.1.1", 6))
+        self.assertEqual(limiter._breaker.failures, 0)
+
+    async def test_open_breaker_skips_redis_until_probe_succeeds(self) -> None:
+        limiter = self._limiter()
+        for _ in range(3):
+            await limiter.check_and_increment("1.1.1.1", "/items/")
+        self.assertEqual(self.redis.calls, 2)
+
+        self.redis.healthy = True
+        limiter._breaker.opened_at = float("-inf")
+        await limiter.check_and_increment("1.1.1.1", "/items/")
+        await limiter.check_and_increment("1.1.1.1", "/items/")
+
+        self.assertEqual(self.redis.calls, 4)
+        self.assertEqual(limiter._breaker.failures, 0)
+
+    async def test_cancelled_probe_releases_the_breaker(self) -> None:
+        limiter = self._limiter(RATE_LIMIT_REDIS_TIMEOUT_MS=5000)
+        limiter._breaker.opened_at = float("-inf")
+        self.redis.hang = True
+
+        probe = asyncio.ensure_future(limiter.check_and_increment("1.1.1.1", "/items/"))
+        await asyncio.sleep(0.01)
+        probe.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await probe
+
+        self.redis.hang = False
+        self.redis.healthy = True
+        await limiter.check_and_increment("1.1.1.1", "/items/")
+
+        self.assertEqual(self.redis.calls, 2)
+        self.assertEqual(limiter._breaker.opened_at, None)
+
+
+class VersionedRedis:
+    """Redis double counting how often the rule blobs are fetched."""
+
+    def __init__(self) -> None:
+        self.store: dict[str, bytes] = {}
+        self.blob_fetches = 0
+        self.pubsub_instance = FakePubSub()
+
+    async def get(self, key: str) -> bytes | None:
+        return self.store.get(key)
+
+    def pipeline(self) -> "VersionedRedis._Pipe":
+        return VersionedRedis._Pipe(self)
+
+    def pubsub(self) -> "FakePubSub":
+        return self.pubsub_instance
+
+    class _Pipe:
+        def __init__(self, owner: "VersionedRedis") -> None:
+            self.owner = owner
+            self.keys: list[str] = []
+
+        def get(self, key: str) -> None:
+            self.keys.append(key)
+
+        async def execute(self) -> list:
+            self.owner.blob_fetches += 1
+            return [self.owner.store.get(k) for k in self.keys]
+
+
+class FakePubSub:
+    def __init__(self) -> None:
+        self.messages: list[dict[str, Any]] = []
+        self.subscribed_to: list[str] = []
+        self.drained = asyncio.Event()
+        self.closed = False
+
+    async def subscribe(self, channel: str) -> None:
+        self.subscribed_to.append(channel)
+
+    async def listen(self) -> AsyncIterator[dict[str, Any]]:
+        for message in self.messages:
+            yield message
+        self.drained.set()
+        await asyncio.Event().wait()
+
+    async def aclose(self) -> None:
+        self.closed = True
+
+
+def _event(ts: float, ip: dict[str, int]) -> bytes:
+    return json.dumps({"ts": ts, "ip": ip, "path": {"/x/": 5}, "ip_path": []}).encode()
+
+
+class RedisRateLimiterEventsTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.monkeypatch = MonkeyPatch()
+        self.redis = VersionedRedis()
+
+        async def fake_get_redis() -> VersionedRedis:
+            return self.redis
+
+        self.monkeypatch.setattr(rl, "get_redis", fake_get_redis, raising=True)
+        self.monkeypatch.setattr(rl, "get_auto_pipeline", fake_get_redis, raising=True)
+        self.limiter = rl.RedisRateLimiter(Settings())
+
+    async def asyncTearDown(self) -> None:
+        await self.limiter.stop_subscriber()
+        self.monkeypatch.undo()
+
+    async def test_version_check_skips_blob_fetch_when_unchanged(self) -> None:
+        self.redis.store["rl:config:updated_at"] = b"10.0"
+        self.redis.store["rl:config:rules_ip"] = b'{"9.9.9.9": 3}'
+
+        await self.limiter._ensure_rules()
+        self.limiter._last_refresh = 0.0
+        await self.limiter._ensure_rules()
+
+        self.assertEqual(self.redis.blob_fetches, 1)
+        self.assertEqual(self.limiter.rules_ip, {"9.9.9.9": 3})
+        self.assertEqual(self.limiter._updated_at, 10.0)
+
+    async def test_apply_event_replaces_rules_and_ignores_stale(self) -> None:
+        self.assertTrue(self.limiter._apply_event(_event(20.0, {"1.2.3.4": 7})))
+        self.assertFalse(self.limiter._apply_event(_event(19.0, {"5.6.7.8": 1})))
+        self.assertFalse(self.limiter._apply_event(b"not-json"))
+
+        self.assertEqual(self.limiter.rules_ip, {"1.2.3.4": 7})
+        self.assertEqual(self.limiter.rules_path, {"/x/": 5})
+        self.assertEqual(self.limiter.rules_ip_path, [])
+        self.assertEqual(self.limiter._updated_at, 20.0)
+
+    async def test_subscriber_applies_published_payload(self) -> None:
+        pubsub = self.redis.pubsub_instance
+        pubsub.messages = [
+            {"type": "subscribe", "data": 1},
+            {"type": "message", "data": _event(30.0, {"4.4.4.4": 9})},
+        ]
+
+        self.limiter.start_subscriber()
+        await asyncio.wait_for(pubsub.drained.wait(), timeout=1)
+
+        self.assertEqual(pubsub.subscribed_to, ["rl:config:events"])
+        self.assertEqual(self.limiter.rules_ip, {"4.4.4.4": 9})
+        self.assertEqual(self.limiter._refresh_interval(), self.limiter._safety_poll)
+
+        await self.limiter.stop_subscriber()
+        self.assertTrue(pubsub.closed)
+        self.assertEqual(self.limiter._refresh_interval(), self.limiter._cache_ttl)
+
+
+class RateLimiterSettingsReloadTest(unittest.TestCase):
+    def tearDown(self) -> None:
+        rl._set_rate_limiter(None)
+        config._set_settings(None)
+
+    def test_singleton_applies_reloaded_settings(self) -> None:
+        config._set_settings(Settings(RATE_LIMIT_RULES_IP_JSON='{"1.1.1.1": 5}'))
+        limiter = rl._RateLimiterSingleton.get_instance()
+        self.assertEqual(limiter.rules_ip, {"1.1.1.1": 5})
+
+        config._set_settings(
+            Settings(
+                RATE_LIMIT_RULES_IP_JSON='{"2.2.2.2": 7}', RATE_LIMIT_CACHE_SECONDS=9
+            )
+        )
+
+        self.assertIs(rl._RateLimiterSingleton.get_instance(), limiter)
+        self.assertEqual(limiter.rules_ip, {"2.2.2.2": 7})
+        self.assertEqual(limiter._cache_ttl, 9.0)
+        self.assertEqual(
+            [r.scope for r in limiter._match_rules("2.2.2.2", "/")], ["ip"]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
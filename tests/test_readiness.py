@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+import unittest
+from typing import Any
+
+from fastapi.testclient import TestClient
+from pytest import MonkeyPatch
+
+from app.core import config
+from app.core.config import Settings
+from app.fast_api import app
+from app.presentation import lifecycle, readiness
+from app.presentation import upstream_breakers as ub
+from app.presentation import upstream_pool as up
+from app.presentation.api.middlewares import rate_limit as rl
+from app.presentation.api.routes import health as health_module
+
+
+class DummyRedis:
+    def __init__(self, pong: bool = True) -> None:
+        self.pong = pong
+        self.pings = 0
+
+    async def ping(self) -> bool:
+        self.pings += 1
+        return self.pong
+
+
+class ReadinessTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.monkeypatch = MonkeyPatch()
+        self.settings = Settings(
+            PROXY_UPSTREAM_URLS="http://a.test,http://b.test",
+            PROXY_MAX_CONNECTIONS=10,
+            READINESS_INTERVAL=0.05,
+        )
+        config._set_settings(self.settings)
+        up._set_upstream_pool(None)
+        ub._set_upstream_breakers(None)
+        self.redis = DummyRedis()
+
+        async def get_redis() -> DummyRedis:
+            return self.redis
+
+        self.monkeypatch.setattr(readiness, "get_redis", get_redis)
+        lifecycle.set_ready(True)
+
+    async def asyncTearDown(self) -> None:
+        await readiness.stop_readiness_monitor()
+        readiness._set_snapshot(None)
+        lifecycle.set_ready(False)
+        up._set_upstream_pool(None)
+        ub._set_upstream_breakers(None)
+        config._set_settings(None)
+        self.monkeypatch.undo()
+
+    def _body(self) -> Any:
+        return json.loads(readiness.readiness()[1])
+
+    async def test_ready_snapshot_reports_dependencies(self) -> None:
+        snapshot = await readiness.refresh_readiness()
+
+        self.assertTrue(snapshot.ready)
+        self.assertEqual(readiness.readiness(), (True, snapshot.body))
+        body = self._body()
+        self.assertEqual(body["status"], "ready")
+        self.assertEqual(body["upstreams"], {"healthy": 2, "total": 2})
+        self.assertEqual(body["redis"]["status"], "healthy")
+        self.assertIsNotNone(body["redis"]["rtt_ms"])
+
+    async def test_not_ready_reasons(self) -> None:
+        pool = up.get_upstream_pool(self.settings)
+        for target in pool.balancer.targets:
+            target.healthy = False
+        for _ in range(9):
+            pool.balancer.begin(pool.balancer.targets[0])
+
+        snapshot = readiness.build_snapshot(self.settings, None, "timeout", 0.6)
+
+        self.assertFalse(snapshot.ready)
+        self.assertEqual(
+            snapshot.reasons,
+            ("upstream_unreachable", "pool_saturated", "event_loop_lag"),
+        )
+
+    async def test_redis_outage_only_matters_with_closed_policy(self) -> None:
+        self.redis.pong = False
+
+        snapshot = await readiness.refresh_readiness()
+        self.assertTrue(snapshot.ready)
+        self.assertEqual(snapshot.redis_error, "no_pong")
+
+        config._set_settings(Settings(RATE_LIMIT_FAILURE_POLICY="closed"))
+        snapshot = await readiness.refresh_readiness()
+        self.assertEqual(snapshot.reasons, ("redis_unavailable",))
+
+    async def test_not_ready_while_starting_or_stale(self) -> None:
+        await readiness.refresh_readiness()
+        lifecycle.set_ready(False)
+        self.assertEqual(self._body()["reasons"], ["starting_or_draining"])
+
+        lifecycle.set_ready(True)
+        self.monkeypatch.setattr(
+            readiness.time, "monotonic", lambda: time.perf_counter() + 3600
+        )
+        self.assertEqual(self._body()["reasons"], ["no_snapshot"])
+
+    async def test_monitor_measures_event_loop_lag(self) -> None:
+        readiness.start_readiness_monitor()
+        await asyncio.sleep(0.01)
+        time.sleep(0.3)  # block the loop
+        await asyncio.sleep(0.1)
+
+        self.assertGreater(self._body()["event_loop_lag_ms"], 100)
+        self.assertGreater(self.redis.pings, 1)
+
+
+class ProbeRoutesTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.monkeypatch = MonkeyPatch()
+        self.client = TestClient(app)
+
+        def no_limiter() -> None:
+            raise AssertionError("probes must skip the rate limiter")
+
+        async def no_redis() -> None:
+            raise AssertionError("probes must not touch Redis")
+
+        self.monkeypatch.setattr(rl, "get_rate_limiter", no_limiter)
+        self.monkeypatch.setattr(health_module, "get_redis", no_redis)
+
+    def tearDown(self) -> None:
+        readiness._set_snapshot(None)
+        lifecycle.set_ready(False)
+        self.monkeypatch.undo()
+
+    def _snapshot(self, reasons: tuple[str, ...]) -> None:
+        readiness._set_snapshot(
+            readiness.ReadinessSnapshot(
+                time.monotonic(), None, reasons, b'{"status":"x"}'
+            )
+        )
+
+    def test_livez_always_answers(self) -> None:
+        resp = self.client.get("/livez")
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json(), {"status": "alive"})
+
+    def test_readyz_serves_the_snapshot(self) -> None:
+        lifecycle.set_ready(True)
+        self._snapshot(())
+        self.assertEqual(self.client.get("/readyz").status_code, 200)
+
+        self._snapshot(("pool_saturated",))
+        resp = self.client.get("/readyz")
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(resp.json(), {"status": "x"})
+
+    def test_health_reuses_the_snapshot(self) -> None:
+        self.monkeypatch.setattr(
+            rl, "get_rate_limiter", lambda: ProbeLimiter(), raising=True
+        )
+        self._snapshot(())
+
+        resp = self.client.get("/health")
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["redis"]["details"], "connected")
+
+
+class ProbeLimiter:
+    async def check_and_increment(
+        self, *args: Any, **kwargs: Any
+    ) -> tuple[bool, None, int, int]:
+        return True, None, 0, 0
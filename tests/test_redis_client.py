@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import asyncio
 import unittest
 from types import SimpleNamespace
 from unittest.mock import call, patch
@@ -8,22 +9,29 @@ from app.infrastructure import redis_client
 
 
 class _FakeRedis:
-    def __init__(self) -> None:
+    def __init__(self, ping_delay: float = 0.0, healthy: bool = True) -> None:
         self.ping_calls = 0
+        self.ping_delay = ping_delay
+        self.healthy = healthy
+        self.closed = False
 
     async def ping(self) -> bool:
         self.ping_calls += 1
-        return True
+        await asyncio.sleep(self.ping_delay)
+        return self.healthy
+
+    async def aclose(self) -> None:
+        self.closed = True
 
 
 class RedisClientSingletonTest(unittest.IsolatedAsyncioTestCase):
     def setUp(self) -> None:
         redis_client._RedisClientSingleton._client = None
-        redis_client._RedisClientSingleton._lock = None
+        redis_client._RedisClientSingleton._creating = None
 
     def tearDown(self) -> None:
         redis_client._RedisClientSingleton._client = None
-        redis_client._RedisClientSingleton._lock = None
+        redis_client._RedisClientSingleton._creating = None
 
     async def test_get_redis_returns_singleton_instance(self) -> None:
         fake_client = _FakeRedis()
@@ -37,7 +45,9 @@ class RedisClientSingletonTest(unittest.IsolatedAsyncioTestCase):
             REDIS_INIT_BACKOFF=0.01,
         )
 
-        with patch.object(redis_client, "Settings", return_value=fake_settings), patch(
+        with patch.object(
+            redis_client, "get_settings", return_value=fake_settings
+        ), patch(
             "app.infrastructure.redis_client.redis.Redis", return_value=fake_client
         ) as redis_ctor:
             first = await redis_client.get_redis()
@@ -48,6 +58,51 @@ class RedisClientSingletonTest(unittest.IsolatedAsyncioTestCase):
         self.assertEqual(redis_ctor.call_count, 1)
         self.assertGreaterEqual(fake_client.ping_calls, 1)
 
+    def _settings(self) -> SimpleNamespace:
+        return SimpleNamespace(
+            REDIS_CLUSTER_NODES=None,
+            REDIS_PASSWORD=None,
+            REDIS_HOST="localhost",
+            REDIS_PORT=6379,
+            REDIS_DB=0,
+            REDIS_INIT_RETRIES=1,
+            REDIS_INIT_BACKOFF=0.01,
+        )
+
+    async def test_caller_giving_up_does_not_abort_the_connect(self) -> None:
+        fake_client = _FakeRedis(ping_delay=0.05)
+
+        with patch.object(
+            redis_client, "get_settings", return_value=self._settings()
+        ), patch(
+            "app.infrastructure.redis_client.redis.Redis", return_value=fake_client
+        ) as redis_ctor:
+            with self.assertRaises(TimeoutError):
+                await asyncio.wait_for(redis_client.get_redis(), 0.01)
+            self.assertFalse(redis_client.redis_connected())
+            client = await redis_client.get_redis()
+
+        self.assertIs(client, fake_client)
+        self.assertTrue(redis_client.redis_connected())
+        self.assertEqual(redis_ctor.call_count, 1)
+        self.assertFalse(fake_client.closed)
+
+    async def test_failed_connect_closes_the_client_and_retries(self) -> None:
+        broken, healthy = _FakeRedis(healthy=False), _FakeRedis()
+
+        with patch.object(
+            redis_client, "get_settings", return_value=self._settings()
+        ), patch(
+            "app.infrastructure.redis_client.redis.Redis",
+            side_effect=[broken, healthy],
+        ):
+            with self.assertRaises(RuntimeError):
+                await redis_client.get_redis()
+            client = await redis_client.get_redis()
+
+        self.assertTrue(broken.closed)
+        self.assertIs(client, healthy)
+
     async def test_cluster_configuration_builds_nodes_and_client(self) -> None:
         fake_client = _FakeRedis()
         fake_settings = SimpleNamespace(
@@ -60,7 +115,9 @@ class RedisClientSingletonTest(unittest.IsolatedAsyncioTestCase):
             REDIS_INIT_BACKOFF=0.01,
         )
 
-        with patch.object(redis_client, "Settings", return_value=fake_settings), patch(
+        with patch.object(
+            redis_client, "get_settings", return_value=fake_settings
+        ), patch(
             "app.infrastructure.redis_client.redis.RedisCluster",
             return_value=fake_client,
         ) as cluster_ctor, patch(
@@ -75,3 +132,91 @@ class RedisClientSingletonTest(unittest.IsolatedAsyncioTestCase):
             [call("node1", 7001), call("node2", 6379)],
             any_order=False,
         )
+
+
+class _FakePipeline:
+    def __init__(self, owner: "_BatchingRedis") -> None:
+        self.owner = owner
+        self.commands: list = []
+
+    def execute_command(self, *args, **options) -> None:
+        self.commands.append(args)
+
+    async def execute(self, raise_on_error: bool = True) -> list:
+        self.owner.batches.append(list(self.commands))
+        if self.owner.fail_batch:
+            raise ConnectionError("down")
+        return [self.owner.reply(args) for args in self.commands]
+
+
+class _BatchingRedis:
+    def __init__(self) -> None:
+        self.batches: list = []
+        self.fail_batch = False
+        self.loaded: list = []
+
+    def pipeline(self, transaction: bool = True) -> _FakePipeline:
+        assert transaction is False
+        return _FakePipeline(self)
+
+    async def script_load(self, script: str) -> str:
+        self.loaded.append(script)
+        return "sha"
+
+    @staticmethod
+    def reply(args: tuple):
+        if args[1] == "missing":
+            return ValueError("NOSCRIPT")
+        return f"value:{args[1]}"
+
+
+class AutoPipelineTest(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrent_commands_share_one_pipeline(self) -> None:
+        client = _BatchingRedis()
+        pipeline = redis_client.AutoPipeline(client)
+
+        results = await asyncio.gather(
+            *(pipeline.get(f"k{i}") for i in range(5)),
+            pipeline.evalsha("abc", 1, "key", 10),
+        )
+
+        self.assertEqual(results, [f"value:k{i}" for i in range(5)] + ["value:abc"])
+        self.assertEqual(len(client.batches), 1)
+        self.assertEqual(client.batches[0][-1], ("EVALSHA", "abc", 1, "key", 10))
+
+    async def test_errors_go_to_the_command_that_caused_them(self) -> None:
+        pipeline = redis_client.AutoPipeline(_BatchingRedis())
+
+        ok, failed = await asyncio.gather(
+            pipeline.get("k"), pipeline.get("missing"), return_exceptions=True
+        )
+
+        self.assertEqual(ok, "value:k")
+        self.assertIsInstance(failed, ValueError)
+
+    async def test_connection_error_fails_every_waiter(self) -> None:
+        client = _BatchingRedis()
+        client.fail_batch = True
+        pipeline = redis_client.AutoPipeline(client)
+
+        results = await asyncio.gather(
+            pipeline.get("a"), pipeline.get("b"), return_exceptions=True
+        )
+
+        self.assertTrue(all(isinstance(r, ConnectionError) for r in results))
+
+    async def test_max_batch_splits_batches(self) -> None:
+        client = _BatchingRedis()
+        pipeline = redis_client.AutoPipeline(client, max_batch=2)
+
+        await asyncio.gather(*(pipeline.get(f"k{i}") for i in range(5)))
+
+        self.assertEqual([len(batch) for batch in client.batches], [2, 2, 1])
+
+    async def test_script_load_bypasses_the_batch(self) -> None:
+        client = _BatchingRedis()
+        pipeline = redis_client.AutoPipeline(client)
+
+        self.assertEqual(await pipeline.script_load("return 1"), "sha")
+        self.assertEqual(client.loaded, ["return 1"])
+        self.assertEqual(client.batches, [])
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import os
+import tempfile
+import unittest
+from typing import Any, Dict
+from unittest.mock import patch
+
+from pytest import MonkeyPatch
+
+from app import serve
+from app.core import config
+from app.core.config import Settings
+
+
+class ServeTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.monkeypatch = MonkeyPatch()
+        self.runs: list[Dict[str, Any]] = []
+        self.monkeypatch.setattr(
+            serve.uvicorn, "run", lambda app, **kw: self.runs.append(dict(kw, app=app))
+        )
+        # serve.main() sets the variable itself; restore the whole environment.
+        env = patch.dict(os.environ)
+        env.start()
+        self.addCleanup(env.stop)
+        os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def tearDown(self) -> None:
+        config._set_settings(None)
+        self.monkeypatch.undo()
+
+    def test_zero_workers_means_one_per_cpu(self) -> None:
+        self.monkeypatch.setattr(serve.os, "cpu_count", lambda: 6)
+
+        self.assertEqual(serve.worker_count(Settings(WORKERS=0)), 6)
+        self.assertEqual(serve.worker_count(Settings(WORKERS=3)), 3)
+
+    def test_single_worker_keeps_in_process_metrics(self) -> None:
+        config._set_settings(Settings(WORKERS=1, PORT=9000))
+
+        serve.main()
+
+        self.assertEqual(self.runs[0]["app"], "app.fast_api:app")
+        self.assertEqual(self.runs[0]["workers"], 1)
+        self.assertEqual(self.runs[0]["port"], 9000)
+        self.assertNotIn("PROMETHEUS_MULTIPROC_DIR", os.environ)
+
+    def test_several_workers_share_a_clean_metrics_dir(self) -> None:
+        path = os.path.join(self.tmp.name, "metrics")
+        os.makedirs(path)
+        stale = os.path.join(path, "counter_123.db")
+        with open(stale, "wb") as f:
+            f.write(b"old")
+        config._set_settings(Settings(WORKERS=4, METRICS_MULTIPROC_DIR=path))
+
+        serve.main()
+
+        self.assertEqual(self.runs[0]["workers"], 4)
+        self.assertEqual(os.environ["PROMETHEUS_MULTIPROC_DIR"], path)
+        self.assertFalse(os.path.exists(stale))
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import asyncio
+import unittest
+
+from app.core.singleflight import SingleFlight
+
+
+class SingleFlightTest(unittest.IsolatedAsyncioTestCase):
+    async def test_errors_are_shared_and_key_is_released(self) -> None:
+        flight: SingleFlight[int] = SingleFlight()
+        calls = 0
+
+        async def boom() -> int:
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0)
+            raise ValueError("upstream")
+
+        results = await asyncio.gather(
+            flight.do("k", boom), flight.do("k", boom), return_exceptions=True
+        )
+
+        self.assertEqual(calls, 1)
+        self.assertTrue(all(isinstance(r, ValueError) for r in results))
+        self.assertEqual(len(flight), 0)
+
+    async def test_cancelled_leader_does_not_cancel_followers(self) -> None:
+        flight: SingleFlight[int] = SingleFlight()
+        release = asyncio.Event()
+
+        async def slow() -> int:
+            await release.wait()
+            return 42
+
+        leader = asyncio.ensure_future(flight.do("k", slow))
+        follower = asyncio.ensure_future(flight.do("k", slow))
+        await asyncio.sleep(0)
+        leader.cancel()
+        release.set()
+
+        self.assertEqual(await follower, (42, True))
+        self.assertTrue(leader.cancelled())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import asyncio
+import unittest
+from typing import Any
+
+import httpx
+from pytest import MonkeyPatch
+
+from app.core import config
+from app.core.config import Settings
+from app.presentation import upstream_breakers as ub
+from app.presentation.api.routes.upstreams import get_upstream_breaker_states
+
+
+class UpstreamBreakersTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.monkeypatch = MonkeyPatch()
+        config._set_settings(
+            Settings(
+                PROXY_BREAKER_PREFIXES="/items/,/items/MLA",
+                PROXY_BREAKER_WINDOW=4,
+                PROXY_BREAKER_MIN_CALLS=2,
+                PROXY_BREAKER_OPEN_SECONDS=30,
+            )
+        )
+        ub._set_upstream_breakers(None)
+        self.calls = 0
+
+    async def asyncTearDown(self) -> None:
+        ub._set_upstream_breakers(None)
+        config._set_settings(None)
+        self.monkeypatch.undo()
+
+    async def _send(self, status: int, url: str = "https://up.test/items/1") -> Any:
+        async def send() -> httpx.Response:
+            self.calls += 1
+            return httpx.Response(status)
+
+        return await ub.guarded_send(url, url[len("https://up.test") :], send)
+
+    def test_key_uses_host_and_longest_prefix(self) -> None:
+        breakers = ub.get_upstream_breakers()
+
+        self.assertEqual(
+            breakers.key("https://up.test/items/MLA1", "/items/MLA1"),
+            ("up.test", "/items/MLA"),
+        )
+        self.assertEqual(
+            breakers.key("https://up.test/sites/MLA", "/sites/MLA"), ("up.test", "")
+        )
+
+    async def test_server_errors_open_the_breaker(self) -> None:
+        await self._send(502)
+        await self._send(503)
+
+        with self.assertRaises(ub.UpstreamCircuitOpen) as ctx:
+            await self._send(200)
+
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(
+            (ctx.exception.upstream, ctx.exception.prefix), ("up.test", "/items/")
+        )
+        self.assertGreater(ctx.exception.retry_in, 0)
+        # Other prefixes of the same host keep flowing.
+        await self._send(200, "https://up.test/sites/MLA")
+        self.assertEqual(self.calls, 3)
+
+    async def test_transport_errors_count_and_pool_timeouts_do_not(self) -> None:
+        async def pool_timeout() -> httpx.Response:
+            raise httpx.PoolTimeout("busy")
+
+        async def connect_error() -> httpx.Response:
+            raise httpx.ConnectError("refused")
+
+        for _ in range(3):
+            with self.assertRaises(httpx.PoolTimeout):
+                await ub.guarded_send("https://up.test/a", "/a", pool_timeout)
+        breaker = ub.get_upstream_breakers().get(("up.test", ""))
+        self.assertEqual(breaker.rates(), (0.0, 0.0))
+
+        for _ in range(2):
+            with self.assertRaises(httpx.ConnectError):
+                await ub.guarded_send("https://up.test/a", "/a", connect_error)
+        self.assertEqual(breaker.state, "open")
+
+    async def test_calls_admitted_while_closed_do_not_count_as_probes(self) -> None:
+        release = asyncio.Event()
+
+        async def slow_failure() -> httpx.Response:
+            await release.wait()
+            return httpx.Response(500)
+
+        url = "https://up.test/items/1"
+        late = asyncio.ensure_future(ub.guarded_send(url, "/items/1", slow_failure))
+        await asyncio.sleep(0)
+        await self._send(502)
+        await self._send(503)
+        breaker = ub.get_upstream_breakers().get(("up.test", "/items/"))
+        breaker.opened_at = (breaker.opened_at or 0.0) - 30
+        self.assertTrue(breaker.allow())
+
+        release.set()
+        await late
+
+        self.assertEqual(breaker.state, "half_open")
+
+    async def test_admin_endpoint_lists_breakers(self) -> None:
+        await self._send(500)
+        await self._send(500)
+
+        states = await get_upstream_breaker_states()
+
+        self.assertEqual(len(states), 1)
+        self.assertEqual(states[0].upstream, "up.test")
+        self.assertEqual(states[0].prefix, "/items/")
+        self.assertEqual(states[0].state, "open")
+
+    async def test_disabled_breaker_always_calls_upstream(self) -> None:
+        config._set_settings(Settings(PROXY_BREAKER_ENABLED=False))
+        for _ in range(30):
+            await self._send(500)
+
+        self.assertEqual(self.calls, 30)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import asyncio
+import unittest
+from typing import Dict, List
+
+import httpx
+
+from app.core import config
+from app.core.config import Settings
+from app.presentation import upstream_breakers as ub
+from app.presentation import upstream_pool as up
+
+
+class UpstreamPoolTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.settings = Settings(
+            PROXY_UPSTREAM_URLS="http://a.test, http://b.test/",
+            PROXY_HEALTH_UNHEALTHY_AFTER=2,
+            PROXY_HEALTH_HEALTHY_AFTER=1,
+            PROXY_BREAKER_MIN_CALLS=2,
+            PROXY_BREAKER_WINDOW=2,
+        )
+        config._set_settings(self.settings)
+        ub._set_upstream_breakers(None)
+        up._set_upstream_pool(None)
+        # Stub upstreams keyed by host: the status each one answers with.
+        self.status: Dict[str, int] = {"a.test": 200, "b.test": 200}
+        self.hits: List[str] = []
+        self.release = asyncio.Event()
+        self.release.set()
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            self.hits.append(f"{request.url.host}{request.url.path}")
+            await self.release.wait()
+            return httpx.Response(self.status[request.url.host])
+
+        self.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    async def asyncTearDown(self) -> None:
+        await self.client.aclose()
+        up._set_upstream_pool(None)
+        ub._set_upstream_breakers(None)
+        config._set_settings(None)
+
+    async def _get(self, path: str = "items/1") -> httpx.Response:
+        pool = up.get_upstream_pool(self.settings)
+        return await pool.send(path, f"/{path}", self.client.get)
+
+    async def test_concurrent_requests_spread_across_targets(self) -> None:
+        self.release.clear()
+        calls = [asyncio.ensure_future(self._get()) for _ in range(4)]
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+
+        self.assertEqual(
+            sorted(self.hits),
+            ["a.test/items/1", "a.test/items/1", "b.test/items/1", "b.test/items/1"],
+        )
+        self.release.set()
+        await asyncio.gather(*calls)
+        pool = up.get_upstream_pool(self.settings)
+        self.assertEqual([t.outstanding for t in pool.balancer.targets], [0, 0])
+
+    async def test_health_checks_remove_and_readmit_a_target(self) -> None:
+        pool = up.get_upstream_pool(self.settings)
+        self.status["a.test"] = 503
+        await pool.check_health(self.client)
+        await pool.check_health(self.client)
+
+        self.assertIn("a.test/sites", self.hits)
+        self.assertEqual([t.healthy for t in pool.balancer.targets], [False, True])
+        self.hits.clear()
+        for _ in range(3):
+            await self._get()
+        self.assertEqual(self.hits, ["b.test/items/1"] * 3)
+
+        self.status["a.test"] = 200
+        await pool.check_health(self.client)
+        self.assertTrue(pool.balancer.targets[0].healthy)
+
+    async def test_open_breaker_ejects_the_target(self) -> None:
+        self.status["a.test"] = 502
+        ub.get_upstream_breakers().get(("a.test", "")).record(False, 0.0)
+        ub.get_upstream_breakers().get(("a.test", "")).record(False, 0.0)
+        self.hits.clear()
+
+        for _ in range(3):
+            response = await self._get()
+            self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self.hits, ["b.test/items/1"] * 3)
+
+    async def test_single_target_is_not_probed(self) -> None:
+        settings = Settings(MELI_API_URL="http://a.test/")
+        pool = up.get_upstream_pool(settings)
+
+        await pool.check_health(self.client)
+
+        self.assertEqual(settings.PROXY_UPSTREAM_BASES, ("http://a.test",))
+        self.assertEqual(self.hits, [])
+
+    async def test_slow_attempt_is_hedged_to_another_target(self) -> None:
+        settings = self._hedging_settings()
+        pool = up.get_upstream_pool(settings)
+        for _ in range(20):
+            pool.latency.observe(0.001)
+        cancelled = asyncio.Event()
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            self.hits.append(request.url.host)
+            if len(self.hits) == 1:
+                try:
+                    await asyncio.sleep(10)
+                except asyncio.CancelledError:
+                    cancelled.set()
+                    raise
+            return httpx.Response(200, text=request.url.host)
+
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as c:
+            response = await pool.send_idempotent("items/1", "/items/1", c.get)
+            await asyncio.wait_for(cancelled.wait(), 1)
+
+        self.assertEqual(sorted(self.hits), ["a.test", "b.test"])
+        self.assertEqual(response.text, self.hits[1])
+        self.assertEqual([t.outstanding for t in pool.balancer.targets], [0, 0])
+
+    async def test_hedging_stops_when_the_budget_is_spent(self) -> None:
+        settings = self._hedging_settings(PROXY_RETRY_BUDGET_MIN_PER_SECOND=0)
+        pool = up.get_upstream_pool(settings)
+        for _ in range(20):
+            pool.latency.observe(0.001)
+        self.assertTrue(pool.budget.try_withdraw())
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            self.hits.append(request.url.host)
+            await asyncio.sleep(0.05)
+            return httpx.Response(200)
+
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as c:
+            response = await pool.send_idempotent("items/1", "/items/1", c.get)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.hits), 1)
+
+    async def test_connect_errors_are_retried_on_another_target(self) -> None:
+        pool = up.get_upstream_pool(self.settings)
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            self.hits.append(request.url.host)
+            if len(self.hits) == 1:
+                raise httpx.ConnectError("refused", request=request)
+            return httpx.Response(200)
+
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as c:
+            response = await pool.send_idempotent("items/1", "/items/1", c.get)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(sorted(self.hits), ["a.test", "b.test"])
+
+            # Non-idempotent sends are never retried.
+            self.hits.clear()
+            with self.assertRaises(httpx.ConnectError):
+                await pool.send("items/1", "/items/1", c.post)
+        self.assertEqual(len(self.hits), 1)
+
+    def _hedging_settings(self, **overrides: float) -> Settings:
+        settings = Settings(
+            PROXY_UPSTREAM_URLS="http://a.test,http://b.test",
+            PROXY_HEDGE=True,
+            PROXY_HEDGE_MIN_DELAY_MS=1,
+            **overrides,
+        )
+        config._set_settings(settings)
+        return settings
+
+    async def test_pool_is_rebuilt_for_new_settings(self) -> None:
+        pool = up.get_upstream_pool(self.settings)
+
+        self.assertIs(up.get_upstream_pool(self.settings), pool)
+        self.assertIsNot(up.get_upstream_pool(Settings()), pool)
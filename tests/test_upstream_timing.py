@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import unittest
+from typing import Dict
+
+from prometheus_client import REGISTRY
+from pytest import MonkeyPatch
+
+from app.presentation import upstream_timing
+
+PHASES = ("pool_wait", "connect", "ttfb", "body", "write")
+
+
+def _counts() -> Dict[str, float]:
+    return {
+        phase: REGISTRY.get_sample_value(
+            "meli_proxy_upstream_phase_seconds_count", {"phase": phase}
+        )
+        or 0.0
+        for phase in PHASES
+    }
+
+
+def _sums() -> Dict[str, float]:
+    return {
+        phase: REGISTRY.get_sample_value(
+            "meli_proxy_upstream_phase_seconds_sum", {"phase": phase}
+        )
+        or 0.0
+        for phase in PHASES
+    }
+
+
+class UpstreamTraceTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.monkeypatch = MonkeyPatch()
+        self.now = 100.0
+        self.monkeypatch.setattr(upstream_timing.time, "perf_counter", lambda: self.now)
+
+    async def asyncTearDown(self) -> None:
+        self.monkeypatch.undo()
+
+    async def _emit(self, trace: upstream_timing.UpstreamTrace, *events: str) -> None:
+        for event in events:
+            self.now += 0.5
+            await trace(event, {})
+
+    async def test_new_connection_splits_every_phase(self) -> None:
+        counts, sums = _counts(), _sums()
+        trace = upstream_timing.UpstreamTrace()
+
+        await self._emit(
+            trace,
+            "connection.connect_tcp.started",
+            "connection.connect_tcp.complete",
+            "connection.start_tls.started",
+            "connection.start_tls.complete",
+            "http11.send_request_headers.started",
+            "http11.send_request_headers.complete",
+            "http11.receive_response_headers.started",
+            "http11.receive_response_headers.complete",
+            "http11.receive_response_body.started",
+            "http11.receive_response_body.complete",
+            "http11.response_closed.started",
+        )
+
+        after, after_sums = _counts(), _sums()
+        for phase in ("pool_wait", "connect", "ttfb", "body"):
+            self.assertEqual(after[phase] - counts[phase], 1, phase)
+        self.assertEqual(after["write"], counts["write"])
+        self.assertAlmostEqual(after_sums["pool_wait"] - sums["pool_wait"], 0.5)
+        self.assertAlmostEqual(after_sums["connect"] - sums["connect"], 2.0)
+        self.assertAlmostEqual(after_sums["ttfb"] - sums["ttfb"], 1.5)
+        self.assertAlmostEqual(after_sums["body"] - sums["body"], 1.0)
+
+    async def test_reused_connection_has_no_connect_phase(self) -> None:
+        counts, sums = _counts(), _sums()
+        trace = upstream_timing.UpstreamTrace()
+
+        await self._emit(
+            trace,
+            "http2.send_request_headers.started",
+            "http2.receive_response_headers.complete",
+        )
+
+        after, after_sums = _counts(), _sums()
+        self.assertEqual(after["connect"], counts["connect"])
+        self.assertEqual(after["pool_wait"] - counts["pool_wait"], 1)
+        self.assertAlmostEqual(after_sums["pool_wait"] - sums["pool_wait"], 0.5)
+        self.assertAlmostEqual(after_sums["ttfb"] - sums["ttfb"], 0.5)
+
+
+class TimedResponseTest(unittest.IsolatedAsyncioTestCase):
+    async def test_records_write_time(self) -> None:
+        before = _counts()["write"]
+        sent: list[dict] = []
+
+        async def receive() -> dict:
+            return {"type": "http.request"}
+
+        async def send(message: dict) -> None:
+            sent.append(message)
+
+        response = upstream_timing.TimedResponse(content=b"ok")
+        await response({"type": "http"}, receive, send)
+
+        self.assertEqual(sent[-1]["body"], b"ok")
+        self.assertEqual(_counts()["write"] - before, 1)